@@ -1,276 +1,326 @@
-import os
 import uuid
 import hashlib
-import psycopg2
-from flask import Flask, request, jsonify
+from datetime import date
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+from db import db_connection, pool_stats, PoolTimeoutError
+from farm_health import score_farm_health
+from climate_history import load_climate_history, parse_history_args
+from power_cache import get_cache as get_power_cache
+from power_client import get_client as get_power_client
+from response_cache import cached_per_user, change_poller, response_cache
+from market_index import nearest_market_for_user
+from metrics import gauge_lines, init_app as init_metrics
+from serialization import init_app as init_serialization, numeric_as_float, records
+from compression import init_app as init_compression
+from identity import identity_cache, invalidate_identity, resolve_email, resolve_user
+from migrations import apply_migrations
+from provisioning import (
+    SAMPLE_SOIL_CONDITIONS,
+    SAMPLE_USER_METRICS,
+    provision_missing_users,
+    provision_user,
+    sample_legacy_weather_forecast,
+    sample_weather_forecast,
+)
+from query_plans import check_query_plans
+from recommendation_engine import generate_recommendations
+from queries import (
+    DASHBOARD_USER_QUERY,
+    LEGACY_USER_METRICS_QUERY,
+    WEATHER_FORECAST_QUERY,
+    LEGACY_WEATHER_FORECAST_QUERY,
+    SOIL_CONDITIONS_QUERY,
+    LEGACY_SOIL_CONDITIONS_QUERY,
+    AI_RECOMMENDATIONS_QUERY,
+)
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# Database connection
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST"),
-        database=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-    )
-    return conn
+
+def _process_metrics():
+    """Pool, cache and POWER client stats for /metrics."""
+    lines = []
+    pool = pool_stats()
+    if pool:
+        lines += gauge_lines("db_pool_in_use", "Pooled connections checked out.", pool["in_use"])
+        lines += gauge_lines("db_pool_max_size", "Pool capacity.", pool["max_size"])
+        lines += gauge_lines("db_pool_checkout_timeouts_total", "Checkouts that timed out.",
+                             pool["timeouts"], kind="counter")
+    cache = response_cache.stats()
+    lines += gauge_lines("response_cache_hits_total", "Per-user response cache hits.", cache["hits"], kind="counter")
+    lines += gauge_lines("response_cache_misses_total", "Per-user response cache misses.",
+                         cache["misses"], kind="counter")
+    identities = identity_cache.stats()
+    lines += gauge_lines("identity_cache_hits_total", "User id resolutions served from cache.",
+                         identities["hits"], kind="counter")
+    lines += gauge_lines("identity_cache_misses_total", "User id resolutions that queried the database.",
+                         identities["misses"], kind="counter")
+    power = get_power_client().stats()
+    lines += gauge_lines("power_requests_total", "NASA POWER API requests.", power["requests"], kind="counter")
+    lines += gauge_lines("power_retries_total", "NASA POWER API retries.", power["retries_total"], kind="counter")
+    lines += ["# HELP power_request_duration_seconds NASA POWER API latency.",
+              "# TYPE power_request_duration_seconds histogram"]
+    for bound, total in power["latency_seconds"]["buckets"].items():
+        lines.append(f'power_request_duration_seconds_bucket{{le="{bound}"}} {total}')
+    lines.append(f"power_request_duration_seconds_sum {power['latency_seconds']['sum']}")
+    lines.append(f"power_request_duration_seconds_count {power['latency_seconds']['count']}")
+    return lines
+
+
+init_metrics(app, _process_metrics)
+init_serialization(app)
+init_compression(app)
 
 # Create tables with comprehensive schema
 def create_tables():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Create tables one by one in dependency order
-    tables_created = []
-
-    try:
-        # Basic independent tables first
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id UUID PRIMARY KEY,
-                username VARCHAR(255) UNIQUE,
-                email VARCHAR(255) UNIQUE,
-                first_name VARCHAR(255),
-                last_name VARCHAR(255),
-                farm_name VARCHAR(255),
-                farm_latitude DECIMAL(10, 6),
-                farm_longitude DECIMAL(10, 6),
-                farm_size_hectares DECIMAL(8, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created.append('users')
+    with db_connection() as conn, conn.cursor() as cur:
+        # Create tables one by one in dependency order
+        tables_created = []
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS market_data (
-                id SERIAL PRIMARY KEY,
-                market_name VARCHAR(255) NOT NULL,
-                latitude DECIMAL(10, 6),
-                longitude DECIMAL(10, 6),
-                distance_km DECIMAL(8, 2),
-                commodity_prices JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created.append('market_data')
+        try:
+            # Basic independent tables first
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id UUID PRIMARY KEY,
+                    username VARCHAR(255) UNIQUE,
+                    email VARCHAR(255) UNIQUE,
+                    first_name VARCHAR(255),
+                    last_name VARCHAR(255),
+                    farm_name VARCHAR(255),
+                    farm_latitude DECIMAL(10, 6),
+                    farm_longitude DECIMAL(10, 6),
+                    farm_size_hectares DECIMAL(8, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            tables_created.append('users')
 
-        # Tables that reference users
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_credits (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                total_points INTEGER DEFAULT 0,
-                current_rank VARCHAR(50) DEFAULT 'Bronze',
-                points_to_next_rank INTEGER DEFAULT 500,
-                monthly_change_percent DECIMAL(5, 2) DEFAULT 0.0,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id)
-            )
-        """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS market_data (
+                    id SERIAL PRIMARY KEY,
+                    market_name VARCHAR(255) NOT NULL,
+                    latitude DECIMAL(10, 6),
+                    longitude DECIMAL(10, 6),
+                    distance_km DECIMAL(8, 2),
+                    commodity_prices JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            tables_created.append('market_data')
+
+            # Tables that reference users
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_credits (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    total_points INTEGER DEFAULT 0,
+                    current_rank VARCHAR(50) DEFAULT 'Bronze',
+                    points_to_next_rank INTEGER DEFAULT 500,
+                    monthly_change_percent DECIMAL(5, 2) DEFAULT 0.0,
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id)
+                )
+            """)
         
-        tables_created.append('user_credits')
+            tables_created.append('user_credits')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS farm_zones (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                zone_name VARCHAR(10) NOT NULL,
-                crop_type VARCHAR(100),
-                area_hectares DECIMAL(8, 2),
-                status VARCHAR(50) DEFAULT 'active',
-                color_code VARCHAR(7) DEFAULT '#10B981',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, zone_name)
-            )
-        """)
-        tables_created.append('farm_zones')
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS farm_neighbors (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                neighbor_name VARCHAR(255) NOT NULL,
-                distance_km DECIMAL(5, 2),
-                farm_type VARCHAR(100),
-                collaboration_status VARCHAR(50) DEFAULT 'potential',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, neighbor_name)
-            )
-        """)
-        tables_created.append('farm_neighbors')
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS farm_health_metrics (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                date DATE NOT NULL,
-                overall_health_score DECIMAL(5, 2),
-                soil_health_score DECIMAL(5, 2),
-                crop_health_score DECIMAL(5, 2),
-                water_efficiency_score DECIMAL(5, 2),
-                nasa_data_sources JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, date)
-            )
-        """)
-        tables_created.append('farm_health_metrics')
-
-        # NASA data tables
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS nasa_weather_data (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                date DATE NOT NULL,
-                temperature_2m_avg DECIMAL(5, 2),
-                precipitation DECIMAL(5, 2),
-                eto DECIMAL(5, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, date)
-            )
-        """)
-        tables_created.append('nasa_weather_data')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS farm_zones (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    zone_name VARCHAR(10) NOT NULL,
+                    crop_type VARCHAR(100),
+                    area_hectares DECIMAL(8, 2),
+                    status VARCHAR(50) DEFAULT 'active',
+                    color_code VARCHAR(7) DEFAULT '#10B981',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, zone_name)
+                )
+            """)
+            tables_created.append('farm_zones')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS nasa_vegetation_data (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                date DATE NOT NULL,
-                crop_health_score DECIMAL(5, 2),
-                vegetation_density DECIMAL(5, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, date)
-            )
-        """)
-        tables_created.append('nasa_vegetation_data')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS farm_neighbors (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    neighbor_name VARCHAR(255) NOT NULL,
+                    distance_km DECIMAL(5, 2),
+                    farm_type VARCHAR(100),
+                    collaboration_status VARCHAR(50) DEFAULT 'potential',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, neighbor_name)
+                )
+            """)
+            tables_created.append('farm_neighbors')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS nasa_weather_forecast (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                forecast_date DATE NOT NULL,
-                temperature_max DECIMAL(5, 2),
-                temperature_min DECIMAL(5, 2),
-                weather_condition VARCHAR(100),
-                precipitation_probability DECIMAL(5, 2),
-                humidity DECIMAL(5, 2),
-                wind_speed DECIMAL(5, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, forecast_date)
-            )
-        """)
-        tables_created.append('nasa_weather_forecast')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS farm_health_metrics (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    date DATE NOT NULL,
+                    overall_health_score DECIMAL(5, 2),
+                    soil_health_score DECIMAL(5, 2),
+                    crop_health_score DECIMAL(5, 2),
+                    water_efficiency_score DECIMAL(5, 2),
+                    nasa_data_sources JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, date)
+                )
+            """)
+            tables_created.append('farm_health_metrics')
+
+            # NASA data tables
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS nasa_weather_data (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    date DATE NOT NULL,
+                    temperature_2m_avg DECIMAL(5, 2),
+                    precipitation DECIMAL(5, 2),
+                    eto DECIMAL(5, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, date)
+                )
+            """)
+            tables_created.append('nasa_weather_data')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS nasa_soil_data (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                zone_id INTEGER REFERENCES farm_zones(id),
-                date DATE NOT NULL,
-                soil_moisture_0_5cm DECIMAL(10, 6),
-                soil_temperature_0_5cm DECIMAL(5, 2),
-                surface_wetness DECIMAL(5, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, zone_id, date)
-            )
-        """)
-        tables_created.append('nasa_soil_data')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS nasa_vegetation_data (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    date DATE NOT NULL,
+                    crop_health_score DECIMAL(5, 2),
+                    vegetation_density DECIMAL(5, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, date)
+                )
+            """)
+            tables_created.append('nasa_vegetation_data')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS nasa_ai_recommendations (
-                id SERIAL PRIMARY KEY,
-                user_id UUID REFERENCES users(id),
-                zone_id INTEGER REFERENCES farm_zones(id),
-                title VARCHAR(255) NOT NULL,
-                description TEXT,
-                recommendation_type VARCHAR(100),
-                priority VARCHAR(20) DEFAULT 'Low',
-                status VARCHAR(20) DEFAULT 'active',
-                nasa_datasets_used JSONB,
-                crop_suggestion VARCHAR(100),
-                market_insight JSONB,
-                time_window_start DATE,
-                time_window_end DATE,
-                expected_impact_score DECIMAL(5, 2),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, title)
-            )
-        """)
-        tables_created.append('nasa_ai_recommendations')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS nasa_weather_forecast (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    forecast_date DATE NOT NULL,
+                    temperature_max DECIMAL(5, 2),
+                    temperature_min DECIMAL(5, 2),
+                    weather_condition VARCHAR(100),
+                    precipitation_probability DECIMAL(5, 2),
+                    humidity DECIMAL(5, 2),
+                    wind_speed DECIMAL(5, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, forecast_date)
+                )
+            """)
+            tables_created.append('nasa_weather_forecast')
 
-        # Legacy compatibility tables
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS legacy_users (
-                userId VARCHAR(255) PRIMARY KEY,
-                firstName VARCHAR(255),
-                lastName VARCHAR(255),
-                email VARCHAR(255) UNIQUE,
-                password VARCHAR(255)
-            )
-        """)
-        tables_created.append('legacy_users')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS nasa_soil_data (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    zone_id INTEGER REFERENCES farm_zones(id),
+                    date DATE NOT NULL,
+                    soil_moisture_0_5cm DECIMAL(10, 6),
+                    soil_temperature_0_5cm DECIMAL(5, 2),
+                    surface_wetness DECIMAL(5, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, zone_id, date)
+                )
+            """)
+            tables_created.append('nasa_soil_data')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS weather_forecast (
-                id SERIAL PRIMARY KEY,
-                date DATE,
-                temperature_high NUMERIC,
-                temperature_low NUMERIC,
-                condition VARCHAR(100),
-                humidity NUMERIC,
-                chance_of_rain NUMERIC DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created.append('weather_forecast')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS nasa_ai_recommendations (
+                    id SERIAL PRIMARY KEY,
+                    user_id UUID REFERENCES users(id),
+                    zone_id INTEGER REFERENCES farm_zones(id),
+                    title VARCHAR(255) NOT NULL,
+                    description TEXT,
+                    recommendation_type VARCHAR(100),
+                    priority VARCHAR(20) DEFAULT 'Low',
+                    status VARCHAR(20) DEFAULT 'active',
+                    nasa_datasets_used JSONB,
+                    crop_suggestion VARCHAR(100),
+                    market_insight JSONB,
+                    time_window_start DATE,
+                    time_window_end DATE,
+                    expected_impact_score DECIMAL(5, 2),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, title)
+                )
+            """)
+            tables_created.append('nasa_ai_recommendations')
+
+            # Legacy compatibility tables
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS legacy_users (
+                    userId VARCHAR(255) PRIMARY KEY,
+                    firstName VARCHAR(255),
+                    lastName VARCHAR(255),
+                    email VARCHAR(255) UNIQUE,
+                    password VARCHAR(255)
+                )
+            """)
+            tables_created.append('legacy_users')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS soil_conditions (
-                id SERIAL PRIMARY KEY,
-                user_id VARCHAR(255),
-                moisture_level NUMERIC,
-                nitrogen_level NUMERIC,
-                ph_level NUMERIC,
-                temperature NUMERIC,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created.append('soil_conditions')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS weather_forecast (
+                    id SERIAL PRIMARY KEY,
+                    date DATE,
+                    temperature_high NUMERIC,
+                    temperature_low NUMERIC,
+                    condition VARCHAR(100),
+                    humidity NUMERIC,
+                    chance_of_rain NUMERIC DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            tables_created.append('weather_forecast')
 
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_metrics (
-                id SERIAL PRIMARY KEY,
-                user_id VARCHAR(255),
-                credit_points INTEGER DEFAULT 0,
-                farm_health INTEGER DEFAULT 0,
-                active_neighbors INTEGER DEFAULT 0,
-                nearest_market_distance INTEGER DEFAULT 0,
-                nearest_market_name VARCHAR(255),
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created.append('user_metrics')
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS soil_conditions (
+                    id SERIAL PRIMARY KEY,
+                    user_id VARCHAR(255),
+                    moisture_level NUMERIC,
+                    nitrogen_level NUMERIC,
+                    ph_level NUMERIC,
+                    temperature NUMERIC,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            tables_created.append('soil_conditions')
 
-        conn.commit()
-        print(f"Successfully created tables: {', '.join(tables_created)}")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_metrics (
+                    id SERIAL PRIMARY KEY,
+                    user_id VARCHAR(255),
+                    credit_points INTEGER DEFAULT 0,
+                    farm_health INTEGER DEFAULT 0,
+                    active_neighbors INTEGER DEFAULT 0,
+                    nearest_market_distance INTEGER DEFAULT 0,
+                    nearest_market_name VARCHAR(255),
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            tables_created.append('user_metrics')
 
-    except Exception as e:
-        print(f"Error creating tables: {str(e)}")
-        conn.rollback()
-        raise e
+            conn.commit()
+            print(f"Successfully created tables: {', '.join(tables_created)}")
 
-    finally:
-        cur.close()
-        conn.close()
+        except Exception as e:
+            print(f"Error creating tables: {str(e)}")
+            conn.rollback()
+            raise e
 
 
 import click
@@ -279,8 +329,228 @@ import click
 def init_db_command():
     """Clear the existing data and create new tables."""
     create_tables()
+    with db_connection() as conn:
+        apply_migrations(conn)
     click.echo("Initialized the database.")
 
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    with db_connection() as conn:
+        applied = apply_migrations(conn)
+    click.echo(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+
+@app.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print the full plan of every query.")
+def check_query_plans_command(verbose):
+    """EXPLAIN the hot endpoint queries and fail on sequential scans or sorts."""
+    import json
+
+    with db_connection() as conn:
+        results = check_query_plans(conn)
+
+    for name, result in results.items():
+        status = "ok" if result["ok"] else "FAIL: " + "; ".join(result["violations"])
+        click.echo(f"{name:<28} {status}")
+        if verbose:
+            click.echo(json.dumps(result["plan"], indent=2))
+
+    if not all(result["ok"] for result in results.values()):
+        raise SystemExit(1)
+
+@app.cli.command("refresh-nasa")
+@click.option("--all", "refresh_all", is_flag=True, help="Refresh every user with farm coordinates.")
+@click.option("--user", "user_id", help="Refresh a single user by id.")
+@click.option("--workers", type=int, default=None, help="Concurrent POWER fetches (default NASA_REFRESH_WORKERS).")
+@click.option("--full", is_flag=True, help="Re-pull the whole history window instead of only missing days.")
+@click.option("--mode", type=click.Choice(["point", "regional"]), default=None,
+              help="Fleet fetch mode (default NASA_FETCH_MODE); regional batches dense clusters of cells.")
+def refresh_nasa_command(refresh_all, user_id, workers, full, mode):
+    """Fetch NASA POWER data and upsert it for one user or the whole fleet."""
+    # Imported lazily: nasa_data_model requires NASA_API_KEY at import time
+    import json
+    from data_orchestrator import refresh_all_users, update_nasa_data_for_user, REFRESH_WORKERS, FETCH_MODE
+
+    if refresh_all == bool(user_id):
+        raise click.UsageError("Pass exactly one of --all or --user.")
+
+    if user_id:
+        update_nasa_data_for_user(user_id, incremental=not full)
+        return
+
+    report = refresh_all_users(incremental=not full, max_workers=workers or REFRESH_WORKERS, mode=mode or FETCH_MODE)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("refresh-scheduler")
+@click.option("--workers", type=int, default=None, help="Worker threads (default NASA_SCHEDULER_WORKERS).")
+@click.option("--until-idle", is_flag=True, help="Exit once no refresh job is due instead of running forever.")
+def refresh_scheduler_command(workers, until_idle):
+    """Run the background NASA refresh scheduler and its workers."""
+    import json
+    import signal
+    import threading
+    from refresh_scheduler import run_scheduler, SCHEDULER_WORKERS
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    report = run_scheduler(workers=workers or SCHEDULER_WORKERS, until_idle=until_idle, stop=stop)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("refresh-jobs")
+@click.option("--requeue-dead", is_flag=True, help="Retry every dead-lettered job.")
+@click.option("--schedule", is_flag=True, help="Resync the job table with users before reporting.")
+def refresh_jobs_command(requeue_dead, schedule):
+    """Show the NASA refresh job queue."""
+    import json
+    from refresh_scheduler import queue_stats, requeue_dead_jobs, schedule_jobs
+
+    with db_connection() as conn:
+        if schedule:
+            click.echo(json.dumps({"scheduled": schedule_jobs(conn)}))
+        if requeue_dead:
+            click.echo(f"Requeued {requeue_dead_jobs(conn)} dead job(s).")
+        with conn.cursor() as cur:
+            stats = queue_stats(cur)
+    click.echo(json.dumps(stats, indent=2))
+
+@app.cli.command("backfill-nasa")
+@click.option("--start", "start", required=True, help="First date, YYYYMMDD or YYYY-MM-DD.")
+@click.option("--end", "end", default=None, help="Last date (default today).")
+@click.option("--all", "backfill_all", is_flag=True, help="Backfill every user with farm coordinates.")
+@click.option("--user", "user_ids", multiple=True, help="Backfill this user; repeatable.")
+@click.option("--cell", "cells", multiple=True, help="Backfill users in the grid cell containing LAT,LON; repeatable.")
+@click.option("--chunk-days", type=int, default=None, help="Days per POWER request (default NASA_BACKFILL_CHUNK_DAYS).")
+@click.option("--workers", type=int, default=None, help="Cells backfilled concurrently (default NASA_REFRESH_WORKERS).")
+def backfill_nasa_command(start, end, backfill_all, user_ids, cells, chunk_days, workers):
+    """Load NASA POWER history for a date range, resuming from saved checkpoints."""
+    # Imported lazily: nasa_data_model requires NASA_API_KEY at import time
+    import json
+    from backfill import backfill_nasa_data, parse_date, CHUNK_DAYS
+    from data_orchestrator import REFRESH_WORKERS
+
+    if backfill_all == bool(user_ids or cells):
+        raise click.UsageError("Pass either --all or at least one --user/--cell.")
+
+    try:
+        start_date = parse_date(start)
+        # No explicit end: through today, and checkpoints stay open-ended
+        end_date = parse_date(end) if end else None
+        cell_coords = [tuple(float(part) for part in cell.split(",")) for cell in cells]
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if any(len(coords) != 2 for coords in cell_coords):
+        raise click.BadParameter("--cell expects LAT,LON")
+
+    report = backfill_nasa_data(
+        start_date,
+        end_date,
+        user_ids=list(user_ids) or None,
+        cells=cell_coords or None,
+        chunk_days=chunk_days or CHUNK_DAYS,
+        max_workers=workers or REFRESH_WORKERS,
+    )
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("score-farm-health")
+@click.option("--full", is_flag=True, help="Rescore all history instead of only changed inputs.")
+def score_farm_health_command(full):
+    """Compute farm_health_metrics scores for every user from the NASA tables."""
+    import json
+    with db_connection() as conn:
+        report = score_farm_health(conn, full=full)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("rollup-nasa")
+@click.option("--full", is_flag=True, help="Recompute every stored period instead of only changed ones.")
+def rollup_nasa_command(full):
+    """Refresh the weekly and monthly NASA rollups from changed daily rows."""
+    import json
+    from rollups import refresh_rollups
+    with db_connection() as conn:
+        report = refresh_rollups(conn, full=full)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("nasa-partitions")
+@click.option("--retention-months", type=int, default=None,
+              help="Keep this many months of raw daily rows (default: NASA_RAW_RETENTION_MONTHS).")
+@click.option("--dry-run", is_flag=True, help="Report which months would be dropped without dropping them.")
+def nasa_partitions_command(retention_months, dry_run):
+    """Create upcoming monthly partitions, roll up, and drop expired rolled-up months."""
+    import json
+    from datetime import date
+    from partitions import PREMAKE_MONTHS, add_months, ensure_partitions
+    from rollups import RETENTION_MONTHS, drop_rolled_up_partitions, refresh_rollups
+    today = date.today()
+    report = {"partitions_created": ensure_partitions(today, add_months(today, PREMAKE_MONTHS))}
+    with db_connection() as conn:
+        report["rollups"] = refresh_rollups(conn)
+        report["retention"] = drop_rolled_up_partitions(
+            conn, RETENTION_MONTHS if retention_months is None else retention_months, dry_run=dry_run
+        )
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("provision-users")
+def provision_users_command():
+    """Create default farm zones and legacy metrics for users that lack them."""
+    import json
+    with db_connection() as conn:
+        report = provision_missing_users(conn)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "ndjson"]), default=None,
+              help="Input format (default: from the file extension).")
+@click.option("--dry-run", is_flag=True, help="Validate and count without importing anything.")
+def import_users_command(path, file_format, dry_run):
+    """Bulk-import farmers from a CSV or NDJSON file."""
+    import json
+    from user_import import import_users
+    with db_connection() as conn:
+        report = import_users(conn, path, file_format=file_format, dry_run=dry_run)
+    click.echo(json.dumps(report, indent=2))
+
+@app.cli.command("generate-recommendations")
+def generate_recommendations_command():
+    """Evaluate the recommendation rules for every user and store the results."""
+    import json
+    with db_connection() as conn:
+        report = generate_recommendations(conn)
+    click.echo(json.dumps(report, indent=2))
+
+@app.errorhandler(PoolTimeoutError)
+def handle_pool_timeout(e):
+    print(f"Database pool exhausted: {str(e)}")
+    return jsonify({"error": "Database busy, please retry"}), 503
+
+@app.route("/health/db-pool", methods=["GET"])
+def get_db_pool_stats():
+    return jsonify(pool_stats() or {}), 200
+
+@app.route("/health/power-cache", methods=["GET"])
+def get_power_cache_stats():
+    cache = get_power_cache()
+    return jsonify(cache.stats() if cache else {"enabled": False}), 200
+
+@app.route("/health/power-client", methods=["GET"])
+def get_power_client_stats():
+    return jsonify(get_power_client().stats()), 200
+
+@app.route("/health/identity-cache", methods=["GET"])
+def get_identity_cache_stats():
+    return jsonify(identity_cache.stats()), 200
+
+@app.route("/health/refresh-jobs", methods=["GET"])
+def get_refresh_job_stats():
+    from refresh_scheduler import queue_stats
+    with db_connection(readonly=True) as conn, conn.cursor() as cur:
+        return jsonify(queue_stats(cur)), 200
+
+@app.route("/health/response-cache", methods=["GET"])
+def get_response_cache_stats():
+    return jsonify({**response_cache.stats(), "change_poll": change_poller.stats()}), 200
+
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -296,44 +566,44 @@ def signup():
     if not all([first_name, last_name, email, password]):
         return jsonify({"error": "All fields are required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn, conn.cursor() as cur:
+        # Check if user already exists in either users table
+        existing, _ = resolve_email(cur, email)
+        if existing:
+            return jsonify({"error": "User already exists"}), 400
 
-    # Check if user already exists in new users table
-    cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-    if cur.fetchone():
-        return jsonify({"error": "User already exists"}), 400
+        # Create new user in new schema
+        user_id = str(uuid.uuid4())
+        hashed_password = hash_password(str(uuid.uuid4()))  # Generate a random password hash for demo
 
-    # Create new user in new schema
-    user_id = str(uuid.uuid4())
-    hashed_password = hash_password(str(uuid.uuid4()))  # Generate a random password hash for demo
+        cur.execute("""
+            INSERT INTO users (id, username, email, first_name, last_name, farm_name)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (user_id, username, email, first_name, last_name, f"{first_name}'s Farm"))
 
-    cur.execute("""
-        INSERT INTO users (id, username, email, first_name, last_name, farm_name)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (user_id, username, email, first_name, last_name, f"{first_name}'s Farm"))
+        # Also create legacy entry for backward compatibility
+        legacy_user_id = str(uuid.uuid4())
+        cur.execute("""
+            INSERT INTO legacy_users (userId, firstName, lastName, email, password)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (legacy_user_id, first_name, last_name, email, hashed_password))
 
-    # Also create legacy entry for backward compatibility
-    legacy_user_id = str(uuid.uuid4())
-    cur.execute("""
-        INSERT INTO legacy_users (userId, firstName, lastName, email, password)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (legacy_user_id, first_name, last_name, email, hashed_password))
+        # Rows the read endpoints expect, so they never have to create them
+        provision_user(cur, user_id, legacy_user_id)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        conn.commit()
+        invalidate_identity(user_id, legacy_user_id)
 
-    return jsonify({
-        "message": "User created successfully",
-        "user": {
-            "userId": legacy_user_id,  # Return legacy format for frontend compatibility
-            "id": user_id,  # Also return new format
-            "firstName": first_name,
-            "lastName": last_name,
-            "email": email
-        }
-    }), 201
+        return jsonify({
+            "message": "User created successfully",
+            "user": {
+                "userId": legacy_user_id,  # Return legacy format for frontend compatibility
+                "id": user_id,  # Also return new format
+                "firstName": first_name,
+                "lastName": last_name,
+                "email": email
+            }
+        }), 201
 
 @app.route("/signin", methods=["POST"])
 def signin():
@@ -344,269 +614,170 @@ def signin():
     if not all([email, password]):
         return jsonify({"error": "Email and password are required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn, conn.cursor() as cur:
+        identity, stored_password_hash = resolve_email(cur, email)
+        if identity and identity.user_id:
+            # The refresh scheduler serves recently active farms first
+            cur.execute("UPDATE users SET last_active_at = CURRENT_TIMESTAMP WHERE id = %s", (identity.user_id,))
+            conn.commit()
 
-    # Try new users table first
-    cur.execute("""
-        SELECT id, username, email, first_name, last_name, farm_name
-        FROM users WHERE email = %s
-    """, (email,))
-    user = cur.fetchone()
+    if not identity:
+        return jsonify({"error": "Invalid credentials"}), 401
 
-    if user:
-        user_id, username, user_email, first_name, last_name, farm_name = user
+    if identity.user_id:
         # For demo purposes, accept any password for new users
-        cur.close()
-        conn.close()
-
         return jsonify({
             "message": "Login successful",
             "user": {
-                "userId": user_id,  # Return UUID as userId for compatibility
-                "id": user_id,
-                "firstName": first_name,
-                "lastName": last_name,
-                "email": user_email,
+                "userId": identity.user_id,  # Return UUID as userId for compatibility
+                "id": identity.user_id,
+                "firstName": identity.first_name,
+                "lastName": identity.last_name,
+                "email": identity.email,
             },
         }), 200
 
-    # Fallback to legacy users table
-    cur.execute("SELECT userId, firstName, lastName, email, password FROM legacy_users WHERE email = %s", (email,))
-    user = cur.fetchone()
-
-    if not user:
-        return jsonify({"error": "Invalid credentials"}), 401
-
-    user_id, first_name, last_name, user_email, stored_password_hash = user
-
-    # Check password hash
+    # Legacy-only account: check password hash
     if hash_password(str(password)) != stored_password_hash:
         return jsonify({"error": "Invalid credentials"}), 401
 
-    cur.close()
-    conn.close()
-
     return jsonify({
         "message": "Login successful",
         "user": {
-            "userId": user_id,
-            "firstName": first_name,
-            "lastName": last_name,
-            "email": user_email,
+            "userId": identity.legacy_id,
+            "firstName": identity.first_name,
+            "lastName": identity.last_name,
+            "email": identity.email,
         },
     }), 200
 
+USER_NOT_FOUND = {"error": "User not found"}
+
+# Response keys for the columns of the matching queries.py query. Rows go
+# out as fetched: numeric_as_float() and the JSON provider handle the
+# DECIMAL and DATE values (see serialization.py)
+WEATHER_FORECAST_KEYS = ("date", "high", "low", "condition", "humidity", "rainChance")
+SOIL_CONDITIONS_KEYS = ("moisture", "nitrogen", "ph", "temperature")
+AI_RECOMMENDATION_KEYS = ("id", "priority", "title", "description", "type")
+
+def _load_for_user(loader, user_id):
+    """
+    Resolves `user_id` (UUID or legacy id) and runs a loader for it on a
+    read-only connection. Returns (payload, status).
+    """
+    with db_connection(readonly=True) as conn, conn.cursor() as cur:
+        numeric_as_float(cur)
+        identity = resolve_user(cur, user_id)
+        if identity is None:
+            return USER_NOT_FOUND, 404
+        # Lets cached_per_user invalidate the response by either of the user's ids
+        g.identity = identity
+        return loader(cur, identity)
+
+def _load_dashboard(cur, identity):
+    """Builds the GET /dashboard/<user_id> payload. Returns (payload, status)."""
+    if identity.user_id is None:
+        # Legacy-only account (fallback to defaults; `flask provision-users` stores them)
+        cur.execute(LEGACY_USER_METRICS_QUERY, (identity.legacy_id,))
+        metrics_row = cur.fetchone()
+        if metrics_row:
+            credit_points, farm_health, active_neighbors, market_distance, market_name = metrics_row
+        else:
+            credit_points, farm_health, active_neighbors = (
+                SAMPLE_USER_METRICS["credit_points"],
+                SAMPLE_USER_METRICS["farm_health"],
+                SAMPLE_USER_METRICS["active_neighbors"],
+            )
+            market_distance = SAMPLE_USER_METRICS["nearest_market_distance"]
+            market_name = SAMPLE_USER_METRICS["nearest_market_name"]
+
+        return {
+            "firstName": identity.first_name,
+            "lastName": identity.last_name,
+            "creditPoints": credit_points,
+            "farmHealth": farm_health,
+            "activeNeighbors": active_neighbors,
+            "nearestMarket": {
+                "name": market_name,
+                "distance": market_distance
+            }
+        }, 200
+
+    cur.execute(DASHBOARD_USER_QUERY, (identity.user_id,))
+
+    first_name, last_name, credit_points, current_rank, farm_health, active_neighbors, farm_latitude, farm_longitude = cur.fetchone()
+    nearest_market = nearest_market_for_user(cur, identity.user_id, farm_latitude, farm_longitude)
+
+    # Handle default values for missing data
+    credit_points = credit_points or 1247
+    current_rank = current_rank or "Gold"
+    farm_health = farm_health or 85.0
+    active_neighbors = active_neighbors or 0
+    nearest_market = nearest_market or {"name": "Green Valley Market", "distance": 12}
+
+    return {
+        "firstName": first_name,
+        "lastName": last_name,
+        "creditPoints": int(credit_points),
+        "currentRank": current_rank,
+        "farmHealth": float(farm_health),
+        "activeNeighbors": int(active_neighbors),
+        "nearestMarket": nearest_market
+    }, 200
+
 @app.route("/dashboard/<user_id>", methods=["GET"])
+@cached_per_user
 def get_dashboard_data(user_id):
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+    # Optional ?include=weather,soil,recommendations (or "all") bundles the
+    # other page-load payloads into this response so the frontend needs one
+    # request and one pooled connection instead of four. Cached like the
+    # endpoints it bundles, one entry per include list.
+    include = [name.strip() for name in request.args.get("include", "").split(",") if name.strip()]
+    if "all" in include:
+        include = list(DASHBOARD_INCLUDES)
+    unknown = [name for name in include if name not in DASHBOARD_INCLUDES]
+    if unknown:
+        return jsonify({"error": f"Unknown include: {', '.join(unknown)}"}), 400
+
+    def loader(cur, identity):
+        payload, _ = _load_dashboard(cur, identity)
+        for name in include:
+            key, include_loader = DASHBOARD_INCLUDES[name]
+            payload[key], _ = include_loader(cur, identity)
+        return payload, 200
 
-        # Check if user_id is a UUID (new format) or old userId format
-        if len(user_id) > 36:  # old userId format
-            # Check legacy table first
-            cur.execute("""
-                SELECT userId, firstName, lastName, email
-                FROM legacy_users
-                WHERE userId = %s
-            """, (user_id,))
-            user_row = cur.fetchone()
-            if user_row:
-                # Found in legacy table, convert to new format response
-                user_id_legacy, first_name, last_name, email = user_row
-
-                # Get metrics for legacy user (fallback to defaults)
-                cur.execute("""
-                    SELECT credit_points, farm_health, active_neighbors, nearest_market_distance, nearest_market_name
-                    FROM user_metrics
-                    WHERE user_id = %s
-                """, (user_id,))
-                metrics_row = cur.fetchone()
-                if not metrics_row:
-                    # Insert default metrics if none exist for legacy user
-                    cur.execute("""
-                        INSERT INTO user_metrics (user_id, credit_points, farm_health, active_neighbors, nearest_market_distance, nearest_market_name)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (user_id) DO NOTHING
-                    """, (user_id, 1247, 94, 23, 12, "Green Valley Market"))
-                    conn.commit()
-                    credit_points, farm_health, active_neighbors, market_distance, market_name = 1247, 94, 23, 12, "Green Valley Market"
-                else:
-                    credit_points, farm_health, active_neighbors, market_distance, market_name = metrics_row
-
-                cur.close()
-                conn.close()
-
-                return jsonify({
-                    "firstName": first_name,
-                    "lastName": last_name,
-                    "creditPoints": credit_points,
-                    "farmHealth": farm_health,
-                    "activeNeighbors": active_neighbors,
-                    "nearestMarket": {
-                        "name": market_name,
-                        "distance": market_distance
-                    }
-                }), 200
-
-        # Try new UUID format in users table
-        cur.execute("""
-            SELECT
-                u.first_name,
-                u.last_name,
-                uc.total_points as credit_points,
-                uc.current_rank,
-                fh.overall_health_score as farm_health,
-                (SELECT COUNT(*) FROM farm_neighbors WHERE user_id = u.id) as active_neighbors,
-                (SELECT json_build_object('name', market_name, 'distance', distance_km)
-                 FROM market_data
-                 ORDER BY distance_km ASC LIMIT 1) as nearest_market
-            FROM users u
-            LEFT JOIN user_credits uc ON u.id = uc.user_id
-            LEFT JOIN farm_health_metrics fh ON u.id = fh.user_id
-                AND fh.date = CURRENT_DATE
-            WHERE u.id = %s
-        """, (user_id,))
-
-        result = cur.fetchone()
-        if result:
-            first_name, last_name, credit_points, current_rank, farm_health, active_neighbors, nearest_market = result
-
-            # Handle default values for missing data
-            credit_points = credit_points or 1247
-            current_rank = current_rank or "Gold"
-            farm_health = farm_health or 85.0
-            active_neighbors = active_neighbors or 0
-            nearest_market = nearest_market or {"name": "Green Valley Market", "distance": 12}
-
-            cur.close()
-            conn.close()
-
-            return jsonify({
-                "firstName": first_name,
-                "lastName": last_name,
-                "creditPoints": int(credit_points),
-                "currentRank": current_rank,
-                "farmHealth": float(farm_health),
-                "activeNeighbors": int(active_neighbors),
-                "nearestMarket": nearest_market
-            }), 200
-
-        # If not found in new format, try legacy format
-        cur.execute("SELECT firstName, lastName FROM legacy_users WHERE userId = %s", (user_id,))
-        user_row = cur.fetchone()
-        if user_row:
-            first_name, last_name = user_row
-
-            # Get metrics for legacy user
-            cur.execute("SELECT credit_points, farm_health FROM user_metrics WHERE user_id = %s", (user_id,))
-            metrics_row = cur.fetchone()
-            credit_points = metrics_row[0] if metrics_row else 1247
-            farm_health = metrics_row[1] if metrics_row and metrics_row[1] else 85.0
-
-            return jsonify({
-                "firstName": first_name,
-                "lastName": last_name,
-                "creditPoints": credit_points,
-                "farmHealth": farm_health,
-                "activeNeighbors": 0,
-                "nearestMarket": {
-                    "name": "Green Valley Market",
-                    "distance": 12
-                }
-            }), 200
-
-        cur.close()
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
+    try:
+        payload, status = _load_for_user(loader, user_id)
+        return jsonify(payload), status
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         print(f"Dashboard error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/weather-forecast/<user_id>", methods=["GET"])
-def get_weather_forecast(user_id):
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Try new format first - if user_id is UUID
-        cur.execute("""
-            SELECT
-                forecast_date as date,
-                temperature_max as high,
-                temperature_min as low,
-                weather_condition as condition,
-                humidity,
-                precipitation_probability as rain_chance
-            FROM nasa_weather_forecast
-            WHERE user_id = %s
-                AND forecast_date >= CURRENT_DATE
-                AND forecast_date <= CURRENT_DATE + INTERVAL '7 days'
-            ORDER BY forecast_date ASC
-        """, (user_id,))
-
+def _load_weather_forecast(cur, identity):
+    """Builds the GET /weather-forecast/<user_id> payload. Returns (payload, status)."""
+    weather_rows = []
+    if identity.user_id is not None:
+        cur.execute(WEATHER_FORECAST_QUERY, (identity.user_id,))
         weather_rows = cur.fetchall()
 
-        # If no data found, insert sample data for this user
-        if not weather_rows:
-            from datetime import datetime, timedelta
-            today = datetime.now().date()
-
-            sample_weather = []
-            for i in range(7):
-                forecast_date = today + timedelta(days=i)
-                sample_weather.append((
-                    user_id, forecast_date,
-                    28 - i*0.5, 18 - i*0.5,
-                    ["Clear skies", "Partly cloudy", "Light rain", "Windy", "Sunny"][min(i, 4)],
-                    10.0 + i*5.0,  # precipitation_probability
-                    65 - i*2,  # humidity
-                    5.0 + i*0.5  # wind_speed (not used in response)
-                ))
-
-            cur.executemany("""
-                INSERT INTO nasa_weather_forecast (user_id, forecast_date, temperature_max, temperature_min, weather_condition, precipitation_probability, humidity, wind_speed)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (user_id, forecast_date) DO NOTHING
-            """, sample_weather)
-            conn.commit()
-
-            # Fetch the inserted data
-            cur.execute("""
-                SELECT
-                    forecast_date as date,
-                    temperature_max as high,
-                    temperature_min as low,
-                    weather_condition as condition,
-                    humidity,
-                    precipitation_probability as rain_chance
-                FROM nasa_weather_forecast
-                WHERE user_id = %s
-                    AND forecast_date >= CURRENT_DATE
-                    AND forecast_date <= CURRENT_DATE + INTERVAL '7 days'
-                ORDER BY forecast_date ASC
-            """, (user_id,))
-            weather_rows = cur.fetchall()
-
-        weather_data = []
-        for row in weather_rows:
-            date, high, low, condition, humidity, rain_chance = row
-            weather_data.append({
-                "date": date.isoformat(),
-                "high": float(high),
-                "low": float(low),
-                "condition": condition,
-                "humidity": float(humidity),
-                "rainChance": float(rain_chance)
-            })
+    # No NASA forecast (or a legacy-only account): answer with placeholders rather than storing them
+    if not weather_rows:
+        return sample_weather_forecast(date.today()), 200
 
-        cur.close()
-        conn.close()
+    return records(weather_rows, WEATHER_FORECAST_KEYS), 200
 
-        return jsonify(weather_data), 200
+@app.route("/weather-forecast/<user_id>", methods=["GET"])
+@cached_per_user
+def get_weather_forecast(user_id):
+    try:
+        payload, status = _load_for_user(_load_weather_forecast, user_id)
+        return jsonify(payload), status
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         print(f"Weather forecast error: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -615,288 +786,132 @@ def get_weather_forecast(user_id):
 @app.route("/weather-forecast", methods=["GET"])
 def get_weather_forecast_legacy():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Insert sample data into legacy table if needed
-        cur.execute("""
-            INSERT INTO weather_forecast (date, temperature_high, temperature_low, condition, humidity, chance_of_rain)
-            VALUES
-                (CURRENT_DATE, 28, 18, 'Clear skies', 65, 10),
-                (CURRENT_DATE + 1, 27, 17, 'Partly cloudy', 70, 20),
-                (CURRENT_DATE + 2, 26, 16, 'Light rain', 75, 80),
-                (CURRENT_DATE + 3, 29, 19, 'Sunny', 60, 5)
-            ON CONFLICT DO NOTHING
-        """)
-        conn.commit()
-
-        cur.execute("""
-            SELECT date, temperature_high, temperature_low, condition, humidity, chance_of_rain
-            FROM weather_forecast
-            WHERE date >= CURRENT_DATE
-            ORDER BY date ASC
-            LIMIT 7
-        """)
-        weather_rows = cur.fetchall()
-
-        weather_data = []
-        for row in weather_rows:
-            date, high, low, condition, humidity, rain_chance = row
-            weather_data.append({
-                "date": date.isoformat(),
-                "high": float(high),
-                "low": float(low),
-                "condition": condition,
-                "humidity": float(humidity),
-                "rainChance": float(rain_chance)
-            })
+        with db_connection(readonly=True) as conn, conn.cursor() as cur:
+            numeric_as_float(cur)
+            cur.execute(LEGACY_WEATHER_FORECAST_QUERY)
+            weather_rows = cur.fetchall()
 
-        cur.close()
-        conn.close()
+            if not weather_rows:
+                return jsonify(sample_legacy_weather_forecast(date.today())), 200
 
-        return jsonify(weather_data), 200
+            return jsonify(records(weather_rows, WEATHER_FORECAST_KEYS)), 200
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/soil-conditions/<user_id>", methods=["GET"])
-def get_soil_conditions(user_id):
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+def _load_soil_conditions(cur, identity):
+    """Builds the GET /soil-conditions/<user_id> payload. Returns (payload, status)."""
+    if identity.user_id is not None:
+        cur.execute(SOIL_CONDITIONS_QUERY, (identity.user_id,))
 
-        # Check if user_id is UUID format (new schema)
-        if len(user_id) == 36:  # UUID format
-            cur.execute("""
-                SELECT
-                    ROUND((nsd.surface_wetness)::numeric, 0) as moisture,
-                    65 as nitrogen,
-                    6.5 as ph,
-                    ROUND(nsd.soil_temperature_0_5cm::numeric, 0) as temperature
-                FROM nasa_soil_data nsd
-                WHERE nsd.user_id = %s
-                    AND nsd.date = CURRENT_DATE
-                ORDER BY nsd.created_at DESC
-                LIMIT 1
-            """, (user_id,))
-
-            soil_row = cur.fetchone()
-
-            if not soil_row:
-                # Insert sample NASA soil data if none exists
-                # First, ensure we have a farm zone for this user
-                cur.execute("""
-                    INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
-                    VALUES (%s, 'A', 'Mixed Crops', 5.0)
-                    ON CONFLICT (user_id, zone_name) DO NOTHING
-                    RETURNING id
-                """, (user_id,))
-
-                zone_result = cur.fetchone()
-                zone_id = zone_result[0] if zone_result else None
-
-                if zone_id:
-                    cur.execute("""
-                        INSERT INTO nasa_soil_data (user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm, surface_wetness)
-                        VALUES (%s, %s, CURRENT_DATE, 0.25, 22.5, 78.0)
-                        ON CONFLICT (user_id, zone_id, date) DO NOTHING
-                    """, (user_id, zone_id))
-                    conn.commit()
-
-                    # Fetch the inserted data
-                    cur.execute("""
-                        SELECT
-                            ROUND((nsd.surface_wetness)::numeric, 0) as moisture,
-                            65 as nitrogen,
-                            6.5 as ph,
-                            ROUND(nsd.soil_temperature_0_5cm::numeric, 0) as temperature
-                        FROM nasa_soil_data nsd
-                        WHERE nsd.user_id = %s AND nsd.date = CURRENT_DATE
-                        ORDER BY nsd.created_at DESC
-                        LIMIT 1
-                    """, (user_id,))
-                    soil_row = cur.fetchone()
-
-            if soil_row:
-                moisture, nitrogen, ph, temp = soil_row
-
-                cur.close()
-                conn.close()
-
-                return jsonify({
-                    "moisture": float(moisture),
-                    "nitrogen": float(nitrogen),
-                    "ph": float(ph),
-                    "temperature": float(temp)
-                }), 200
-
-        # Fallback to legacy table for old userId format
-        cur.execute("""
-            SELECT moisture_level, nitrogen_level, ph_level, temperature
-            FROM soil_conditions
-            WHERE user_id = %s
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """, (user_id,))
         soil_row = cur.fetchone()
 
-        if not soil_row:
-            # Insert sample data in legacy table if none exists
-            cur.execute("""
-                INSERT INTO soil_conditions (user_id, moisture_level, nitrogen_level, ph_level, temperature)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (user_id, 78, 65, 6.5, 22))
-            conn.commit()
-            moisture, nitrogen, ph, temp = 78, 65, 6.5, 22
-        else:
-            moisture, nitrogen, ph, temp = soil_row
+        if soil_row:
+            return dict(zip(SOIL_CONDITIONS_KEYS, soil_row)), 200
 
-        cur.close()
-        conn.close()
+    # Fallback to the legacy table
+    soil_row = None
+    if identity.legacy_id is not None:
+        cur.execute(LEGACY_SOIL_CONDITIONS_QUERY, (identity.legacy_id,))
+        soil_row = cur.fetchone()
 
-        return jsonify({
-            "moisture": float(moisture),
-            "nitrogen": float(nitrogen),
-            "ph": float(ph),
-            "temperature": float(temp)
-        }), 200
+    if not soil_row:
+        # No soil data for today yet: answer with placeholders rather than storing them
+        return dict(SAMPLE_SOIL_CONDITIONS), 200
+    return dict(zip(SOIL_CONDITIONS_KEYS, soil_row)), 200
 
+@app.route("/soil-conditions/<user_id>", methods=["GET"])
+@cached_per_user
+def get_soil_conditions(user_id):
+    try:
+        payload, status = _load_for_user(_load_soil_conditions, user_id)
+        return jsonify(payload), status
+
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         print(f"Soil conditions error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _load_ai_recommendations(cur, identity):
+    """Builds the GET /ai-recommendations/<user_id> payload. Returns (payload, status)."""
+    if identity.user_id is not None:
+        cur.execute(AI_RECOMMENDATIONS_QUERY, (identity.user_id,))
+
+        return {"recommendations": records(cur.fetchall(), AI_RECOMMENDATION_KEYS)}, 200
+
+    # Fallback to static recommendations for legacy users
+    recommendations = [
+        {
+            "id": 1,
+            "priority": "High",
+            "title": "Optimal planting window for tomatoes",
+            "description": "Soil conditions and weather patterns indicate ideal conditions for the next 5 days. Market demand is high with prices at $4.50/kg.",
+            "type": "planting"
+        },
+        {
+            "id": 2,
+            "priority": "Medium",
+            "title": "Consider collaboration with 3 nearby farmers",
+            "description": "Neighboring farms are planting complementary crops. Coordinating can optimize pest control and earn 150 credit points.",
+            "type": "collaboration"
+        },
+        {
+            "id": 3,
+            "priority": "Watch",
+            "title": "Pest risk increasing for corn fields",
+            "description": "Satellite data shows increased activity in the region. Consider preventive measures within 48 hours.",
+            "type": "pest"
+        }
+    ]
+
+    return {"recommendations": recommendations}, 200
+
 @app.route("/ai-recommendations/<user_id>", methods=["GET"])
+@cached_per_user
 def get_ai_recommendations(user_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        payload, status = _load_for_user(_load_ai_recommendations, user_id)
+        return jsonify(payload), status
 
-        # Try new format first - if user_id is UUID
-        if len(user_id) == 36:  # UUID format
-            cur.execute("""
-                SELECT
-                    id,
-                    priority,
-                    title,
-                    description,
-                    recommendation_type as type
-                FROM nasa_ai_recommendations
-                WHERE user_id = %s
-                    AND status = 'active'
-                    AND (time_window_start IS NULL OR time_window_start <= CURRENT_DATE)
-                    AND (time_window_end IS NULL OR time_window_end >= CURRENT_DATE)
-                ORDER BY
-                    CASE priority
-                        WHEN 'High' THEN 1
-                        WHEN 'Medium' THEN 2
-                        WHEN 'Watch' THEN 3
-                        ELSE 4
-                    END,
-                    created_at DESC
-            """, (user_id,))
-
-            recommendation_rows = cur.fetchall()
-
-            # If no recommendations found, insert sample data
-            if not recommendation_rows:
-                # First ensure we have farm zones
-                cur.execute("""
-                    INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
-                    VALUES
-                        (%s, 'A', 'Wheat', 5.0),
-                        (%s, 'B', 'Corn', 3.5),
-                        (%s, 'C', 'Vegetables', 2.0)
-                    ON CONFLICT (user_id, zone_name) DO NOTHING
-                """, (user_id, user_id, user_id))
-                conn.commit()
-
-                # Insert sample AI recommendations
-                sample_recommendations = [
-                    (user_id, None, 'Optimal planting window for tomatoes', 'Soil conditions and weather patterns indicate ideal conditions for the next 5 days. Market demand is high with prices at $4.50/kg.', 'planting', 'High', '["POWER", "SMAP", "MODIS"]', 'Tomatoes', '{"price": 4.50, "unit": "kg", "demand": "high"}'),
-                    (user_id, None, 'Consider collaboration with nearby farmers', 'Neighboring farms are planting complementary crops. Coordinating can optimize pest control and earn credit points.', 'collaboration', 'Medium', '["MODIS", "POWER"]', None, '{"potential_points": 150}'),
-                    (user_id, None, 'Pest risk increasing for corn fields', 'Satellite data shows increased activity in the region. Consider preventive measures within 48 hours.', 'pest_control', 'Watch', '["MODIS", "FIRMS"]', 'Corn', '{"risk_level": "high", "action": "preventive_treatment"}')
-                ]
-
-                cur.executemany("""
-                    INSERT INTO nasa_ai_recommendations (user_id, zone_id, title, description, recommendation_type, priority, nasa_datasets_used, crop_suggestion, market_insight)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id, title) DO NOTHING
-                """, sample_recommendations)
-                conn.commit()
-
-                # Fetch the inserted recommendations
-                cur.execute("""
-                    SELECT
-                        id,
-                        priority,
-                        title,
-                        description,
-                        recommendation_type as type
-                    FROM nasa_ai_recommendations
-                    WHERE user_id = %s
-                        AND status = 'active'
-                        AND (time_window_start IS NULL OR time_window_start <= CURRENT_DATE)
-                        AND (time_window_end IS NULL OR time_window_end >= CURRENT_DATE)
-                    ORDER BY
-                        CASE priority
-                            WHEN 'High' THEN 1
-                            WHEN 'Medium' THEN 2
-                            WHEN 'Watch' THEN 3
-                            ELSE 4
-                        END,
-                        created_at DESC
-                """, (user_id,))
-                recommendation_rows = cur.fetchall()
-
-            recommendations = []
-            for row in recommendation_rows:
-                rec_id, priority, title, description, rec_type = row
-                recommendations.append({
-                    "id": rec_id,
-                    "priority": priority,
-                    "title": title,
-                    "description": description,
-                    "type": rec_type
-                })
-
-            cur.close()
-            conn.close()
-
-            return jsonify({"recommendations": recommendations}), 200
-
-        # Fallback to static recommendations for legacy users
-        recommendations = [
-            {
-                "id": 1,
-                "priority": "High",
-                "title": "Optimal planting window for tomatoes",
-                "description": "Soil conditions and weather patterns indicate ideal conditions for the next 5 days. Market demand is high with prices at $4.50/kg.",
-                "type": "planting"
-            },
-            {
-                "id": 2,
-                "priority": "Medium",
-                "title": "Consider collaboration with 3 nearby farmers",
-                "description": "Neighboring farms are planting complementary crops. Coordinating can optimize pest control and earn 150 credit points.",
-                "type": "collaboration"
-            },
-            {
-                "id": 3,
-                "priority": "Watch",
-                "title": "Pest risk increasing for corn fields",
-                "description": "Satellite data shows increased activity in the region. Consider preventive measures within 48 hours.",
-                "type": "pest"
-            }
-        ]
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        print(f"AI recommendations error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        cur.close()
-        conn.close()
+@app.route("/climate-history/<user_id>", methods=["GET"])
+@cached_per_user
+def get_climate_history(user_id):
+    # ?from=&to= (YYYY-MM-DD), params=temperature,precipitation,...,
+    # agg=auto|day|week|month, max_points=N; see climate_history.py
+    try:
+        from_date, to_date, params, agg, max_points = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify({"recommendations": recommendations}), 200
+    def loader(cur, identity):
+        return load_climate_history(cur, identity.user_id, from_date, to_date, params, agg, max_points), 200
 
+    try:
+        payload, status = _load_for_user(loader, user_id)
+        return jsonify(payload), status
+
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"AI recommendations error: {str(e)}")
+        print(f"Climate history error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Payloads that /dashboard/<user_id>?include=... can bundle, keyed by include name.
+# Each entry is (response key, loader); loaders return the same body as their route.
+DASHBOARD_INCLUDES = {
+    "weather": ("weatherForecast", _load_weather_forecast),
+    "soil": ("soilConditions", _load_soil_conditions),
+    "recommendations": ("aiRecommendations", _load_ai_recommendations),
+}
+
 if __name__ == "__main__":
     app.run(debug=True)
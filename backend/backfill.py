@@ -0,0 +1,232 @@
+"""
+Streaming historical backfill of NASA POWER data.
+
+A backfill covers an arbitrary date range (e.g. 1990 to today) for a set of
+users or grid cells. Each grid cell is walked in API-sized chunks through a
+generator pipeline
+
+    chunk ranges -> POWER fetch -> vectorized decode -> per-user rows -> bulk upsert
+
+so only one chunk per worker is ever held in memory, whatever the length of
+the range. After every chunk the rows and the users' checkpoints in
+nasa_backfill_checkpoints are committed together. Checkpoints are keyed
+on the start date, so re-running a backfill from the same (or a later)
+start skips everything already completed, even on a later day when the
+default end (today) has moved.
+
+Run with `flask backfill-nasa --start 19900101 --all`.
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from bulk_write import upsert_weather_rows, upsert_soil_rows
+from data_orchestrator import DB_PARAMETERS, REFRESH_WORKERS, _archive_raw, _ensure_default_zones
+from db import db_connection
+from nasa_data_model import fetch_power_point
+from power_cache import snap_to_cell
+from power_decode import decode_power_parameters, select_from, weather_rows, soil_rows
+from response_cache import invalidate_user, mark_users_changed
+
+# Days per POWER request; memory per worker scales with this, not the range
+CHUNK_DAYS = int(os.getenv("NASA_BACKFILL_CHUNK_DAYS", "366"))
+
+DATE_FORMAT = "%Y%m%d"
+
+
+class BackfillError(Exception):
+    pass
+
+
+def _chunk_ranges(start_date, end_date, chunk_days):
+    """Yields consecutive (chunk_start, chunk_end) dates covering start..end inclusive."""
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def _fetch_chunks(cell, ranges):
+    """Yields (chunk_start, chunk_end, POWER parameter mapping) per range."""
+    for chunk_start, chunk_end in ranges:
+        nasa_data = fetch_power_point(
+            cell[0], cell[1], chunk_start.strftime(DATE_FORMAT), chunk_end.strftime(DATE_FORMAT)
+        )
+        if nasa_data is None:
+            raise BackfillError(f"POWER fetch failed for cell {cell} {chunk_start}..{chunk_end}")
+        _archive_raw(cell, nasa_data)
+        yield chunk_start, chunk_end, nasa_data
+
+
+def _chunk_rows(users, zone_ids, chunks):
+    """
+    Yields (chunk_end, user_ids, weather_rows, soil_rows) per chunk. `users`
+    maps user_id -> first date still to load; users already past a chunk are
+    left out of it.
+    """
+    for chunk_start, chunk_end, nasa_data in chunks:
+        dates, columns = decode_power_parameters(nasa_data, DB_PARAMETERS)
+        user_ids, weather, soil = [], [], []
+        for user_id, resume_date in users.items():
+            if resume_date > chunk_end:
+                continue
+            user_dates, user_columns = select_from(
+                dates, columns, max(resume_date, chunk_start).strftime(DATE_FORMAT)
+            )
+            user_ids.append(user_id)
+            weather.extend(weather_rows(user_id, user_dates, user_columns))
+            soil.extend(soil_rows(user_id, zone_ids[user_id], user_dates, user_columns))
+        yield chunk_end, user_ids, weather, soil
+
+
+def _load_checkpoints(cur, user_ids, start_date):
+    """
+    Returns {user_id: first date still to load} for a backfill from
+    start_date. Any checkpoint starting on or before start_date covers
+    start_date..completed_through, whatever end its run had, so a re-run
+    resumes after the furthest of them.
+    """
+    cur.execute("""
+        SELECT user_id, MAX(completed_through) FROM nasa_backfill_checkpoints
+        WHERE user_id = ANY(%s::uuid[]) AND range_start <= %s
+        GROUP BY user_id
+    """, (list(user_ids), start_date))
+    completed = {str(user_id): through for user_id, through in cur.fetchall()}
+    return {
+        user_id: max(start_date, completed[user_id] + timedelta(days=1)) if user_id in completed else start_date
+        for user_id in user_ids
+    }
+
+
+def _save_checkpoints(cur, user_ids, start_date, end_date, completed_through):
+    """end_date is None for runs without an explicit end."""
+    cur.execute("""
+        INSERT INTO nasa_backfill_checkpoints (user_id, range_start, range_end, completed_through)
+        SELECT uid, %s, %s, %s FROM unnest(%s::uuid[]) AS uid
+        ON CONFLICT (user_id, range_start) DO UPDATE SET
+            range_end = EXCLUDED.range_end,
+            completed_through = GREATEST(nasa_backfill_checkpoints.completed_through, EXCLUDED.completed_through),
+            updated_at = CURRENT_TIMESTAMP
+    """, (start_date, end_date, completed_through, list(user_ids)))
+
+
+def _backfill_cell(cell, user_ids, start_date, end_date, through_date, chunk_days):
+    """
+    Backfills one grid cell chunk by chunk through through_date, committing
+    rows and checkpoints after each. end_date is the explicit end recorded
+    with the checkpoints, or None. Returns (rows_written, chunks_written,
+    ok); on failure the chunks committed so far stay checkpointed and a
+    re-run resumes there.
+    """
+    rows_written = 0
+    chunks_written = 0
+    ok = True
+    with db_connection() as conn, conn.cursor() as cur:
+        users = _load_checkpoints(cur, user_ids, start_date)
+        users = {user_id: resume for user_id, resume in users.items() if resume <= through_date}
+        if not users:
+            return 0, 0, ok
+        zone_ids = _ensure_default_zones(cur, list(users))
+        conn.commit()
+
+        ranges = _chunk_ranges(min(users.values()), through_date, chunk_days)
+        try:
+            for chunk_end, chunk_users, weather, soil in _chunk_rows(users, zone_ids, _fetch_chunks(cell, ranges)):
+                upsert_weather_rows(cur, weather)
+                upsert_soil_rows(cur, soil)
+                _save_checkpoints(cur, chunk_users, start_date, end_date, chunk_end)
+                mark_users_changed(cur, chunk_users)
+                conn.commit()
+                rows_written += len(weather)
+                chunks_written += 1
+        except Exception as e:
+            conn.rollback()
+            print(f"Error backfilling cell {cell}: {str(e)}")
+            ok = False
+
+    if chunks_written:
+        for user_id in users:
+            invalidate_user(user_id)
+    return rows_written, chunks_written, ok
+
+
+def backfill_nasa_data(start_date, end_date=None, user_ids=None, cells=None,
+                       chunk_days=CHUNK_DAYS, max_workers=REFRESH_WORKERS):
+    """
+    Backfills nasa_weather_data and default-zone nasa_soil_data for
+    start_date..end_date (dates, inclusive; end_date None means today).
+    Limited to `user_ids` and to users whose farm falls in one of `cells`
+    ((lat, lon) pairs, snapped to the POWER grid) when given; every user
+    with farm coordinates otherwise. Returns a report dict.
+    """
+    started = time.perf_counter()
+    through_date = end_date or date.today()
+    if through_date < start_date:
+        raise ValueError("end_date must not be before start_date")
+
+    with db_connection() as conn, conn.cursor() as cur:
+        query = """
+            SELECT id, farm_latitude, farm_longitude FROM users
+            WHERE farm_latitude IS NOT NULL AND farm_longitude IS NOT NULL
+        """
+        if user_ids is not None:
+            cur.execute(query + " AND id = ANY(%s::uuid[])", (list(user_ids),))
+        else:
+            cur.execute(query)
+        user_rows = cur.fetchall()
+
+    wanted_cells = {snap_to_cell(lat, lon) for lat, lon in cells} if cells else None
+    users_by_cell = defaultdict(list)
+    for user_id, latitude, longitude in user_rows:
+        cell = snap_to_cell(latitude, longitude)
+        if wanted_cells is None or cell in wanted_cells:
+            users_by_cell[cell].append(str(user_id))
+
+    users = sum(len(cell_users) for cell_users in users_by_cell.values())
+    print(f"Backfilling NASA data {start_date}..{through_date} for {users} users "
+          f"in {len(users_by_cell)} grid cells ({chunk_days}-day chunks, {max_workers} workers).")
+
+    rows_written = 0
+    chunks_written = 0
+    failed_cells = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_backfill_cell, cell, cell_users, start_date, end_date, through_date, chunk_days): cell
+            for cell, cell_users in users_by_cell.items()
+        }
+        for future in as_completed(futures):
+            try:
+                cell_rows, cell_chunks, ok = future.result()
+            except Exception as e:
+                print(f"Error backfilling cell {futures[future]}: {str(e)}")
+                failed_cells += 1
+                continue
+            if not ok:
+                failed_cells += 1
+            rows_written += cell_rows
+            chunks_written += cell_chunks
+
+    total_seconds = time.perf_counter() - started
+    return {
+        "start": start_date.isoformat(),
+        "end": through_date.isoformat(),
+        "users": users,
+        "cells": len(users_by_cell),
+        "failed_cells": failed_cells,
+        "chunks_written": chunks_written,
+        "weather_rows_written": rows_written,
+        "total_seconds": round(total_seconds, 3),
+    }
+
+
+def parse_date(value):
+    """Parses YYYYMMDD or YYYY-MM-DD."""
+    for date_format in (DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date {value!r}, expected YYYYMMDD or YYYY-MM-DD")
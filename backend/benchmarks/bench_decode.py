@@ -0,0 +1,104 @@
+"""
+Compares the old per-date POWER decoding loop (strptime and a fill-value
+closure for every day) against power_decode's vectorized decode + row
+building, on synthetic payloads shaped like real POWER responses.
+
+Run from backend/ (no database needed):
+
+    python -m benchmarks.bench_decode [--cells 10] [--repeat 5]
+
+Reports the best time per 10k cell-days for each decoder.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from power_decode import decode_power_parameters, select_from, soil_rows, weather_rows
+
+# Same 13 parameters nasa_data_model requests; listed here so the benchmark
+# does not need NASA_API_KEY
+POWER_PARAMETERS = [
+    "T2M", "T2M_MAX", "T2M_MIN", "PRECTOTCORR", "WS10M", "RH2M", "ALLSKY_SFC_SW_DWN",
+    "TS", "GWETTOP", "SM_0_10cm", "EVAP", "QV2M", "PS",
+]
+
+BATCHES = {
+    "30_days": 30,
+    "1_year": 365,
+    "10_years": 3650,
+}
+
+
+def _make_payload(days):
+    start = date.today() - timedelta(days=days)
+    keys = [(start + timedelta(days=offset)).strftime("%Y%m%d") for offset in range(days)]
+    return {
+        param: {key: (-999.0 if random.random() < 0.02 else round(random.uniform(0, 40), 2)) for key in keys}
+        for param in POWER_PARAMETERS
+    }
+
+
+def _legacy(nasa_data):
+    """The loop data_orchestrator used before power_decode."""
+    weather_records = []
+    soil_records = []
+    for date_str in sorted(nasa_data.get("T2M", {})):
+        def get_nasa_value(param):
+            value = nasa_data.get(param, {}).get(date_str)
+            return None if value is None or value <= -999 else value
+
+        weather_records.append((
+            "user", datetime.strptime(date_str, "%Y%m%d").date(),
+            get_nasa_value("T2M"), get_nasa_value("PRECTOTCORR"), get_nasa_value("EVAP"),
+        ))
+        soil_records.append((
+            "user", 1, datetime.strptime(date_str, "%Y%m%d").date(),
+            get_nasa_value("SM_0_10cm"), get_nasa_value("TS"), get_nasa_value("GWETTOP"),
+        ))
+    return weather_records, soil_records
+
+
+def _vectorized(nasa_data):
+    dates, columns = decode_power_parameters(nasa_data)
+    dates, columns = select_from(dates, columns, None)
+    return weather_rows("user", dates, columns), soil_rows("user", 1, dates, columns)
+
+
+DECODERS = {
+    "legacy_loop": _legacy,
+    "vectorized": _vectorized,
+}
+
+
+def run(cells=10, repeat=5):
+    results = {}
+    for batch_name, days in BATCHES.items():
+        payloads = [_make_payload(days) for _ in range(cells)]
+        cell_days = cells * days
+        for decoder_name, decode in DECODERS.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for payload in payloads:
+                    decode(payload)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            ms_per_10k = best * 1000 * 10000 / cell_days
+            results.setdefault(batch_name, {})[decoder_name] = {
+                "cell_days": cell_days,
+                "best_seconds": round(best, 4),
+                "ms_per_10k_cell_days": round(ms_per_10k, 2),
+            }
+            print(f"{batch_name:>9} {decoder_name:>12}: {cell_days:>7} cell-days "
+                  f"in {best:.3f}s ({ms_per_10k:,.1f} ms / 10k cell-days)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=10, help="Grid-cell payloads per batch.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per decoder; the best is reported.")
+    args = parser.parse_args()
+    print(json.dumps(run(args.cells, args.repeat), indent=2))
@@ -0,0 +1,52 @@
+"""
+End-to-end NASA refresh benchmark: POWER fetch, decode and bulk upsert for
+every user in the database, against the local stub POWER server.
+
+Seed users first (benchmarks/seed.py), then run from backend/:
+
+    python -m benchmarks.bench_refresh [--mode point|regional|both] [--latency-ms 50] [--workers 8]
+
+Each mode runs a full refresh (every day is rewritten) followed by an
+incremental one, which shows the cost of the no-change path. This writes
+to the real NASA tables, so only run it against a benchmark database.
+"""
+import argparse
+import json
+import os
+
+# Configure the client and cache before the app modules read their settings
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+os.environ["POWER_CACHE_ENABLED"] = "0"
+os.environ["POWER_RATE_PER_SECOND"] = "0"
+
+from benchmarks.stub_power_server import start_server  # noqa: E402
+
+
+def run(modes, latency_ms=0, workers=8):
+    server = start_server(latency_seconds=latency_ms / 1000.0)
+    os.environ["POWER_BASE_URL"] = server.base_url
+
+    from data_orchestrator import refresh_all_users
+    from power_client import get_client
+
+    results = {"latency_ms": latency_ms, "workers": workers}
+    for mode in modes:
+        for label, incremental in (("full", False), ("incremental", True)):
+            calls_before = sum(server.calls.values())
+            report = refresh_all_users(incremental=incremental, max_workers=workers, mode=mode)
+            report["power_calls"] = sum(server.calls.values()) - calls_before
+            results[f"{mode}_{label}"] = report
+    results["power_client"] = get_client().stats()
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["point", "regional", "both"], default="both")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated POWER response latency.")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    modes = ["point", "regional"] if args.mode == "both" else [args.mode]
+    print(json.dumps(run(modes, args.latency_ms, args.workers), indent=2, default=str))
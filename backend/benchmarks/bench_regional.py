@@ -0,0 +1,79 @@
+"""
+Counts POWER API calls for a dense cluster of farms in point mode (one
+daily/point call per grid cell) versus regional mode (daily/regional
+bounding boxes, one call per parameter per box), against the local stub
+server, and checks both modes return the same values.
+
+Run from backend/ (no database or API key needed):
+
+    python -m benchmarks.bench_regional [--farms 2000] [--degrees 6] [--days 30]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+
+# Configure the client and cache before the app modules read their settings
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+os.environ["POWER_CACHE_ENABLED"] = "0"
+os.environ["POWER_RATE_PER_SECOND"] = "0"
+
+from benchmarks.stub_power_server import start_server  # noqa: E402
+
+SERVER = start_server()
+os.environ["POWER_BASE_URL"] = SERVER.base_url
+
+from nasa_data_model import POWER_PARAMETERS, fetch_power_point, get_regional_climate_data  # noqa: E402
+from power_cache import snap_to_cell  # noqa: E402
+from power_client import get_client  # noqa: E402
+
+
+def run(farms=2000, degrees=6.0, days=30, centre=(0.0, 37.0)):
+    random.seed(42)
+    cells = {
+        snap_to_cell(centre[0] + random.uniform(-degrees / 2, degrees / 2),
+                     centre[1] + random.uniform(-degrees / 2, degrees / 2))
+        for _ in range(farms)
+    }
+    end = date.today()
+    start_str = (end - timedelta(days=days)).strftime("%Y%m%d")
+    end_str = end.strftime("%Y%m%d")
+    client = get_client()
+
+    results = {"farms": farms, "cells": len(cells), "days": days}
+
+    before = client.stats()["requests"]
+    started = time.perf_counter()
+    point = {cell: fetch_power_point(cell[0], cell[1], start_str, end_str) for cell in cells}
+    results["point"] = {
+        "calls": client.stats()["requests"] - before,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+    before = client.stats()["requests"]
+    started = time.perf_counter()
+    regional = get_regional_climate_data({cell: start_str for cell in cells}, end_str)
+    results["regional"] = {
+        "calls": client.stats()["requests"] - before,
+        "seconds": round(time.perf_counter() - started, 3),
+        "cells_covered": len(regional),
+    }
+
+    mismatched = [
+        cell for cell, data in regional.items()
+        if any(data.get(param) != point[cell].get(param) for param in POWER_PARAMETERS)
+    ]
+    results["mismatched_cells"] = len(mismatched)
+    results["call_reduction"] = round(results["point"]["calls"] / max(results["regional"]["calls"], 1), 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--farms", type=int, default=2000)
+    parser.add_argument("--degrees", type=float, default=6.0, help="Side of the square the farms are spread over.")
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    print(json.dumps(run(args.farms, args.degrees, args.days), indent=2))
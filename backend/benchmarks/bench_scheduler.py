@@ -0,0 +1,129 @@
+"""
+Refresh scheduler throughput by worker count, against the local stub
+POWER server with simulated latency.
+
+Seed users first (benchmarks/seed.py), then run from backend/:
+
+    python -m benchmarks.bench_scheduler [--workers 1,2,4,8] [--processes 1,2,4] [--latency-ms 100]
+
+Each run makes every job due, drains the queue with --until-idle
+semantics and reports jobs (grid cells) per second. Runs first scale the
+worker threads of one process, then the number of scheduler processes
+(each with the largest --workers count) sharing the queue, as separate
+hosts would. Threads of one process share its GIL for decoding and
+storing, so past a few workers more throughput comes from more processes.
+The stub, the database and the schedulers all share this host's CPUs, so
+on a small machine every configuration levels off at the same rate; the
+plateau is then the host, not the queue. This writes to the real NASA tables and the job table, so only run it
+against a benchmark database.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# Configure the client and cache before the app modules read their settings
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+os.environ["POWER_CACHE_ENABLED"] = "0"
+os.environ["POWER_RATE_PER_SECOND"] = "0"
+os.environ.setdefault("POWER_MAX_CONCURRENCY", "64")
+
+from benchmarks.stub_power_server import start_server  # noqa: E402
+
+
+STUB_PROCESSES = min(4, os.cpu_count() or 1)
+
+
+def _serve(latency_seconds, port, urls):
+    server = start_server(port=port, latency_seconds=latency_seconds, reuse_port=True)
+    urls.put(server.server_port)
+    threading.Event().wait()
+
+
+def _scheduler_process(workers, reports):
+    from refresh_scheduler import run_scheduler
+    reports.put(run_scheduler(workers=workers, until_idle=True))
+
+
+def _run_processes(context, processes, workers):
+    """Runs `processes` schedulers in parallel; returns the combined report."""
+    reports = context.Queue()
+    started = time.perf_counter()
+    children = [context.Process(target=_scheduler_process, args=(workers, reports)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    results = [reports.get() for _ in children]
+    for child in children:
+        child.join()
+    seconds = time.perf_counter() - started
+    jobs = sum(result["jobs"] for result in results)
+    return {
+        "processes": processes,
+        "workers": workers * processes,
+        "jobs": jobs,
+        "failed": sum(result["retried"] + result["dead_lettered"] + result["lost"] for result in results),
+        "seconds": round(seconds, 3),
+        "jobs_per_second": round(jobs / seconds, 2),
+    }
+
+
+def _make_all_due(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE nasa_refresh_jobs
+            SET status = 'pending', attempts = 0, run_after = CURRENT_TIMESTAMP, locked_by = NULL, locked_at = NULL
+        """)
+    conn.commit()
+
+
+def run(worker_counts, process_counts, latency_ms=100):
+    # Spawned, not forked, so no child inherits this process's pooled connections
+    context = multiprocessing.get_context("spawn")
+    # The stub runs in its own processes, sharing one port, so building its
+    # responses neither competes with the workers for the scheduler's GIL
+    # nor caps throughput at what one stub process can serve
+    ports = context.Queue()
+    servers = [context.Process(target=_serve, args=(latency_ms / 1000.0, 0, ports), daemon=True)]
+    servers[0].start()
+    port = ports.get(timeout=30)
+    for _ in range(STUB_PROCESSES - 1):
+        servers.append(context.Process(target=_serve, args=(latency_ms / 1000.0, port, ports), daemon=True))
+        servers[-1].start()
+        ports.get(timeout=30)
+    os.environ["POWER_BASE_URL"] = f"http://127.0.0.1:{port}"
+
+    from db import db_connection
+    from refresh_scheduler import schedule_jobs
+
+    with db_connection() as conn:
+        scheduled = schedule_jobs(conn)
+
+    runs = [(1, workers) for workers in worker_counts]
+    runs += [(processes, max(worker_counts)) for processes in process_counts if processes > 1]
+    results = {"latency_ms": latency_ms, "scheduled": scheduled, "runs": []}
+    baseline = None
+    for processes, workers in runs:
+        with db_connection() as conn:
+            _make_all_due(conn)
+        report = _run_processes(context, processes, workers)
+        baseline = baseline or report["jobs_per_second"] / report["workers"]
+        report["scaling_efficiency"] = round(report["jobs_per_second"] / (baseline * report["workers"]), 2)
+        results["runs"].append(report)
+        print(f"{processes} x {workers:>2} workers: {report['jobs']} jobs in {report['seconds']:.2f}s "
+              f"({report['jobs_per_second']:.1f} jobs/s, {report['scaling_efficiency']:.0%} of linear)")
+    for server in servers:
+        server.terminate()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker thread counts to run.")
+    parser.add_argument("--processes", default="1,2,4", help="Comma-separated scheduler process counts to run.")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Simulated POWER response latency.")
+    args = parser.parse_args()
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    process_counts = [int(count) for count in args.processes.split(",")]
+    print(json.dumps(run(worker_counts, process_counts, args.latency_ms), indent=2, default=str))
@@ -0,0 +1,135 @@
+"""
+Compares the old response building (a dict per row with float() and
+isoformat() on every field, then Flask's default jsonify) against
+serialization.records() with the FastJSONProvider on orjson and on the
+stdlib fallback, for a 365-day daily history payload of DECIMAL columns
+as psycopg2 returns them. The *_numeric_as_float paths get the rows a
+numeric_as_float() cursor returns instead, with the values already
+floats. Also reports gzip and brotli size and time for the resulting
+body at compression.py's levels.
+
+Run from backend/ (no database needed):
+
+    python -m benchmarks.bench_serialization [--days 365] [--repeat 50]
+
+Reports the best time per payload for each path.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import compression
+import serialization
+from serialization import FastJSONProvider, records
+
+HISTORY_KEYS = ("date", "temperature", "precipitation", "eto", "soilMoisture", "soilTemperature", "surfaceWetness")
+
+
+def _make_rows(days):
+    """Rows shaped like a nasa_weather_data / nasa_soil_data join: a DATE and six DECIMAL columns."""
+    start = date.today() - timedelta(days=days)
+    return [
+        (start + timedelta(days=offset),
+         Decimal(f"{random.uniform(10, 35):.2f}"), Decimal(f"{random.uniform(0, 40):.2f}"),
+         Decimal(f"{random.uniform(0, 8):.2f}"), Decimal(f"{random.uniform(0, 0.5):.6f}"),
+         Decimal(f"{random.uniform(10, 35):.2f}"), Decimal(f"{random.uniform(0, 1):.2f}"))
+        for offset in range(days)
+    ]
+
+
+def _per_field(provider, rows):
+    """The loop the endpoints used before serialization.records()."""
+    history = []
+    for row in rows:
+        day, temperature, precipitation, eto, moisture, soil_temperature, wetness = row
+        history.append({
+            "date": day.isoformat(),
+            "temperature": float(temperature),
+            "precipitation": float(precipitation),
+            "eto": float(eto),
+            "soilMoisture": float(moisture),
+            "soilTemperature": float(soil_temperature),
+            "surfaceWetness": float(wetness),
+        })
+    return provider.response({"history": history}).get_data()
+
+
+def _records(provider, rows):
+    return provider.response({"history": records(rows, HISTORY_KEYS)}).get_data()
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run(days=365, repeat=50):
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    stdlib_provider = FastJSONProvider(app)
+    stdlib_provider.fast = False
+    orjson_provider = FastJSONProvider(app)
+    rows = _make_rows(days)
+
+    float_rows = [(row[0],) + tuple(float(value) for value in row[1:]) for row in rows]
+
+    # name: (payload builder, provider, rows)
+    paths = {
+        "per_field_jsonify": (_per_field, default_provider, rows),
+        "records_stdlib": (_records, stdlib_provider, rows),
+        "records_stdlib_numeric_as_float": (_records, stdlib_provider, float_rows),
+    }
+    if serialization.orjson is not None:
+        orjson_provider.fast = True
+        paths["records_orjson"] = (_records, orjson_provider, rows)
+        paths["records_orjson_numeric_as_float"] = (_records, orjson_provider, float_rows)
+    else:
+        print("orjson is not installed; skipping the records_orjson paths")
+
+    results = {"days": days, "repeat": repeat, "serializers": {}, "compression": {}}
+    baseline = None
+    bodies = {}
+    for name, (build, provider, path_rows) in paths.items():
+        best, body = _time(lambda: build(provider, path_rows), repeat)
+        bodies[name] = body
+        baseline = baseline or best
+        results["serializers"][name] = {
+            "best_ms": round(best * 1000, 3),
+            "speedup": round(baseline / best, 2),
+            "bytes": len(body),
+        }
+        print(f"{name:>32}: {best * 1000:7.3f} ms  ({baseline / best:4.1f}x)  {len(body):,} bytes")
+
+    # Same values either way; only key order and float formatting could differ
+    decoded = {name: json.loads(body) for name, body in bodies.items()}
+    results["identical_output"] = all(value == decoded["per_field_jsonify"] for value in decoded.values())
+
+    body = bodies[list(bodies)[-1]]
+    for encoding, compress in compression.available_encodings().items():
+        best, compressed = _time(lambda: compress(body), repeat)
+        results["compression"][encoding] = {
+            "best_ms": round(best * 1000, 3),
+            "bytes": len(compressed),
+            "ratio": round(len(body) / len(compressed), 2),
+        }
+        print(f"{encoding:>32}: {best * 1000:7.3f} ms  {len(compressed):,} bytes "
+              f"({len(body) / len(compressed):.1f}x smaller)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="Daily rows in the history payload.")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per path; the best is reported.")
+    args = parser.parse_args()
+    print(json.dumps(run(args.days, args.repeat), indent=2))
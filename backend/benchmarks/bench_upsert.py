@@ -0,0 +1,109 @@
+"""
+Compares nasa_weather_data write throughput of the old per-row executemany
+path against bulk_write's multi-row VALUES and COPY paths.
+
+Run from backend/ against a database created with `flask init-db`:
+
+    python -m benchmarks.bench_upsert [--users 10] [--repeat 3]
+
+Rows go into a scratch copy of nasa_weather_data that is
+dropped afterwards, so real data is never touched.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+from bulk_write import WEATHER_COLUMNS, bulk_upsert
+from db import db_connection
+
+SCRATCH_TABLE = "bench_nasa_weather_data"
+
+BATCHES = {
+    "30_days": 30,
+    "10_years": 3650,
+}
+
+
+def _make_rows(users, days):
+    start = date.today() - timedelta(days=days)
+    return [
+        (user_id, start + timedelta(days=offset), round(random.uniform(10, 35), 2),
+         round(random.uniform(0, 40), 2), round(random.uniform(0, 8), 2),
+         round(random.uniform(0, 15), 2), round(random.uniform(25, 40), 2))
+        for user_id in users
+        for offset in range(days)
+    ]
+
+
+def _executemany(cur, rows):
+    cur.executemany(f"""
+        INSERT INTO {SCRATCH_TABLE} (user_id, date, temperature_2m_avg, precipitation, eto,
+                                     temperature_2m_min, temperature_2m_max)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id, date) DO UPDATE SET
+            temperature_2m_avg = EXCLUDED.temperature_2m_avg,
+            precipitation = EXCLUDED.precipitation,
+            eto = EXCLUDED.eto,
+            temperature_2m_min = EXCLUDED.temperature_2m_min,
+            temperature_2m_max = EXCLUDED.temperature_2m_max;
+    """, rows)
+
+
+def _bulk(method):
+    def write(cur, rows):
+        bulk_upsert(cur, SCRATCH_TABLE, WEATHER_COLUMNS, rows, ["user_id", "date"], method=method)
+    return write
+
+
+WRITERS = {
+    "executemany": _executemany,
+    "execute_values": _bulk("values"),
+    "copy": _bulk("copy"),
+}
+
+
+def run(users_per_batch=10, repeat=3):
+    results = {}
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+        cur.execute(f"CREATE TABLE {SCRATCH_TABLE} (LIKE nasa_weather_data INCLUDING ALL)")
+        conn.commit()
+        try:
+            for batch_name, days in BATCHES.items():
+                users = [str(uuid.uuid4()) for _ in range(users_per_batch)]
+                rows = _make_rows(users, days)
+                for writer_name, write in WRITERS.items():
+                    timings = []
+                    for _ in range(repeat):
+                        # Half the rows already exist so both insert and update paths are exercised
+                        cur.execute(f"TRUNCATE {SCRATCH_TABLE}")
+                        _bulk("copy")(cur, rows[::2])
+                        conn.commit()
+
+                        started = time.perf_counter()
+                        write(cur, rows)
+                        conn.commit()
+                        timings.append(time.perf_counter() - started)
+                    best = min(timings)
+                    results.setdefault(batch_name, {})[writer_name] = {
+                        "rows": len(rows),
+                        "best_seconds": round(best, 4),
+                        "rows_per_second": round(len(rows) / best, 1),
+                    }
+                    print(f"{batch_name:>9} {writer_name:>14}: {len(rows):>7} rows "
+                          f"in {best:.3f}s ({len(rows) / best:,.0f} rows/s)")
+        finally:
+            cur.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+            conn.commit()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="Users per batch (rows = users x days).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per writer; the best is reported.")
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.repeat), indent=2))
@@ -0,0 +1,98 @@
+"""
+Compares two load_test.py result files and flags regressions.
+
+A route regresses when its p95 or p99 latency grows, or its throughput
+drops, by more than --threshold percent, or when it has new errors. Exits
+with status 1 if any route regressed, so it can gate CI:
+
+    python -m benchmarks.compare results/baseline.json results/candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+# metric -> (path into a route result, True if higher is better)
+METRICS = {
+    "throughput_rps": (("throughput_rps",), True),
+    "p50_ms": (("latency_ms", "p50"), False),
+    "p95_ms": (("latency_ms", "p95"), False),
+    "p99_ms": (("latency_ms", "p99"), False),
+}
+# p50 is reported but, being the least stable tail-wise, never gates
+GATED = {"throughput_rps", "p95_ms", "p99_ms"}
+
+
+def _get(result, path):
+    for key in path:
+        result = result.get(key) if result else None
+    return result
+
+
+def _change_percent(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def compare(baseline, candidate, threshold=10.0):
+    """Returns {route: {metric: {...}, "regressed": bool, "reasons": [...]}}."""
+    report = {}
+    for route, after in candidate["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None:
+            report[route] = {"regressed": False, "reasons": ["new route"]}
+            continue
+        entry = {"regressed": False, "reasons": []}
+        for metric, (path, higher_is_better) in METRICS.items():
+            old, new = _get(before, path), _get(after, path)
+            change = _change_percent(old, new)
+            entry[metric] = {"baseline": old, "candidate": new, "change_percent": change}
+            if metric not in GATED or change is None:
+                continue
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                entry["regressed"] = True
+                entry["reasons"].append(f"{metric} {change:+.1f}%")
+        if after.get("errors", 0) > before.get("errors", 0):
+            entry["regressed"] = True
+            entry["reasons"].append(f"errors {before.get('errors', 0)} -> {after['errors']}")
+        report[route] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent.")
+    parser.add_argument("--json", action="store_true", help="Print the full comparison as JSON.")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    for label, results in (("baseline", baseline), ("candidate", candidate)):
+        meta = results.get("meta", {})
+        print(f"{label:<10} {meta.get('timestamp')}  rev {meta.get('git_revision')}  "
+              f"concurrency {meta.get('concurrency')}  requests {meta.get('requests_per_route')}")
+    if baseline.get("meta", {}).get("dataset") != candidate.get("meta", {}).get("dataset"):
+        print("warning: the runs used different dataset sizes")
+
+    report = compare(baseline, candidate, args.threshold)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for route, entry in report.items():
+            changes = "  ".join(
+                f"{metric} {entry[metric]['change_percent']:+.1f}%"
+                for metric in METRICS if metric in entry and entry[metric]["change_percent"] is not None
+            )
+            flag = "REGRESSED " + ", ".join(entry["reasons"]) if entry["regressed"] else "ok"
+            print(f"{route:<26} {changes}  {flag}")
+
+    regressed = [route for route, entry in report.items() if entry["regressed"]]
+    if regressed:
+        print(f"{len(regressed)} route(s) regressed by more than {args.threshold}%: {', '.join(regressed)}")
+        sys.exit(1)
@@ -0,0 +1,256 @@
+"""
+Load and latency benchmark for the Flask API.
+
+Drives every user-facing route at a fixed concurrency and records per-route
+throughput, error count and p50/p95/p99 latency. Seeded ids come from the
+database (see benchmarks/seed.py), so seed first:
+
+    python -m benchmarks.seed --users 10000
+    python -m benchmarks.load_test --concurrency 16 --requests 2000
+
+Without --base-url the app is served in-process by werkzeug's threaded
+server, with the response cache cleared before each route so every route
+starts cold. Results are written as JSON (default
+benchmarks/results/<timestamp>.json); compare two runs with
+benchmarks/compare.py.
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+
+from benchmarks.seed import EMAIL_DOMAIN, sample_ids  # noqa: E402
+from db import db_connection  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+LEGACY_PASSWORD = "bench"
+
+
+def _signup(ctx, session, i):
+    email = f"signup-{ctx['run_id']}-{i}@{EMAIL_DOMAIN}"
+    return session.post(f"{ctx['base_url']}/signup", json={
+        "firstName": "Load", "lastName": f"Test {i}", "email": email, "password": "bench",
+    })
+
+
+def _signin(ctx, session, i):
+    return session.post(f"{ctx['base_url']}/signin", json={
+        "email": random.choice(ctx["emails"]), "password": "bench",
+    })
+
+
+def _signin_legacy(ctx, session, i):
+    user_id = random.choice(ctx["legacy_ids"])
+    return session.post(f"{ctx['base_url']}/signin", json={
+        "email": f"{user_id}@{EMAIL_DOMAIN}", "password": LEGACY_PASSWORD,
+    })
+
+
+def _get(path, ids="user_ids"):
+    def request(ctx, session, i):
+        return session.get(f"{ctx['base_url']}{path.format(user_id=random.choice(ctx[ids]))}")
+    return request
+
+
+# name -> (request function, accepted status codes)
+ROUTES = {
+    "signup": (_signup, {201}),
+    "signin": (_signin, {200}),
+    "signin_legacy": (_signin_legacy, {200}),
+    "dashboard": (_get("/dashboard/{user_id}"), {200}),
+    "dashboard_include_all": (_get("/dashboard/{user_id}?include=all"), {200}),
+    "dashboard_legacy": (_get("/dashboard/{user_id}", "legacy_ids"), {200}),
+    "weather_forecast": (_get("/weather-forecast/{user_id}"), {200}),
+    "weather_forecast_legacy": (_get("/weather-forecast"), {200}),
+    "soil_conditions": (_get("/soil-conditions/{user_id}"), {200}),
+    "soil_conditions_legacy": (_get("/soil-conditions/{user_id}", "legacy_ids"), {200}),
+    "ai_recommendations": (_get("/ai-recommendations/{user_id}"), {200}),
+    "climate_history": (_get("/climate-history/{user_id}?params=temperature,precipitation,soilMoisture"), {200}),
+    "climate_history_multiyear": (
+        _get("/climate-history/{user_id}?from=2000-01-01&params=temperature,precipitation,soilMoisture"), {200}
+    ),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_route(ctx, name, total_requests, concurrency):
+    """Sends `total_requests` requests for one route from `concurrency` threads."""
+    request_fn, accepted = ROUTES[name]
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total_requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = request_fn(ctx, session, i)
+                status = response.status_code
+            except requests.RequestException as e:
+                status = "exception"
+                with lock:
+                    errors.append(str(e))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    failed = sum(count for status, count in statuses.items()
+                 if status == "exception" or int(status) not in accepted)
+    return {
+        "requests": len(latencies),
+        "errors": failed,
+        "statuses": statuses,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": round(percentile(latencies, 50), 2) if latencies else None,
+            "p95": round(percentile(latencies, 95), 2) if latencies else None,
+            "p99": round(percentile(latencies, 99), 2) if latencies else None,
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+        "sample_errors": errors[:5],
+    }
+
+
+def _start_in_process_server():
+    from werkzeug.serving import make_server
+
+    from app import app
+
+    # Per-request access logging would dominate the measurements
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _dataset_size(cur):
+    cur.execute("""
+        SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM legacy_users),
+               (SELECT COUNT(*) FROM nasa_weather_data), (SELECT COUNT(*) FROM nasa_soil_data),
+               (SELECT COUNT(*) FROM nasa_ai_recommendations)
+    """)
+    users, legacy_users, weather_rows, soil_rows, recommendations = cur.fetchone()
+    return {"users": users, "legacy_users": legacy_users, "nasa_weather_rows": weather_rows,
+            "nasa_soil_rows": soil_rows, "recommendations": recommendations}
+
+
+def run(routes, total_requests, concurrency, base_url=None, warmup=20, sample=1000, seed=42):
+    random.seed(seed)
+    with db_connection() as conn, conn.cursor() as cur:
+        user_ids, legacy_ids, emails = sample_ids(cur, sample)
+        dataset = _dataset_size(cur)
+    if not user_ids or not legacy_ids:
+        raise SystemExit("No benchmark users found; run `python -m benchmarks.seed` first.")
+
+    server = None
+    if base_url is None:
+        server, base_url = _start_in_process_server()
+    from response_cache import response_cache
+
+    ctx = {
+        "base_url": base_url.rstrip("/"),
+        "run_id": datetime.now().strftime("%Y%m%d%H%M%S"),
+        "user_ids": user_ids,
+        "legacy_ids": legacy_ids,
+        "emails": emails,
+    }
+    results = {}
+    try:
+        for name in routes:
+            if server is not None:
+                response_cache.clear()
+            if warmup and name != "signup":
+                run_route(ctx, name, warmup, min(concurrency, warmup))
+            results[name] = run_route(ctx, name, total_requests, concurrency)
+            latency = results[name]["latency_ms"]
+            print(f"{name:<26} {results[name]['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {latency['p50']:>7.1f} ms  p95 {latency['p95']:>7.1f} ms  "
+                  f"p99 {latency['p99']:>7.1f} ms  errors {results[name]['errors']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "base_url": None if server is not None else base_url,
+            "in_process": server is not None,
+            "concurrency": concurrency,
+            "requests_per_route": total_requests,
+            "warmup_per_route": warmup,
+            "python": platform.python_version(),
+            "dataset": dataset,
+        },
+        "routes": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server instead of an in-process one.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per route.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per route first.")
+    parser.add_argument("--routes", default=",".join(ROUTES),
+                        help=f"Comma-separated subset of: {', '.join(ROUTES)}")
+    parser.add_argument("--sample", type=int, default=1000, help="Seeded users to draw request ids from.")
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>.json).")
+    args = parser.parse_args()
+
+    routes = [name.strip() for name in args.routes.split(",") if name.strip()]
+    unknown = [name for name in routes if name not in ROUTES]
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(unknown)}")
+
+    report = run(routes, args.requests, args.concurrency, args.base_url, args.warmup, args.sample)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
@@ -0,0 +1,238 @@
+"""
+Seeds a local PostgreSQL with synthetic benchmark data.
+
+Everything is generated server-side with generate_series, so even large
+seeds are quick. Seeded users have @bench.local emails and legacy ids
+start with "bench-legacy-", so `--reset` removes exactly what this script
+created and nothing else.
+
+Run from backend/ against a database created with `flask init-db`:
+
+    python -m benchmarks.seed --users 10000 --days 30 --recommendations 3
+    python -m benchmarks.seed --reset
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+from db import db_connection
+from partitions import ensure_partitions
+
+EMAIL_DOMAIN = "bench.local"
+LEGACY_PREFIX = "bench-legacy-"
+MARKET_PREFIX = "Bench Market "
+
+# Farms are spread over roughly the area of Kenya
+LAT_RANGE = (-4.5, 4.5)
+LON_RANGE = (34.0, 41.5)
+
+# Child tables keyed by users.id, deleted before users on reset
+USER_TABLES = [
+    "nasa_backfill_checkpoints",
+    "nasa_ai_recommendations",
+    "nasa_soil_data",
+    "nasa_weather_forecast",
+    "nasa_vegetation_data",
+    "nasa_weather_data",
+    "farm_health_metrics",
+    "nasa_weekly_rollups",
+    "nasa_monthly_rollups",
+    "farm_neighbors",
+    "farm_zones",
+    "user_credits",
+]
+
+
+def reset(cur):
+    """Deletes every row previously created by seed()."""
+    cur.execute("CREATE TEMP TABLE bench_user_ids AS SELECT id FROM users WHERE email LIKE %s",
+                (f"%@{EMAIL_DOMAIN}",))
+    for table in USER_TABLES:
+        cur.execute(f"DELETE FROM {table} WHERE user_id IN (SELECT id FROM bench_user_ids)")
+    cur.execute("DELETE FROM users WHERE id IN (SELECT id FROM bench_user_ids)")
+    cur.execute("DROP TABLE bench_user_ids")
+    cur.execute("""
+        DELETE FROM user_metrics
+        WHERE user_id LIKE %s OR user_id IN (SELECT userId FROM legacy_users WHERE email LIKE %s)
+    """, (f"{LEGACY_PREFIX}%", f"%@{EMAIL_DOMAIN}"))
+    cur.execute("DELETE FROM soil_conditions WHERE user_id LIKE %s", (f"{LEGACY_PREFIX}%",))
+    cur.execute("DELETE FROM legacy_users WHERE userId LIKE %s OR email LIKE %s",
+                (f"{LEGACY_PREFIX}%", f"%@{EMAIL_DOMAIN}"))
+    cur.execute("DELETE FROM market_data WHERE market_name LIKE %s", (f"{MARKET_PREFIX}%",))
+
+
+def seed(cur, users=1000, zones=3, days=30, forecast_days=7, recommendations=3,
+         neighbors=3, legacy_users=100, markets=200):
+    """
+    Inserts the requested volume of rows. The caller commits, and creates
+    the NASA table partitions for the last `days` days beforehand.
+    """
+    timings = {}
+
+    def step(name, query, params=None):
+        started = time.perf_counter()
+        cur.execute(query, params)
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    step("users", """
+        CREATE TEMP TABLE bench_new_users AS
+        SELECT gen_random_uuid() AS id, n,
+               %(lat_min)s + random() * (%(lat_max)s - %(lat_min)s) AS lat,
+               %(lon_min)s + random() * (%(lon_max)s - %(lon_min)s) AS lon
+        FROM generate_series(1, %(users)s) n;
+
+        INSERT INTO users (id, username, email, first_name, last_name, farm_name, farm_latitude, farm_longitude)
+        SELECT id, 'bench-' || id, 'bench-' || id || '@' || %(domain)s, 'Bench', 'Farmer ' || n,
+               'Bench Farm ' || n, lat, lon
+        FROM bench_new_users;
+
+        INSERT INTO user_credits (user_id, total_points, current_rank)
+        SELECT id, (random() * 3000)::int, (ARRAY['Bronze', 'Silver', 'Gold'])[1 + (n %% 3)]
+        FROM bench_new_users;
+    """, {"users": users, "domain": EMAIL_DOMAIN, "lat_min": LAT_RANGE[0], "lat_max": LAT_RANGE[1],
+          "lon_min": LON_RANGE[0], "lon_max": LON_RANGE[1]})
+
+    step("zones", """
+        INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+        SELECT u.id, CASE WHEN z = 1 THEN 'Default' ELSE chr(64 + z) END,
+               (ARRAY['Wheat', 'Corn', 'Vegetables', 'Beans'])[1 + (z %% 4)], round((random() * 5)::numeric, 2)
+        FROM bench_new_users u CROSS JOIN generate_series(1, %(zones)s) z
+    """, {"zones": max(zones, 1)})
+
+    step("neighbors", """
+        INSERT INTO farm_neighbors (user_id, neighbor_name, distance_km)
+        SELECT u.id, 'Neighbor ' || k, round((random() * 20)::numeric, 2)
+        FROM bench_new_users u CROSS JOIN generate_series(1, %(neighbors)s) k
+    """, {"neighbors": neighbors})
+
+    step("weather", """
+        INSERT INTO nasa_weather_data (user_id, date, temperature_2m_avg, precipitation, eto,
+                                       temperature_2m_min, temperature_2m_max)
+        SELECT id, day, avg, precipitation, eto, avg - spread, avg + spread
+        FROM (
+            SELECT u.id, CURRENT_DATE - d AS day, round((15 + random() * 15)::numeric, 2) AS avg,
+                   round((random() * 20)::numeric, 2) AS precipitation,
+                   round((2 + random() * 5)::numeric, 2) AS eto, round((3 + random() * 10)::numeric, 2) AS spread
+            FROM bench_new_users u CROSS JOIN generate_series(0, %(days)s - 1) d
+        ) days
+    """, {"days": days})
+
+    step("soil", """
+        INSERT INTO nasa_soil_data (user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm, surface_wetness)
+        SELECT fz.user_id, fz.id, CURRENT_DATE - d, round((0.1 + random() * 0.3)::numeric, 4),
+               round((15 + random() * 15)::numeric, 2), round(random()::numeric, 2)
+        FROM farm_zones fz
+        JOIN bench_new_users u ON u.id = fz.user_id
+        CROSS JOIN generate_series(0, %(days)s - 1) d
+    """, {"days": days})
+
+    step("forecast", """
+        INSERT INTO nasa_weather_forecast (user_id, forecast_date, temperature_max, temperature_min,
+                                           weather_condition, precipitation_probability, humidity, wind_speed)
+        SELECT u.id, CURRENT_DATE + d, round((22 + random() * 15)::numeric, 2), round((random() * 18)::numeric, 2),
+               (ARRAY['Sunny', 'Partly Cloudy', 'Rain', 'Cloudy'])[1 + (d %% 4)],
+               round((random() * 100)::numeric, 2), round((40 + random() * 50)::numeric, 2),
+               round((random() * 10)::numeric, 2)
+        FROM bench_new_users u CROSS JOIN generate_series(0, %(forecast_days)s - 1) d
+    """, {"forecast_days": forecast_days})
+
+    step("farm_health", """
+        INSERT INTO farm_health_metrics (user_id, date, overall_health_score)
+        SELECT u.id, CURRENT_DATE - d, round((50 + random() * 50)::numeric, 2)
+        FROM bench_new_users u CROSS JOIN generate_series(0, LEAST(%(days)s, 7) - 1) d
+    """, {"days": days})
+
+    step("recommendations", """
+        INSERT INTO nasa_ai_recommendations (user_id, title, description, recommendation_type, priority,
+                                             status, time_window_start, time_window_end, expected_impact_score)
+        SELECT u.id, 'Bench recommendation ' || r, 'Synthetic recommendation for load testing.',
+               'planting', (ARRAY['High', 'Medium', 'Watch', 'Low'])[1 + (r %% 4)],
+               CASE WHEN r %% 5 = 0 THEN 'dismissed' ELSE 'active' END,
+               CURRENT_DATE - 1, CURRENT_DATE + 7, round((random() * 100)::numeric, 2)
+        FROM bench_new_users u CROSS JOIN generate_series(1, %(recommendations)s) r
+    """, {"recommendations": recommendations})
+
+    step("legacy", """
+        CREATE TEMP TABLE bench_new_legacy AS
+        SELECT %(prefix)s || gen_random_uuid() AS user_id, n FROM generate_series(1, %(legacy_users)s) n;
+
+        INSERT INTO legacy_users (userId, firstName, lastName, email, password)
+        SELECT user_id, 'Legacy', 'Farmer ' || n, user_id || '@' || %(domain)s,
+               encode(sha256('bench'::bytea), 'hex')
+        FROM bench_new_legacy;
+
+        INSERT INTO user_metrics (user_id, credit_points, farm_health, active_neighbors,
+                                  nearest_market_distance, nearest_market_name)
+        SELECT user_id, (random() * 3000)::int, (50 + random() * 50)::int, (random() * 30)::int,
+               (random() * 50)::int, 'Bench Market 1'
+        FROM bench_new_legacy;
+
+        INSERT INTO soil_conditions (user_id, moisture_level, nitrogen_level, ph_level, temperature)
+        SELECT user_id, 60 + random() * 30, 40 + random() * 40, 5.5 + random() * 2, 15 + random() * 15
+        FROM bench_new_legacy;
+    """, {"prefix": LEGACY_PREFIX, "legacy_users": legacy_users, "domain": EMAIL_DOMAIN})
+
+    step("markets", """
+        INSERT INTO market_data (market_name, latitude, longitude, distance_km)
+        SELECT %(prefix)s || n,
+               %(lat_min)s + random() * (%(lat_max)s - %(lat_min)s),
+               %(lon_min)s + random() * (%(lon_max)s - %(lon_min)s),
+               round((random() * 100)::numeric, 2)
+        FROM generate_series(1, %(markets)s) n
+    """, {"prefix": MARKET_PREFIX, "markets": markets, "lat_min": LAT_RANGE[0], "lat_max": LAT_RANGE[1],
+          "lon_min": LON_RANGE[0], "lon_max": LON_RANGE[1]})
+
+    # Legacy weather endpoint reads the shared weather_forecast table
+    step("legacy_weather", """
+        INSERT INTO weather_forecast (date, temperature_high, temperature_low, condition, humidity)
+        SELECT CURRENT_DATE + d, 28, 18, 'Sunny', 60
+        FROM generate_series(0, 6) d
+        WHERE NOT EXISTS (SELECT 1 FROM weather_forecast WHERE date = CURRENT_DATE + d)
+    """)
+
+    cur.execute("DROP TABLE bench_new_users")
+    cur.execute("DROP TABLE bench_new_legacy")
+    step("analyze", "ANALYZE")
+    return timings
+
+
+def sample_ids(cur, limit=1000):
+    """Returns (user ids, legacy user ids, emails) of seeded users for load drivers."""
+    cur.execute("SELECT id, email FROM users WHERE email LIKE %s ORDER BY random() LIMIT %s",
+                (f"%@{EMAIL_DOMAIN}", limit))
+    rows = cur.fetchall()
+    cur.execute("SELECT userId FROM legacy_users WHERE userId LIKE %s ORDER BY random() LIMIT %s",
+                (f"{LEGACY_PREFIX}%", limit))
+    legacy = [row[0] for row in cur.fetchall()]
+    return [str(row[0]) for row in rows], legacy, [row[1] for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--zones", type=int, default=3, help="Farm zones per user (the first is 'Default').")
+    parser.add_argument("--days", type=int, default=30, help="Days of NASA weather/soil history per user.")
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--recommendations", type=int, default=3, help="Recommendations per user.")
+    parser.add_argument("--neighbors", type=int, default=3)
+    parser.add_argument("--legacy-users", type=int, default=100)
+    parser.add_argument("--markets", type=int, default=200)
+    parser.add_argument("--reset", action="store_true", help="Remove previously seeded rows (and seed nothing else).")
+    parser.add_argument("--keep", action="store_true", help="Add to existing benchmark rows instead of replacing them.")
+    args = parser.parse_args()
+
+    # Separately committed, and before the seed transaction writes to users:
+    # creating a partition takes a lock on users that conflicts with those writes
+    if not args.reset:
+        ensure_partitions(date.today() - timedelta(days=max(args.days, 1)), date.today())
+    with db_connection() as conn, conn.cursor() as cur:
+        started = time.perf_counter()
+        if args.reset or not args.keep:
+            reset(cur)
+        report = {}
+        if not args.reset:
+            report = seed(cur, args.users, args.zones, args.days, args.forecast_days, args.recommendations,
+                          args.neighbors, args.legacy_users, args.markets)
+        conn.commit()
+        print(json.dumps({"seconds": round(time.perf_counter() - started, 3), "steps": report}, indent=2))
@@ -0,0 +1,159 @@
+"""
+Local stand-in for the NASA POWER daily point and regional endpoints.
+
+Responses have the same shape as POWER's (properties.parameter for point
+requests, a GeoJSON FeatureCollection on the 0.5 x 0.625 degree grid for
+regional ones) with deterministic synthetic values. The most recent
+`unpublished_days` come back as -999 fill values, like the real API. The
+next `truncate_responses` responses are cut off mid-body, for testing how
+clients handle dropped connections.
+Point the app at it with POWER_BASE_URL:
+
+    python -m benchmarks.stub_power_server --port 8765
+    POWER_BASE_URL=http://127.0.0.1:8765 flask refresh-nasa --all
+
+Benchmarks can also start it in-process with start_server().
+"""
+import argparse
+import json
+import math
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from power_cache import GRID_LAT_DEGREES, GRID_LON_DEGREES, date_range
+
+FILL_VALUE = -999.0
+
+
+def _value(param, latitude, longitude, date_str):
+    seed = zlib.crc32(f"{param}:{latitude:.3f}:{longitude:.3f}:{date_str}".encode())
+    return round((seed % 4000) / 100.0, 2)
+
+
+def _series(param, latitude, longitude, dates, last_published):
+    return {
+        d: (_value(param, latitude, longitude, d) if d <= last_published else FILL_VALUE)
+        for d in dates
+    }
+
+
+def _grid_points(lat_min, lat_max, lon_min, lon_max):
+    lat = math.ceil(lat_min / GRID_LAT_DEGREES) * GRID_LAT_DEGREES
+    while lat <= lat_max + 1e-9:
+        lon = math.ceil(lon_min / GRID_LON_DEGREES) * GRID_LON_DEGREES
+        while lon <= lon_max + 1e-9:
+            yield round(lat, 4), round(lon, 4)
+            lon += GRID_LON_DEGREES
+        lat += GRID_LAT_DEGREES
+
+
+class StubPowerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        with self.server.lock:
+            truncate = self.server.truncate_responses > 0
+            if truncate:
+                self.server.truncate_responses -= 1
+        if truncate:
+            # Half the promised body, then drop the connection
+            self.wfile.write(payload[:len(payload) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with server.lock:
+            server.calls[url.path] = server.calls.get(url.path, 0) + 1
+        if server.latency_seconds:
+            time.sleep(server.latency_seconds)
+
+        try:
+            dates = list(date_range(query["start"], query["end"]))
+            parameters = query["parameters"].split(",")
+        except (KeyError, ValueError):
+            self._send_json(422, {"messages": ["start, end and parameters are required"]})
+            return
+        last_published = (datetime.now() - timedelta(days=server.unpublished_days)).strftime("%Y%m%d")
+
+        if url.path.endswith("/daily/point"):
+            latitude, longitude = float(query["latitude"]), float(query["longitude"])
+            self._send_json(200, {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [longitude, latitude, 0]},
+                "properties": {"parameter": {
+                    param: _series(param, latitude, longitude, dates, last_published) for param in parameters
+                }},
+            })
+        elif url.path.endswith("/daily/regional"):
+            if len(parameters) != 1:
+                self._send_json(422, {"messages": ["Regional requests accept a single parameter"]})
+                return
+            bbox = [float(query[key]) for key in ("latitude-min", "latitude-max", "longitude-min", "longitude-max")]
+            self._send_json(200, {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "Point", "coordinates": [longitude, latitude, 0]},
+                        "properties": {"parameter": {
+                            parameters[0]: _series(parameters[0], latitude, longitude, dates, last_published)
+                        }},
+                    }
+                    for latitude, longitude in _grid_points(*bbox)
+                ],
+            })
+        else:
+            self._send_json(404, {"messages": [f"Unknown path {url.path}"]})
+
+
+class _ReusePortServer(ThreadingHTTPServer):
+    """Lets several stub processes share one port, so the stub is not the bottleneck."""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def start_server(port=0, latency_seconds=0.0, unpublished_days=2, reuse_port=False, truncate_responses=0):
+    """Starts the stub on a daemon thread; returns the server (see .calls, .base_url)."""
+    server_class = _ReusePortServer if reuse_port else ThreadingHTTPServer
+    server = server_class(("127.0.0.1", port), StubPowerHandler)
+    server.lock = threading.Lock()
+    server.calls = {}
+    server.latency_seconds = latency_seconds
+    server.unpublished_days = unpublished_days
+    server.truncate_responses = truncate_responses
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per request.")
+    args = parser.parse_args()
+    server = start_server(args.port, args.latency)
+    print(f"Stub POWER server on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,143 @@
+import io
+import math
+import os
+import uuid
+from datetime import date, datetime
+
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from partitions import ensure_partitions_for_rows
+
+# Batches at least this large are staged with COPY; smaller ones use a
+# multi-row INSERT, which avoids the temp table round-trips
+COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "5000"))
+VALUES_PAGE_SIZE = int(os.getenv("BULK_VALUES_PAGE_SIZE", "1000"))
+
+
+def _copy_text(value):
+    """Formats one value for COPY ... FROM STDIN in PostgreSQL text format."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "\\N"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    if any(c in text for c in "\\\t\n\r"):
+        text = text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+
+def _dedupe(rows, key_indexes):
+    """
+    Keeps the last row per conflict key. ON CONFLICT DO UPDATE refuses to
+    touch the same target row twice in one statement.
+    """
+    latest = {}
+    for row in rows:
+        latest[tuple(row[i] for i in key_indexes)] = row
+    return list(latest.values())
+
+
+def _upsert_clause(table, conflict_columns, update_columns, touch_columns=()):
+    conflict = sql.SQL(", ").join(map(sql.Identifier, conflict_columns))
+    if not update_columns:
+        return sql.SQL("ON CONFLICT ({}) DO NOTHING").format(conflict)
+    assignments = sql.SQL(", ").join(
+        [sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in update_columns]
+        + [sql.SQL("{} = CURRENT_TIMESTAMP").format(sql.Identifier(column)) for column in touch_columns]
+    )
+    clause = sql.SQL("ON CONFLICT ({}) DO UPDATE SET {}").format(conflict, assignments)
+    if touch_columns:
+        # Leave unchanged rows alone so their timestamps only move on real changes
+        clause = sql.SQL("{} WHERE ({}) IS DISTINCT FROM ({})").format(
+            clause,
+            sql.SQL(", ").join(sql.SQL("{}.{}").format(sql.Identifier(table), sql.Identifier(c)) for c in update_columns),
+            sql.SQL(", ").join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(c)) for c in update_columns),
+        )
+    return clause
+
+
+def _upsert_values(cur, table, columns, rows, upsert):
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s {}").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+        upsert,
+    )
+    execute_values(cur, query.as_string(cur), rows, page_size=VALUES_PAGE_SIZE)
+
+
+def _upsert_copy(cur, table, columns, rows, upsert):
+    stage = sql.Identifier(f"_stage_{table}_{uuid.uuid4().hex[:8]}")
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+
+    # Staging table with the target's column types and no constraints
+    cur.execute(sql.SQL("CREATE TEMP TABLE {} AS SELECT {} FROM {} WITH NO DATA").format(
+        stage, column_list, sql.Identifier(table)
+    ))
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN").format(stage, column_list).as_string(cur), buffer)
+
+    cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} {}").format(
+        sql.Identifier(table), column_list, column_list, stage, upsert
+    ))
+    cur.execute(sql.SQL("DROP TABLE {}").format(stage))
+
+
+def bulk_upsert(cur, table, columns, rows, conflict_columns, update_columns=None, method="auto", touch_columns=()):
+    """
+    Upserts many rows into `table` with one set-based statement.
+
+    rows are tuples in `columns` order. On conflict with `conflict_columns`
+    the `update_columns` (default: every non-key column) are overwritten;
+    pass update_columns=[] for DO NOTHING. `touch_columns` (e.g. updated_at)
+    are set to CURRENT_TIMESTAMP, and only rows whose values actually
+    change are updated. method is "values" (multi-row
+    INSERT via execute_values), "copy" (COPY into a temp table, then
+    INSERT ... SELECT ... ON CONFLICT) or "auto", which picks COPY for
+    batches of COPY_THRESHOLD rows or more. The caller owns the transaction.
+    Returns the number of distinct rows written.
+    """
+    if not rows:
+        return 0
+    if method not in ("auto", "values", "copy"):
+        raise ValueError(f"Unknown bulk upsert method: {method}")
+
+    columns = list(columns)
+    if update_columns is None:
+        update_columns = [column for column in columns if column not in conflict_columns]
+
+    rows = _dedupe(rows, [columns.index(column) for column in conflict_columns])
+    upsert = _upsert_clause(table, conflict_columns, update_columns, touch_columns)
+
+    if method == "copy" or (method == "auto" and len(rows) >= COPY_THRESHOLD):
+        _upsert_copy(cur, table, columns, rows, upsert)
+    else:
+        _upsert_values(cur, table, columns, rows, upsert)
+    return len(rows)
+
+
+WEATHER_COLUMNS = [
+    "user_id", "date", "temperature_2m_avg", "precipitation", "eto", "temperature_2m_min", "temperature_2m_max",
+]
+SOIL_COLUMNS = ["user_id", "zone_id", "date", "soil_moisture_0_5cm", "soil_temperature_0_5cm", "surface_wetness"]
+
+
+def upsert_weather_rows(cur, rows, method="auto"):
+    """Bulk upsert of nasa_weather_data rows shaped like WEATHER_COLUMNS."""
+    ensure_partitions_for_rows(rows, WEATHER_COLUMNS.index("date"))
+    return bulk_upsert(cur, "nasa_weather_data", WEATHER_COLUMNS, rows, ["user_id", "date"],
+                       method=method, touch_columns=["updated_at"])
+
+
+def upsert_soil_rows(cur, rows, method="auto"):
+    """Bulk upsert of nasa_soil_data rows shaped like SOIL_COLUMNS."""
+    ensure_partitions_for_rows(rows, SOIL_COLUMNS.index("date"))
+    return bulk_upsert(cur, "nasa_soil_data", SOIL_COLUMNS, rows, ["user_id", "zone_id", "date"],
+                       method=method, touch_columns=["updated_at"])
@@ -0,0 +1,198 @@
+"""
+Historical climate series for GET /climate-history/<user_id>.
+
+Each requested param comes back as a [date, value] series, read from the
+cheapest source that answers the range:
+
+- agg=day reads the raw daily tables. Only the months of the range are
+  planned and scanned (they are partitioned by month, see partitions.py),
+  and only the tables behind the requested params are queried.
+- agg=week and agg=month read nasa_weekly_rollups / nasa_monthly_rollups
+  (see rollups.py): one indexed row per period for every param.
+- agg=auto (the default) picks day while the range fits in max_points and
+  the raw rows are still retained, otherwise week, otherwise month.
+
+A series longer than max_points is then reduced with Largest-Triangle-
+Three-Buckets (lttb()), which keeps the peaks and troughs a chart needs
+instead of every n-th point. Payload size is therefore bounded by
+max_points per param whatever the range.
+"""
+import os
+from datetime import date, timedelta
+
+from partitions import add_months, month_start
+from rollups import RETENTION_MONTHS
+from queries import (
+    CLIMATE_WEATHER_DAILY_QUERY,
+    CLIMATE_SOIL_DAILY_QUERY,
+    CLIMATE_VEGETATION_DAILY_QUERY,
+    CLIMATE_HEALTH_DAILY_QUERY,
+    CLIMATE_WEEKLY_QUERY,
+    CLIMATE_MONTHLY_QUERY,
+)
+
+DEFAULT_MAX_POINTS = int(os.getenv("CLIMATE_HISTORY_DEFAULT_POINTS", "500"))
+MAX_POINTS_LIMIT = int(os.getenv("CLIMATE_HISTORY_MAX_POINTS", "5000"))
+DEFAULT_DAYS = 365
+AGGREGATIONS = ("auto", "day", "week", "month")
+
+# (table, daily query, params in the order of its value columns)
+DAILY_SOURCES = [
+    ("nasa_weather_data", CLIMATE_WEATHER_DAILY_QUERY, ("temperature", "precipitation", "eto")),
+    ("nasa_soil_data", CLIMATE_SOIL_DAILY_QUERY, ("soilMoisture", "soilTemperature", "surfaceWetness")),
+    ("nasa_vegetation_data", CLIMATE_VEGETATION_DAILY_QUERY, ("cropHealth", "vegetationDensity")),
+    ("farm_health_metrics", CLIMATE_HEALTH_DAILY_QUERY, ("farmHealth",)),
+]
+# agg: (rollup table, query); both return the params in PARAMS order
+ROLLUP_SOURCES = {
+    "week": ("nasa_weekly_rollups", CLIMATE_WEEKLY_QUERY),
+    "month": ("nasa_monthly_rollups", CLIMATE_MONTHLY_QUERY),
+}
+# Matches CLIMATE_ROLLUP_COLUMNS; means, except sums for precipitation and eto
+PARAMS = tuple(param for _, _, params in DAILY_SOURCES for param in params)
+DEFAULT_PARAMS = ("temperature", "precipitation", "soilMoisture")
+
+
+def _parse_date(args, name, default):
+    value = args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} date: {value} (expected YYYY-MM-DD)")
+
+
+def parse_history_args(args, today=None):
+    """
+    Validates the query string of a /climate-history request. Returns
+    (from_date, to_date, params, agg, max_points); raises ValueError with a
+    message for the client.
+    """
+    today = today or date.today()
+    to_date = _parse_date(args, "to", today)
+    from_date = _parse_date(args, "from", to_date - timedelta(days=DEFAULT_DAYS - 1))
+    if from_date > to_date:
+        raise ValueError("from must not be after to")
+
+    params = [param.strip() for param in args.get("params", "").split(",") if param.strip()]
+    params = list(dict.fromkeys(params)) or list(DEFAULT_PARAMS)
+    unknown = [param for param in params if param not in PARAMS]
+    if unknown:
+        raise ValueError(f"Unknown params: {', '.join(unknown)} (available: {', '.join(PARAMS)})")
+
+    agg = args.get("agg", "auto")
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Invalid agg: {agg} (expected one of {', '.join(AGGREGATIONS)})")
+
+    try:
+        max_points = int(args.get("max_points", DEFAULT_MAX_POINTS))
+    except ValueError:
+        raise ValueError("max_points must be an integer")
+    if not 3 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"max_points must be between 3 and {MAX_POINTS_LIMIT}")
+    return from_date, to_date, params, agg, max_points
+
+
+def period_start(agg, day):
+    if agg == "week":
+        return day - timedelta(days=day.weekday())
+    if agg == "month":
+        return month_start(day)
+    return day
+
+
+def choose_aggregation(from_date, to_date, max_points, today=None):
+    """The finest aggregation whose row count fits max_points (day only while raw rows are retained)."""
+    raw_from = add_months(month_start(today or date.today()), -RETENTION_MONTHS)
+    days = (to_date - from_date).days + 1
+    if from_date >= raw_from and days <= max_points:
+        return "day"
+    if (to_date - period_start("week", from_date)).days // 7 + 1 <= max_points:
+        return "week"
+    return "month"
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of (date, value) points
+    sorted by date to `threshold` points. The first and last points are
+    kept; from each bucket in between, the point forming the largest
+    triangle with the previously kept point and the next bucket's mean.
+    """
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return points
+    xs = [day.toordinal() for day, _ in points]
+    ys = [value for _, value in points]
+
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_x = sum(xs[end:next_end]) / (next_end - end)
+        next_y = sum(ys[end:next_end]) / (next_end - end)
+
+        kept_x, kept_y = xs[kept], ys[kept]
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            # Twice the triangle's area; only the comparison matters
+            area = abs((kept_x - next_x) * (ys[index] - kept_y) - (kept_x - xs[index]) * (next_y - kept_y))
+            if area > best_area:
+                best, best_area = index, area
+        sampled.append(points[best])
+        kept = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def load_climate_history(cur, user_id, from_date, to_date, params, agg, max_points):
+    """
+    Builds the GET /climate-history/<user_id> payload from already validated
+    arguments (see parse_history_args()). `user_id` is the users.id UUID, or
+    None for legacy-only accounts, which have no NASA history.
+    """
+    if agg == "auto":
+        agg = choose_aggregation(from_date, to_date, max_points)
+    series = {param: [] for param in params}
+    sources = []
+
+    query_args = {"user_id": user_id, "from_date": period_start(agg, from_date), "to_date": to_date}
+    if user_id is not None and agg == "day":
+        for table, query, columns in DAILY_SOURCES:
+            if not any(param in series for param in columns):
+                continue
+            sources.append(table)
+            cur.execute(query, query_args)
+            _collect(series, columns, cur.fetchall())
+    elif user_id is not None:
+        table, query = ROLLUP_SOURCES[agg]
+        sources.append(table)
+        cur.execute(query, query_args)
+        _collect(series, PARAMS, cur.fetchall())
+
+    downsampled = False
+    for param, points in series.items():
+        if len(points) > max_points:
+            series[param] = lttb(points, max_points)
+            downsampled = True
+    return {
+        "from": from_date,
+        "to": to_date,
+        "agg": agg,
+        "sources": sources,
+        "maxPoints": max_points,
+        "downsampled": downsampled,
+        "series": series,
+    }
+
+
+def _collect(series, columns, rows):
+    """Appends the non-NULL values of each requested column to its series."""
+    for day, *values in rows:
+        for param, value in zip(columns, values):
+            if value is not None and param in series:
+                series[param].append((day, value))
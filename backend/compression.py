@@ -0,0 +1,94 @@
+"""
+Negotiated response compression.
+
+init_app() compresses 200 responses of COMPRESSIBLE_MIMETYPES that are at
+least COMPRESS_MIN_BYTES long, using brotli when the client accepts it and
+the brotli package is installed, gzip otherwise. Small bodies go out
+as-is, since compressing them saves nothing. Compressed responses, and
+304s to clients that accept an encoding, get a weak ETag (same content,
+different bytes), which still matches the response cache's If-None-Match
+checks.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Tuned for on-the-fly compression: brotli's default quality 11 is far too slow per request
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+
+
+def _compress_gzip(body):
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compress_brotli(body):
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def available_encodings():
+    """Encodings in server preference order."""
+    encodings = {"gzip": _compress_gzip}
+    if brotli is not None:
+        encodings = {"br": _compress_brotli, **encodings}
+    return encodings
+
+
+def choose_encoding(accept_encodings, encodings=None):
+    """The encoding the client rates highest, server order breaking ties; None for identity."""
+    encodings = encodings or available_encodings()
+    best, best_quality = None, 0
+    for name in encodings:
+        quality = accept_encodings.quality(name)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    if (response.status_code not in (200, 304) or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encodings = available_encodings()
+    encoding = choose_encoding(request.accept_encodings, encodings)
+    if encoding is None:
+        return response
+    if response.status_code == 304:
+        # Keep the ETag the same as on the (possibly compressed) 200
+        _weaken_etag(response)
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(encodings[encoding](body))
+    response.headers["Content-Encoding"] = encoding
+    _weaken_etag(response)
+    return response
+
+
+def init_app(app):
+    if not COMPRESS_ENABLED:
+        return
+
+    @app.after_request
+    def compress_after_request(response):
+        return compress_response(response)
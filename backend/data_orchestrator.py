@@ -1,20 +1,156 @@
 import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from app import get_db_connection
-from nasa_data_model import get_agro_climate_data
+from bulk_write import upsert_weather_rows, upsert_soil_rows
+from db import db_connection
+from partitions import ensure_partitions
+from nasa_data_model import get_agro_climate_data, get_regional_climate_data
+from power_cache import snap_to_cell
+from power_decode import decode_power_parameters, select_from, weather_rows, soil_rows
+from power_store import get_store
+from response_cache import invalidate_user, mark_users_changed
 
-def update_nasa_data_for_user(user_id: str):
+# How far back a full refresh (or a user with no data yet) reaches
+HISTORY_DAYS = int(os.getenv("NASA_HISTORY_DAYS", "30"))
+# Trailing days POWER may still revise, re-pulled on every incremental run
+REVISION_DAYS = int(os.getenv("NASA_REVISION_DAYS", "3"))
+# POWER parameters that end up in nasa_weather_data / nasa_soil_data
+DB_PARAMETERS = ["T2M", "T2M_MIN", "T2M_MAX", "PRECTOTCORR", "EVAP", "SM_0_10cm", "TS", "GWETTOP"]
+# Concurrent POWER fetches during a fleet-wide refresh
+REFRESH_WORKERS = int(os.getenv("NASA_REFRESH_WORKERS", "8"))
+# "point": one daily/point call per grid cell. "regional": dense clusters of
+# cells are fetched through daily/regional bounding boxes first.
+FETCH_MODE = os.getenv("NASA_FETCH_MODE", "point")
+FETCH_MODES = ("point", "regional")
+
+# Latest complete day per user: both the weather row and the default-zone
+# soil row hold real values. Days POWER has not published yet are stored
+# with NULLs and do not count.
+LAST_COMPLETE_DATES_QUERY = """
+    SELECT u.id, CASE WHEN w.last_date IS NULL OR s.last_date IS NULL THEN NULL
+                      ELSE LEAST(w.last_date, s.last_date) END
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id, MAX(date) AS last_date FROM nasa_weather_data
+        WHERE temperature_2m_avg IS NOT NULL
+        GROUP BY user_id
+    ) w ON w.user_id = u.id
+    LEFT JOIN (
+        SELECT nsd.user_id, MAX(nsd.date) AS last_date FROM nasa_soil_data nsd
+        JOIN farm_zones fz ON fz.id = nsd.zone_id AND fz.zone_name = 'Default'
+        WHERE nsd.soil_temperature_0_5cm IS NOT NULL
+        GROUP BY nsd.user_id
+    ) s ON s.user_id = u.id
+"""
+
+def _last_complete_date(cur, user_id):
+    """
+    Returns the latest date for which both the weather and default-zone soil
+    rows of a user hold real values, or None if either has nothing yet.
+    """
+    cur.execute(LAST_COMPLETE_DATES_QUERY + " WHERE u.id = %s", (user_id,))
+    row = cur.fetchone()
+    return row[1] if row else None
+
+def _refresh_start_date(end_date, last_complete, incremental):
+    start_date = end_date - timedelta(days=HISTORY_DAYS)
+    if incremental and last_complete:
+        start_date = max(start_date, last_complete - timedelta(days=REVISION_DAYS - 1))
+    return start_date
+
+def _ensure_default_zones(cur, user_ids):
+    """
+    Makes sure every user has a default farm zone to link soil data to and
+    returns {user_id: zone_id}. zone_name is VARCHAR(10).
+    """
+    cur.execute("""
+        INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+        SELECT uid, 'Default', 'Unassigned', 0 FROM unnest(%s::uuid[]) AS uid
+        ON CONFLICT (user_id, zone_name) DO NOTHING
+    """, (list(user_ids),))
+    cur.execute("""
+        SELECT user_id, id FROM farm_zones
+        WHERE user_id = ANY(%s::uuid[]) AND zone_name = 'Default'
+    """, (list(user_ids),))
+    return {str(user_id): zone_id for user_id, zone_id in cur.fetchall()}
+
+def _store_nasa_data(users, nasa_data, verbose=True):
+    """
+    Upserts weather and default-zone soil rows for (user_id, start_str) pairs
+    that share one POWER parameter mapping, with one set-based upsert per
+    table, in a transaction of its own. Returns the number of weather rows
+    written.
+    """
+    # Decode once per payload; each user then takes a zero-copy slice from
+    # their own start date, so several users can share one fetch that covers
+    # the widest range any of them needs
+    dates, columns = decode_power_parameters(nasa_data, DB_PARAMETERS)
+    if not len(dates):
+        if verbose:
+            print("NASA data received, but no date entries found.")
+        return 0
+    # Before the write transaction's first statement (see partitions.py)
+    ensure_partitions(dates[0].astype(object), dates[-1].astype(object))
+
+    with db_connection() as conn, conn.cursor() as cur:
+        zone_ids = _ensure_default_zones(cur, [user_id for user_id, _ in users])
+
+        weather_records_to_upsert = []
+        soil_records_to_upsert = []
+        for user_id, start_str in users:
+            user_dates, user_columns = select_from(dates, columns, start_str)
+            weather_records_to_upsert.extend(weather_rows(user_id, user_dates, user_columns))
+            soil_records_to_upsert.extend(soil_rows(user_id, zone_ids[user_id], user_dates, user_columns))
+
+        if not weather_records_to_upsert:
+            if verbose:
+                print("NASA data received, but no date entries found.")
+            return 0
+
+        # Upsert (Insert or Update) records into the database
+        # Using ON CONFLICT to handle existing records gracefully
+        upsert_weather_rows(cur, weather_records_to_upsert)
+        upsert_soil_rows(cur, soil_records_to_upsert)
+        mark_users_changed(cur, (user_id for user_id, _ in users))
+        conn.commit()
+
+    if verbose:
+        print(f"Upserted {len(weather_records_to_upsert)} records into nasa_weather_data.")
+        print(f"Upserted {len(soil_records_to_upsert)} records into nasa_soil_data.")
+    return len(weather_records_to_upsert)
+
+def _archive_raw(cell, nasa_data):
+    """
+    Keeps every fetched POWER parameter in the columnar store; Postgres only
+    holds the DB_PARAMETERS the app serves. Failures here never block the DB refresh.
+    """
+    store = get_store()
+    if store is None:
+        return
+    try:
+        store.write(cell[0], cell[1], nasa_data)
+    except Exception as e:
+        print(f"Error archiving POWER data for cell {cell}: {str(e)}")
+
+def update_nasa_data_for_user(user_id: str, incremental: bool = True):
     """
     Orchestrates fetching NASA data for a user and updating the database.
 
     1. Fetches user's farm coordinates.
     2. Fetches historical and forecast data from NASA POWER API.
     3. Parses the data and upserts it into the relevant database tables.
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
 
-    try:
+    With incremental=True (the default) only dates missing since the last
+    complete day, plus the trailing REVISION_DAYS, are fetched and upserted.
+    Pass incremental=False to re-pull the whole HISTORY_DAYS window.
+    """
+    # The read transaction ends before the POWER fetch: an idle open
+    # transaction would hold locks on the partitioned tables (see
+    # partitions.py), and the rows written later would carry its start
+    # time as updated_at, behind the incremental jobs' watermarks
+    with db_connection(readonly=True) as conn, conn.cursor() as cur:
         # 1. Get user's farm location
         cur.execute("SELECT farm_latitude, farm_longitude FROM users WHERE id = %s", (user_id,))
         user_location = cur.fetchone()
@@ -26,103 +162,154 @@ def update_nasa_data_for_user(user_id: str):
         latitude, longitude = user_location
         print(f"Orchestrating NASA data update for user {user_id} at ({latitude}, {longitude}).")
 
-        # 2. Define date range (e.g., last 30 days for historical data)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        start_str = start_date.strftime("%Y%m%d")
-        end_str = end_date.strftime("%Y%m%d")
+        # 2. Define date range: the last HISTORY_DAYS days, or in incremental
+        # mode only the days after the last complete one we already hold plus
+        # the trailing days POWER may still revise
+        end_date = datetime.now().date()
+        last_complete = _last_complete_date(cur, user_id) if incremental else None
+        start_date = _refresh_start_date(end_date, last_complete, incremental)
 
-        # 3. Fetch data from NASA
-        nasa_data = get_agro_climate_data(latitude, longitude, start_str, end_str)
+    start_str = start_date.strftime("%Y%m%d")
+    end_str = end_date.strftime("%Y%m%d")
+    print(f"Fetching NASA data for user {user_id} from {start_str} to {end_str}.")
 
-        if not nasa_data:
-            print(f"Failed to fetch NASA data for user {user_id}.")
-            return
+    # 3. Fetch data from NASA
+    nasa_data = get_agro_climate_data(latitude, longitude, start_str, end_str)
 
-        # 4. Process and store the data
-        dates = sorted(nasa_data.get("T2M", {}).keys())
-        if not dates:
-            print("NASA data received, but no date entries found.")
-            return
+    if not nasa_data:
+        print(f"Failed to fetch NASA data for user {user_id}.")
+        return
 
-        weather_records_to_upsert = []
-        soil_records_to_upsert = []
+    _archive_raw(snap_to_cell(latitude, longitude), nasa_data)
+
+    # 4. Process and store the data
+    _store_nasa_data([(user_id, None)], nasa_data)
+    invalidate_user(user_id)
+
+def _refresh_cell(cell, users, end_str, nasa_data=None):
+    """
+    Fetches one grid cell covering the earliest start any of its users needs
+    (unless nasa_data was already fetched regionally) and writes the result
+    to every user in the cell in a single transaction.
+    Returns (users_written, fetch_seconds, store_seconds).
+    """
+    fetch_started = time.perf_counter()
+    if nasa_data is None:
+        start_str = min(start for _, start in users)
+        nasa_data = get_agro_climate_data(cell[0], cell[1], start_str, end_str)
+    fetch_seconds = time.perf_counter() - fetch_started
+
+    if not nasa_data:
+        print(f"Failed to fetch NASA data for cell {cell} ({len(users)} users).")
+        return 0, fetch_seconds, 0.0
+
+    store_started = time.perf_counter()
+    _archive_raw(cell, nasa_data)
+    _store_nasa_data(users, nasa_data, verbose=False)
+    for user_id, _ in users:
+        invalidate_user(user_id)
+    return len(users), fetch_seconds, time.perf_counter() - store_started
+
+def refresh_all_users(incremental: bool = True, max_workers: int = REFRESH_WORKERS, mode: str = FETCH_MODE):
+    """
+    Refreshes NASA data for every user with farm coordinates.
+
+    Users are grouped by POWER grid cell so each cell is fetched once, cells
+    are fetched through a bounded thread pool, and each result is fanned out
+    to all users in the cell. In "regional" mode dense clusters of cells are
+    fetched up front as bounding boxes and only the rest go point by point.
+    Returns a dict of throughput and per-stage timings.
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode {mode!r}, expected one of {FETCH_MODES}")
+    started = time.perf_counter()
+    end_date = datetime.now().date()
+    end_str = end_date.strftime("%Y%m%d")
 
-        # Ensure a default farm zone exists to link soil data
-        cur.execute("""
-            INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
-            VALUES (%s, 'Default Zone', 'Unassigned', 0)
-            ON CONFLICT (user_id, zone_name) DO NOTHING
-            RETURNING id
-        """, (user_id,))
-        zone_result = cur.fetchone()
-        if zone_result:
-            zone_id = zone_result[0]
+    # 1. Select users with coordinates and, for incremental runs, their last complete day
+    with db_connection() as conn, conn.cursor() as cur:
+        if incremental:
+            cur.execute(f"""
+                SELECT u.id, u.farm_latitude, u.farm_longitude, lc.last_complete
+                FROM users u
+                JOIN ({LAST_COMPLETE_DATES_QUERY}) AS lc (user_id, last_complete) ON lc.user_id = u.id
+                WHERE u.farm_latitude IS NOT NULL AND u.farm_longitude IS NOT NULL
+            """)
         else:
-            cur.execute("SELECT id FROM farm_zones WHERE user_id = %s AND zone_name = 'Default Zone'", (user_id,))
-            zone_id = cur.fetchone()[0]
-
-        for date_str in dates:
-            def get_nasa_value(param):
-                """Helper to get value from NASA data, returning None if it's a fill value."""
-                value = nasa_data.get(param, {}).get(date_str)
-                return None if value is None or value <= -999 else value
-
-            # Prepare weather data record
-            weather_records_to_upsert.append((
-                user_id,
-                datetime.strptime(date_str, "%Y%m%d").date(),
-                nasa_data.get("T2M", {}).get(date_str),
-                nasa_data.get("PRECTOTCORR", {}).get(date_str),
-                nasa_data.get("EVAP", {}).get(date_str)
-                get_nasa_value("T2M"),
-                get_nasa_value("PRECTOTCORR"),
-                get_nasa_value("EVAP")
-            ))
-
-            # Prepare soil data record
-            soil_records_to_upsert.append((
-                user_id,
-                zone_id,
-                datetime.strptime(date_str, "%Y%m%d").date(),
-                nasa_data.get("SM_0_10cm", {}).get(date_str),
-                nasa_data.get("TS", {}).get(date_str),
-                nasa_data.get("GWETTOP", {}).get(date_str)
-                get_nasa_value("SM_0_10cm"),
-                get_nasa_value("TS"),
-                get_nasa_value("GWETTOP")
-            ))
-
-        # 5. Upsert (Insert or Update) records into the database
-        # Using ON CONFLICT to handle existing records gracefully
-        upsert_weather_query = """
-            INSERT INTO nasa_weather_data (user_id, date, temperature_2m_avg, precipitation, eto)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (user_id, date) DO UPDATE SET
-                temperature_2m_avg = EXCLUDED.temperature_2m_avg,
-                precipitation = EXCLUDED.precipitation,
-                eto = EXCLUDED.eto;
-        """
-        cur.executemany(upsert_weather_query, weather_records_to_upsert)
-        print(f"Upserted {len(weather_records_to_upsert)} records into nasa_weather_data.")
+            cur.execute("""
+                SELECT id, farm_latitude, farm_longitude, NULL
+                FROM users
+                WHERE farm_latitude IS NOT NULL AND farm_longitude IS NOT NULL
+            """)
+        user_rows = cur.fetchall()
+    select_seconds = time.perf_counter() - started
 
-        upsert_soil_query = """
-            INSERT INTO nasa_soil_data (user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm, surface_wetness)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (user_id, zone_id, date) DO UPDATE SET
-                soil_moisture_0_5cm = EXCLUDED.soil_moisture_0_5cm,
-                soil_temperature_0_5cm = EXCLUDED.soil_temperature_0_5cm,
-                surface_wetness = EXCLUDED.surface_wetness;
-        """
-        cur.executemany(upsert_soil_query, soil_records_to_upsert)
-        print(f"Upserted {len(soil_records_to_upsert)} records into nasa_soil_data.")
+    # 2. Group users by grid cell
+    group_started = time.perf_counter()
+    cells = defaultdict(list)
+    for user_id, latitude, longitude, last_complete in user_rows:
+        start_date = _refresh_start_date(end_date, last_complete, incremental)
+        cells[snap_to_cell(latitude, longitude)].append((str(user_id), start_date.strftime("%Y%m%d")))
+    group_seconds = time.perf_counter() - group_started
 
-        conn.commit()
+    print(f"Refreshing NASA data for {len(user_rows)} users in {len(cells)} grid cells "
+          f"with {max_workers} workers ({mode} mode).")
+
+    # 3. In regional mode, fetch dense clusters of cells as bounding boxes
+    regional_started = time.perf_counter()
+    prefetched = {}
+    if mode == "regional":
+        cell_starts = {cell: min(start for _, start in users) for cell, users in cells.items()}
+        prefetched = get_regional_climate_data(cell_starts, end_str)
+    regional_seconds = time.perf_counter() - regional_started
+
+    # 4. Fetch each remaining cell once and fan out to its users
+    work_started = time.perf_counter()
+    users_written = 0
+    failed_cells = 0
+    fetch_seconds = 0.0
+    store_seconds = 0.0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_refresh_cell, cell, users, end_str, prefetched.get(cell)): cell
+            for cell, users in cells.items()
+        }
+        for future in as_completed(futures):
+            try:
+                written, fetched_in, stored_in = future.result()
+            except Exception as e:
+                print(f"Error refreshing cell {futures[future]}: {str(e)}")
+                failed_cells += 1
+                continue
+            if not written:
+                failed_cells += 1
+            users_written += written
+            fetch_seconds += fetched_in
+            store_seconds += stored_in
+    work_seconds = time.perf_counter() - work_started
 
-    finally:
-        cur.close()
-        conn.close()
+    total_seconds = time.perf_counter() - started
+    return {
+        "users": len(user_rows),
+        "users_written": users_written,
+        "cells": len(cells),
+        "failed_cells": failed_cells,
+        "workers": max_workers,
+        "mode": mode,
+        "regional_cells": len(prefetched),
+        "total_seconds": round(total_seconds, 3),
+        "users_per_second": round(users_written / total_seconds, 2) if total_seconds else 0.0,
+        "cells_per_second": round((len(cells) - failed_cells) / total_seconds, 2) if total_seconds else 0.0,
+        "stages": {
+            "select_seconds": round(select_seconds, 3),
+            "group_seconds": round(group_seconds, 3),
+            "regional_fetch_seconds": round(regional_seconds, 3),
+            "fetch_and_store_wall_seconds": round(work_seconds, 3),
+            # Summed across workers, so these can exceed the wall time
+            "fetch_seconds_total": round(fetch_seconds, 3),
+            "store_seconds_total": round(store_seconds, 3),
+        },
+    }
 
 if __name__ == '__main__':
     # Example of how to run the orchestration for a specific user
@@ -132,4 +319,5 @@ if __name__ == '__main__':
     example_user_id = "a_valid_uuid_from_your_users_table"
     print(f"Running standalone orchestration for user: {example_user_id}")
     # update_nasa_data_for_user(example_user_id)
-    print("To run this, replace 'a_valid_uuid_from_your_users_table' with a real user UUID and uncomment the line above.")
\ No newline at end of file
+    print("To run this, replace 'a_valid_uuid_from_your_users_table' with a real user UUID and uncomment the line above.")
+    print("To refresh every farm at once, run `flask refresh-nasa --all`.")
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2 import pool as pg_pool
+from dotenv import load_dotenv
+
+from metrics import InstrumentedCursor, record_connection_acquire
+
+load_dotenv()
+
+POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX", "20"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "5.0"))
+
+
+def _connection_kwargs():
+    return {
+        "host": os.getenv("POSTGRES_HOST"),
+        "database": os.getenv("POSTGRES_DB"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+        # Times every statement for /metrics and the slow-query log
+        "cursor_factory": InstrumentedCursor,
+    }
+
+
+def get_db_connection():
+    """
+    Opens a new, unpooled connection.
+
+    Only use this for one-off scripts; request handlers and jobs should go
+    through db_connection() so connections are reused and always returned.
+    """
+    return psycopg2.connect(**_connection_kwargs())
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL pool with bounded checkout waits.
+
+    psycopg2's ThreadedConnectionPool raises immediately when exhausted, so a
+    semaphore sized to maxconn gates checkouts and lets callers wait up to
+    `timeout` seconds for a slot. Counters are kept for utilisation and wait
+    time reporting.
+    """
+
+    def __init__(self, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE, timeout=POOL_CHECKOUT_TIMEOUT):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **_connection_kwargs())
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No database connection available after {timeout:.1f}s")
+
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._checkouts += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        discard = bool(conn.closed)
+        if not discard:
+            try:
+                # Never hand out a connection with an open or failed transaction
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.readonly:
+                    conn.readonly = None
+            except psycopg2.Error:
+                discard = True
+
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if discard:
+                    self._discarded += 1
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def stats(self):
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "utilisation": round(self._in_use / self.maxconn, 4),
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+@contextmanager
+def db_connection(readonly=False):
+    """
+    Checks a connection out of the shared pool for the duration of a block.
+
+    The connection is rolled back if the block raises or leaves a
+    transaction open, and is always returned to the pool. With
+    readonly=True transactions start as BEGIN READ ONLY, so any write
+    fails and the block could equally run against a replica.
+    """
+    pool = get_pool()
+    started = time.perf_counter()
+    conn = pool.getconn()
+    record_connection_acquire(time.perf_counter() - started)
+    if readonly:
+        conn.readonly = True
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def pool_stats():
+    """Pool counters, or None if nothing has used the pool yet."""
+    return _pool.stats() if _pool is not None else None
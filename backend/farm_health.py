@@ -0,0 +1,188 @@
+"""
+Batch farm-health scoring.
+
+Scores every (user, date) with NASA inputs in one set-based statement and
+upserts them into farm_health_metrics:
+
+- soil_health_score: 7-day mean soil moisture, surface wetness and soil
+  temperature, each scored against an agronomic band
+- crop_health_score: 7-day mean vegetation crop_health_score when present,
+  otherwise heat stress from the 7-day mean 2 m air temperature
+- water_efficiency_score: 7-day precipitation over evapotranspiration
+- overall_health_score: weighted mean of whichever of the three exist
+
+Rolling means use window aggregates over a 7-day RANGE frame, so gaps in
+the data are handled. Runs are incremental: only (user, date) pairs whose
+inputs changed since the last run's watermark (via updated_at on the input
+tables), plus the following days whose windows include them, are
+rescored. Work therefore scales with new data, not with total history.
+
+Run nightly with `flask score-farm-health`.
+"""
+import os
+from datetime import timedelta
+
+from response_cache import mark_users_changed
+from watermarks import get_watermark, set_watermark
+
+JOB_NAME = "farm_health_scores"
+WINDOW_DAYS = 7
+# Rows committed by concurrent writers can carry timestamps slightly older
+# than our watermark; rescoring a small overlap is idempotent
+WATERMARK_LAG_SECONDS = int(os.getenv("FARM_HEALTH_WATERMARK_LAG_SECONDS", "300"))
+
+WEIGHTS = {"soil": 0.40, "crop": 0.35, "water": 0.25}
+
+
+def _band(expr, low, high, tolerance):
+    """SQL scoring 100 inside [low, high], falling linearly to 0 `tolerance` outside it."""
+    return (
+        f"GREATEST(0, 100 - 100 * GREATEST({low} - ({expr}), ({expr}) - {high}, 0) / {tolerance})"
+    )
+
+
+def _mean_of_present(*exprs):
+    """SQL mean of the non-NULL expressions, NULL if all are NULL."""
+    total = " + ".join(f"COALESCE({expr}, 0)" for expr in exprs)
+    return f"({total}) / NULLIF(num_nonnulls({', '.join(exprs)}), 0)"
+
+
+def _weighted_mean(pairs):
+    """SQL weighted mean over (expr, weight) pairs, skipping NULL expressions."""
+    total = " + ".join(f"{weight} * COALESCE({expr}, 0)" for expr, weight in pairs)
+    weights = " + ".join(f"CASE WHEN {expr} IS NULL THEN 0 ELSE {weight} END" for expr, weight in pairs)
+    return f"({total}) / NULLIF({weights}, 0)"
+
+
+SOIL_SCORE = _mean_of_present(
+    _band("soil_moisture_7d", 0.20, 0.35, 0.15),        # m^3/m^3
+    _band("surface_wetness_7d", 50, 80, 40),            # percent
+    _band("soil_temperature_7d", 15, 30, 15),           # C
+)
+CROP_SCORE = f"COALESCE(vegetation_crop_health_7d, {_band('temperature_7d', 18, 28, 12)})"
+WATER_SCORE = _band("precipitation_7d / NULLIF(eto_7d, 0)", 0.8, 1.5, 0.8)
+
+SCORE_QUERY = f"""
+    WITH changed AS (
+        SELECT user_id, date FROM nasa_weather_data WHERE updated_at > %(since)s
+        UNION
+        SELECT user_id, date FROM nasa_soil_data WHERE updated_at > %(since)s
+        UNION
+        SELECT user_id, date FROM nasa_vegetation_data WHERE updated_at > %(since)s
+    ),
+    -- A changed day also moves the rolling windows of the days after it
+    dirty AS (
+        SELECT DISTINCT c.user_id, c.date + shift AS date
+        FROM changed c CROSS JOIN generate_series(0, {WINDOW_DAYS - 1}) AS shift
+    ),
+    bounds AS (
+        SELECT user_id, MIN(date) - {WINDOW_DAYS - 1} AS from_date, MAX(date) AS to_date
+        FROM dirty GROUP BY user_id
+    ),
+    inputs AS (
+        SELECT user_id, date,
+               AVG(temperature) AS temperature, SUM(precipitation) AS precipitation, SUM(eto) AS eto,
+               AVG(soil_moisture) AS soil_moisture, AVG(surface_wetness) AS surface_wetness,
+               AVG(soil_temperature) AS soil_temperature, AVG(vegetation_crop_health) AS vegetation_crop_health,
+               COUNT(temperature) AS weather_rows, COUNT(soil_temperature) AS soil_rows,
+               COUNT(vegetation_crop_health) AS vegetation_rows
+        FROM (
+            SELECT w.user_id, w.date, w.temperature_2m_avg AS temperature, w.precipitation, w.eto,
+                   NULL::numeric AS soil_moisture, NULL::numeric AS surface_wetness,
+                   NULL::numeric AS soil_temperature, NULL::numeric AS vegetation_crop_health
+            FROM nasa_weather_data w
+            JOIN bounds b ON b.user_id = w.user_id AND w.date BETWEEN b.from_date AND b.to_date
+            UNION ALL
+            -- Averaged over the user's zones; POWER's GWETTOP is a 0-1 fraction
+            SELECT s.user_id, s.date, NULL, NULL, NULL,
+                   s.soil_moisture_0_5cm,
+                   CASE WHEN s.surface_wetness <= 1 THEN s.surface_wetness * 100 ELSE s.surface_wetness END,
+                   s.soil_temperature_0_5cm, NULL
+            FROM nasa_soil_data s
+            JOIN bounds b ON b.user_id = s.user_id AND s.date BETWEEN b.from_date AND b.to_date
+            UNION ALL
+            SELECT v.user_id, v.date, NULL, NULL, NULL, NULL, NULL, NULL, v.crop_health_score
+            FROM nasa_vegetation_data v
+            JOIN bounds b ON b.user_id = v.user_id AND v.date BETWEEN b.from_date AND b.to_date
+        ) rows
+        GROUP BY user_id, date
+    ),
+    windowed AS (
+        SELECT user_id, date,
+               AVG(temperature) OVER w AS temperature_7d,
+               SUM(precipitation) OVER w AS precipitation_7d,
+               SUM(eto) OVER w AS eto_7d,
+               AVG(soil_moisture) OVER w AS soil_moisture_7d,
+               AVG(surface_wetness) OVER w AS surface_wetness_7d,
+               AVG(soil_temperature) OVER w AS soil_temperature_7d,
+               AVG(vegetation_crop_health) OVER w AS vegetation_crop_health_7d,
+               SUM(weather_rows) OVER w AS weather_days,
+               SUM(soil_rows) OVER w AS soil_days,
+               SUM(vegetation_rows) OVER w AS vegetation_days
+        FROM inputs
+        WINDOW w AS (PARTITION BY user_id ORDER BY date
+                     RANGE BETWEEN INTERVAL '{WINDOW_DAYS - 1} days' PRECEDING AND CURRENT ROW)
+    ),
+    scored AS (
+        SELECT wd.user_id, wd.date,
+               ROUND(({SOIL_SCORE})::numeric, 2) AS soil,
+               ROUND(({CROP_SCORE})::numeric, 2) AS crop,
+               ROUND(({WATER_SCORE})::numeric, 2) AS water,
+               jsonb_build_object(
+                   'window_days', {WINDOW_DAYS},
+                   'weather_days', wd.weather_days,
+                   'soil_days', wd.soil_days,
+                   'vegetation_days', wd.vegetation_days
+               ) AS sources
+        FROM windowed wd
+        JOIN dirty d ON d.user_id = wd.user_id AND d.date = wd.date
+    )
+    INSERT INTO farm_health_metrics (user_id, date, overall_health_score, soil_health_score,
+                                     crop_health_score, water_efficiency_score, nasa_data_sources)
+    SELECT user_id, date,
+           ROUND(({_weighted_mean([("soil", WEIGHTS["soil"]), ("crop", WEIGHTS["crop"]), ("water", WEIGHTS["water"])])})::numeric, 2),
+           soil, crop, water, sources
+    FROM scored
+    WHERE num_nonnulls(soil, crop, water) > 0
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        overall_health_score = EXCLUDED.overall_health_score,
+        soil_health_score = EXCLUDED.soil_health_score,
+        crop_health_score = EXCLUDED.crop_health_score,
+        water_efficiency_score = EXCLUDED.water_efficiency_score,
+        nasa_data_sources = EXCLUDED.nasa_data_sources,
+        updated_at = CURRENT_TIMESTAMP
+    -- Unchanged scores keep their updated_at, so the rollups skip them
+    WHERE (farm_health_metrics.overall_health_score, farm_health_metrics.soil_health_score,
+           farm_health_metrics.crop_health_score, farm_health_metrics.water_efficiency_score,
+           farm_health_metrics.nasa_data_sources)
+          IS DISTINCT FROM
+          (EXCLUDED.overall_health_score, EXCLUDED.soil_health_score, EXCLUDED.crop_health_score,
+           EXCLUDED.water_efficiency_score, EXCLUDED.nasa_data_sources)
+"""
+
+
+def score_farm_health(conn, full=False):
+    """
+    Rescores every (user, date) whose inputs changed since the last run, or
+    all history with full=True, and advances the watermark in the same
+    transaction. Returns {"rows_scored", "since", "watermark"}.
+    """
+    with conn.cursor() as cur:
+        since = None if full else get_watermark(cur, JOB_NAME)
+        cur.execute("SELECT statement_timestamp()::timestamp")
+        run_started = cur.fetchone()[0]
+
+        scan_from = since - timedelta(seconds=WATERMARK_LAG_SECONDS) if since else "-infinity"
+        cur.execute(SCORE_QUERY, {"since": scan_from})
+        rows_scored = cur.rowcount
+        if rows_scored:
+            # Rows written by this transaction carry its start time
+            cur.execute("SELECT DISTINCT user_id FROM farm_health_metrics WHERE updated_at >= CURRENT_TIMESTAMP")
+            mark_users_changed(cur, [row[0] for row in cur.fetchall()])
+        set_watermark(cur, JOB_NAME, run_started)
+    conn.commit()
+    return {
+        "rows_scored": rows_scored,
+        "since": since.isoformat() if since else None,
+        "watermark": run_started.isoformat(),
+    }
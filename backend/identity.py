@@ -0,0 +1,159 @@
+"""
+Resolves any incoming user id to one canonical identity.
+
+Users exist in two schemes: UUIDs in `users` and free-form ids in
+`legacy_users`. Signup creates both rows with the same email and the
+frontend may hold either id. Legacy ids can themselves be UUIDs, so the
+scheme can't be guessed from the id's length. resolve_user() looks the id
+up in both tables and links the other half by email, all in one indexed
+query. Results sit in a bounded LRU with a TTL, so a hit costs no round
+trip.
+
+Writers that create or change users call invalidate_identity(). This
+only affects the calling process; the TTL bounds staleness elsewhere.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+IDENTITY_CACHE_TTL_SECONDS = int(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "300"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+# user_id: the users.id UUID (str), or None for legacy-only accounts
+# legacy_id: the legacy_users.userId, or None for users without a legacy row
+Identity = namedtuple("Identity", ["user_id", "legacy_id", "first_name", "last_name", "email"])
+
+# Every lookup is a primary-key or unique-email probe. A users.id match
+# wins over a legacy_users.userId match when both exist.
+RESOLVE_BY_ID_QUERY = """
+    SELECT u.id::text, l.userId, u.first_name, u.last_name, u.email
+    FROM users u
+    LEFT JOIN legacy_users l ON l.email = u.email
+    WHERE u.id = %(uuid)s
+    UNION ALL
+    SELECT u.id::text, l.userId, COALESCE(u.first_name, l.firstName), COALESCE(u.last_name, l.lastName), l.email
+    FROM legacy_users l
+    LEFT JOIN users u ON u.email = l.email
+    WHERE l.userId = %(raw)s
+        AND NOT EXISTS (SELECT 1 FROM users WHERE id = %(uuid)s)
+"""
+
+RESOLVE_BY_EMAIL_QUERY = """
+    SELECT u.id::text, l.userId, COALESCE(u.first_name, l.firstName), COALESCE(u.last_name, l.lastName),
+           COALESCE(u.email, l.email), l.password
+    FROM (SELECT %(email)s::varchar AS email) q
+    LEFT JOIN users u ON u.email = q.email
+    LEFT JOIN legacy_users l ON l.email = q.email
+    WHERE u.id IS NOT NULL OR l.userId IS NOT NULL
+"""
+
+
+def _as_uuid(raw):
+    try:
+        return str(uuid.UUID(raw))
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+class IdentityCache:
+    """Thread-safe LRU of resolved identities keyed by the id they were requested with."""
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL_SECONDS, max_entries=IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, identity):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *ids):
+        """Drops cached identities requested by, or resolving to, any of `ids`."""
+        ids = {str(value) for value in ids if value}
+        with self._lock:
+            keys = [
+                key for key, (_, identity) in self._entries.items()
+                if key in ids or identity.user_id in ids or identity.legacy_id in ids
+            ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+identity_cache = IdentityCache()
+
+
+def resolve_user(cur, user_id):
+    """Returns the Identity for a UUID or legacy id, or None if neither table has it."""
+    user_id = str(user_id)
+    identity = identity_cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    cur.execute(RESOLVE_BY_ID_QUERY, {"uuid": _as_uuid(user_id), "raw": user_id})
+    row = cur.fetchone()
+    if row is None:
+        # Unknown ids are not cached, so a user created elsewhere is found at once
+        return None
+    identity = Identity(*row)
+    identity_cache.put(user_id, identity)
+    return identity
+
+
+def resolve_email(cur, email):
+    """
+    Returns (Identity, legacy password hash) for an email, or (None, None).
+    Used by signin and signup; never cached, since it carries the hash.
+    """
+    cur.execute(RESOLVE_BY_EMAIL_QUERY, {"email": email})
+    row = cur.fetchone()
+    if row is None:
+        return None, None
+    return Identity(*row[:5]), row[5]
+
+
+def invalidate_identity(*ids):
+    """Hook for writers to call after creating or changing a user."""
+    return identity_cache.invalidate(*ids)
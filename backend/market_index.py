@@ -0,0 +1,154 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+EARTH_RADIUS_KM = 6371.0088
+
+# How long a loaded market index is trusted before it is rebuilt from market_data
+MARKET_INDEX_TTL_SECONDS = int(os.getenv("MARKET_INDEX_TTL_SECONDS", "300"))
+NEAREST_MARKET_CACHE_SIZE = int(os.getenv("NEAREST_MARKET_CACHE_SIZE", "50000"))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(latitude, longitude):
+    """Maps a coordinate onto the unit sphere; chord length there is monotonic in great-circle distance."""
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+class _KDTree:
+    """Static 3-d tree over unit vectors, answering nearest-neighbour queries."""
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.points[i][axis])
+        mid = len(indexes) // 2
+        return (
+            indexes[mid],
+            axis,
+            self._build(indexes[:mid], depth + 1),
+            self._build(indexes[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, query):
+        """Returns the index of the point closest to query, or None if empty."""
+        best_index, best_dist = None, math.inf
+        # (node, squared distance from query to the node's splitting plane)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, plane_dist = stack.pop()
+            if node is None or plane_dist >= best_dist:
+                continue
+            index, axis, left, right = node
+            point = self.points[index]
+            dist = (point[0] - query[0]) ** 2 + (point[1] - query[1]) ** 2 + (point[2] - query[2]) ** 2
+            if dist < best_dist:
+                best_index, best_dist = index, dist
+
+            diff = query[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+        return best_index
+
+
+class MarketIndex:
+    """In-memory spatial index over market_data rows that have coordinates."""
+
+    def __init__(self, rows, generation=0):
+        # rows: (id, market_name, latitude, longitude, distance_km)
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        self.markets = [
+            (market_id, name, float(lat), float(lon))
+            for market_id, name, lat, lon, _ in rows
+            if lat is not None and lon is not None
+        ]
+        self._tree = _KDTree([_unit_vector(lat, lon) for _, _, lat, lon in self.markets])
+
+        # Farms without coordinates keep the old behaviour: the market with
+        # the smallest stored distance_km
+        with_distance = [row for row in rows if row[4] is not None]
+        fallback = min(with_distance, key=lambda row: row[4]) if with_distance else None
+        self.fallback = {"name": fallback[1], "distance": float(fallback[4])} if fallback else None
+
+    def __len__(self):
+        return len(self.markets)
+
+    def nearest(self, latitude, longitude):
+        """Returns {"name", "distance"} for the closest market, in km, or the fallback."""
+        if latitude is None or longitude is None or not self.markets:
+            return self.fallback
+        latitude, longitude = float(latitude), float(longitude)
+        index = self._tree.nearest(_unit_vector(latitude, longitude))
+        _, name, market_lat, market_lon = self.markets[index]
+        return {
+            "name": name,
+            "distance": round(haversine_km(latitude, longitude, market_lat, market_lon), 2),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+
+def get_market_index(cur, force_reload=False):
+    """Returns the shared index, rebuilding it from market_data when older than the TTL."""
+    global _index
+    index = _index
+    if index is not None and not force_reload and time.monotonic() - index.loaded_at < MARKET_INDEX_TTL_SECONDS:
+        return index
+
+    with _index_lock:
+        if _index is index:
+            cur.execute("SELECT id, market_name, latitude, longitude, distance_km FROM market_data")
+            _index = MarketIndex(cur.fetchall(), generation=(index.generation + 1 if index else 0))
+        return _index
+
+
+def nearest_market_for_user(cur, user_id, latitude, longitude):
+    """
+    Nearest market for a user's farm, memoised per user until the farm moves
+    or the market index is rebuilt.
+    """
+    index = get_market_index(cur)
+    key = str(user_id)
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if cached and cached[0] == (index.generation, latitude, longitude):
+            _user_cache.move_to_end(key)
+            return cached[1]
+
+    market = index.nearest(latitude, longitude)
+    with _user_cache_lock:
+        _user_cache[key] = ((index.generation, latitude, longitude), market)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > NEAREST_MARKET_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return market
+
+
+def invalidate_market_index():
+    """Forces a rebuild on next use, e.g. after markets are added or moved."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.loaded_at = -math.inf
@@ -0,0 +1,309 @@
+"""
+Per-request latency and database instrumentation, exposed at /metrics.
+
+init_app() hooks every request to record, per route: request count by
+status, a latency histogram, the number of queries and total DB time,
+connection-acquisition time, and the slowest statement. Queries are timed
+by InstrumentedCursor, the cursor factory db.py gives every connection,
+so no call site changes. Each response also carries a Server-Timing
+header with the DB breakdown, which browser dev tools display.
+
+Statements slower than SLOW_QUERY_MS are printed and kept in a ring buffer
+served at /health/slow-queries. Their parameters are only captured with
+SLOW_QUERY_LOG_PARAMS=1, since they can contain personal data.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from flask import Response, g, jsonify, request
+from psycopg2 import extensions, sql
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "0") == "1"
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+STATEMENT_MAX_CHARS = 500
+
+REQUEST_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+_WHITESPACE = re.compile(r"\s+")
+_SQL_COMMENT = re.compile(r"--[^\n]*")
+
+
+class Histogram:
+    """Fixed-bucket histogram; callers hold the registry lock."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(REQUEST_BUCKETS_SECONDS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.acquire = Histogram(REQUEST_BUCKETS_SECONDS)
+        self.slowest_query_seconds = 0.0
+        self.slowest_statement = None
+
+
+class MetricsRegistry:
+    """Thread-safe per-route counters plus the slow-query ring buffer."""
+
+    def __init__(self, slow_log_size=SLOW_QUERY_LOG_SIZE):
+        self._routes = {}
+        self._lock = threading.Lock()
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.slow_query_count = 0
+
+    def record_request(self, route, method, status, seconds, request_stats):
+        with self._lock:
+            stats = self._routes.setdefault((route, method), RouteStats())
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.latency.observe(seconds)
+            stats.queries.observe(request_stats["queries"])
+            stats.db_seconds += request_stats["db_seconds"]
+            for waited in request_stats["acquire_seconds"]:
+                stats.acquire.observe(waited)
+            if request_stats["slowest_seconds"] > stats.slowest_query_seconds:
+                stats.slowest_query_seconds = request_stats["slowest_seconds"]
+                stats.slowest_statement = request_stats["slowest_statement"]
+
+    def record_slow_query(self, entry):
+        with self._lock:
+            self.slow_queries.append(entry)
+            self.slow_query_count += 1
+
+    def slowest_statements(self):
+        with self._lock:
+            return {
+                f"{method} {route}": {
+                    "seconds": round(stats.slowest_query_seconds, 6),
+                    "statement": stats.slowest_statement,
+                }
+                for (route, method), stats in self._routes.items()
+                if stats.slowest_statement
+            }
+
+    def render(self):
+        """Per-route metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            routes = sorted(self._routes.items())
+
+            lines += ["# HELP http_requests_total Requests handled, by route and status.",
+                      "# TYPE http_requests_total counter"]
+            for (route, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f"http_requests_total{_labels(route=route, method=method, status=status)} {count}")
+
+            lines += _histogram_lines("http_request_duration_seconds", "Request latency.",
+                                      routes, lambda stats: stats.latency)
+            lines += _histogram_lines("db_queries_per_request", "Statements executed per request.",
+                                      routes, lambda stats: stats.queries)
+            lines += _histogram_lines("db_connection_acquire_seconds", "Time waiting for a pooled connection.",
+                                      routes, lambda stats: stats.acquire)
+
+            lines += ["# HELP db_query_seconds_total Time spent executing statements.",
+                      "# TYPE db_query_seconds_total counter"]
+            for (route, method), stats in routes:
+                lines.append(f"db_query_seconds_total{_labels(route=route, method=method)} {stats.db_seconds:.6f}")
+
+            lines += ["# HELP db_slowest_query_seconds Slowest single statement seen (see /health/slow-queries).",
+                      "# TYPE db_slowest_query_seconds gauge"]
+            for (route, method), stats in routes:
+                lines.append(
+                    f"db_slowest_query_seconds{_labels(route=route, method=method)} {stats.slowest_query_seconds:.6f}"
+                )
+
+            lines += ["# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS.",
+                      "# TYPE db_slow_queries_total counter",
+                      f"db_slow_queries_total {self.slow_query_count}"]
+        return lines
+
+
+registry = MetricsRegistry()
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name, help_text, routes, pick):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (route, method), stats in routes:
+        histogram = pick(stats)
+        for bound, total in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(route=route, method=method, le=bound)} {total}")
+        lines.append(f"{name}_sum{_labels(route=route, method=method)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(route=route, method=method)} {histogram.count}")
+    return lines
+
+
+def gauge_lines(name, help_text, value, kind="gauge"):
+    """A single unlabelled sample, for process-wide stats such as pool utilisation."""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def _current():
+    """Stats of the request running on this thread, or None outside requests."""
+    return getattr(_local, "request", None)
+
+
+def _statement_text(cursor, query):
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    elif isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    return _WHITESPACE.sub(" ", _SQL_COMMENT.sub("", str(query))).strip()[:STATEMENT_MAX_CHARS]
+
+
+def _record_query(cursor, query, params, seconds):
+    current = _current()
+    if current is not None:
+        current["queries"] += 1
+        current["db_seconds"] += seconds
+        if seconds > current["slowest_seconds"]:
+            current["slowest_seconds"] = seconds
+            current["slowest_statement"] = _statement_text(cursor, query)
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        statement = _statement_text(cursor, query)
+        entry = {
+            "seconds": round(seconds, 6),
+            "statement": statement,
+            "route": current["route"] if current is not None else None,
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if SLOW_QUERY_LOG_PARAMS and params is not None:
+            entry["params"] = repr(params)[:STATEMENT_MAX_CHARS]
+        registry.record_slow_query(entry)
+        print(f"Slow query ({seconds * 1000:.1f} ms): {statement[:200]}")
+
+
+class InstrumentedCursor(extensions.cursor):
+    """psycopg2 cursor that times every statement it runs."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record_query(self, query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record_query(self, query, None, time.perf_counter() - started)
+
+    def copy_expert(self, query, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(query, file, size)
+        finally:
+            _record_query(self, query, None, time.perf_counter() - started)
+
+
+def record_connection_acquire(seconds):
+    """Called by db.db_connection() with the time spent checking out a connection."""
+    current = _current()
+    if current is not None:
+        current["acquire_seconds"].append(seconds)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    _local.request = {
+        "route": request.url_rule.rule if request.url_rule else "unmatched",
+        "queries": 0,
+        "db_seconds": 0.0,
+        "acquire_seconds": [],
+        "slowest_seconds": 0.0,
+        "slowest_statement": None,
+    }
+
+
+def _finish_request(status):
+    current = _current()
+    _local.request = None
+    started = g.pop("metrics_started", None)
+    if current is None or started is None:
+        return None
+    elapsed = time.perf_counter() - started
+    registry.record_request(current["route"], request.method, status, elapsed, current)
+    return current, elapsed
+
+
+def init_app(app, extra_metrics=None):
+    """
+    Registers the request hooks and the /metrics and /health/slow-queries
+    routes. `extra_metrics` returns more exposition lines (e.g. pool and
+    cache gauges) to append to /metrics.
+    """
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def metrics_before_request():
+        _start_request()
+
+    @app.after_request
+    def metrics_after_request(response):
+        finished = _finish_request(response.status_code)
+        if finished:
+            current, elapsed = finished
+            acquire_ms = sum(current["acquire_seconds"]) * 1000
+            response.headers["Server-Timing"] = (
+                f"db;desc=\"{current['queries']} queries\";dur={current['db_seconds'] * 1000:.2f}, "
+                f"db-acquire;dur={acquire_ms:.2f}, total;dur={elapsed * 1000:.2f}"
+            )
+        return response
+
+    @app.teardown_request
+    def metrics_teardown_request(exc):
+        # after_request is skipped when a view raises an unhandled exception
+        if _current() is not None:
+            _finish_request(500)
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        lines = registry.render()
+        if extra_metrics:
+            lines += extra_metrics()
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+    @app.route("/health/slow-queries", methods=["GET"])
+    def get_slow_queries():
+        return jsonify({
+            "threshold_ms": SLOW_QUERY_MS,
+            "captures_params": SLOW_QUERY_LOG_PARAMS,
+            "recent": list(registry.slow_queries),
+            "slowest_by_route": registry.slowest_statements(),
+        }), 200
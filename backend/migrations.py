@@ -0,0 +1,501 @@
+"""
+Versioned schema migrations applied on top of create_tables().
+
+Each migration is (version, name, statements). Versions are applied in
+order, each in its own transaction, and recorded in schema_migrations so
+re-running is a no-op. Append new migrations; never edit applied ones.
+"""
+
+
+def _rollup_table(table):
+    """A weekly or monthly rollup table; both have the same columns."""
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id UUID REFERENCES users(id),
+            period_start DATE NOT NULL,
+            weather_days INTEGER NOT NULL DEFAULT 0,
+            temperature_min DECIMAL(5, 2),
+            temperature_max DECIMAL(5, 2),
+            temperature_mean DECIMAL(5, 2),
+            precipitation_sum DECIMAL(8, 2),
+            precipitation_max DECIMAL(5, 2),
+            eto_sum DECIMAL(8, 2),
+            soil_days INTEGER NOT NULL DEFAULT 0,
+            soil_moisture_min DECIMAL(10, 6),
+            soil_moisture_max DECIMAL(10, 6),
+            soil_moisture_mean DECIMAL(10, 6),
+            soil_temperature_min DECIMAL(5, 2),
+            soil_temperature_max DECIMAL(5, 2),
+            soil_temperature_mean DECIMAL(5, 2),
+            surface_wetness_mean DECIMAL(5, 2),
+            vegetation_days INTEGER NOT NULL DEFAULT 0,
+            crop_health_mean DECIMAL(5, 2),
+            vegetation_density_mean DECIMAL(5, 2),
+            health_days INTEGER NOT NULL DEFAULT 0,
+            overall_health_min DECIMAL(5, 2),
+            overall_health_max DECIMAL(5, 2),
+            overall_health_mean DECIMAL(5, 2),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, period_start)
+        )
+    """
+
+
+MIGRATIONS = [
+    (1, "hot_query_indexes", [
+        # /soil-conditions: WHERE user_id AND date ORDER BY created_at DESC LIMIT 1
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_soil_data_user_date_created
+            ON nasa_soil_data (user_id, date, created_at DESC)
+        """,
+        # /ai-recommendations: active rows for a user in CASE-priority order.
+        # The expression must match AI_RECOMMENDATIONS_QUERY in queries.py.
+        """
+        CREATE INDEX IF NOT EXISTS idx_ai_recommendations_active_priority
+            ON nasa_ai_recommendations (
+                user_id,
+                (CASE priority
+                    WHEN 'High' THEN 1
+                    WHEN 'Medium' THEN 2
+                    WHEN 'Watch' THEN 3
+                    ELSE 4
+                END),
+                created_at DESC
+            )
+            WHERE status = 'active'
+        """,
+        # Legacy dashboard metrics lookup had no index, and its
+        # ON CONFLICT (user_id) needs a unique one. Keep the newest row per user.
+        """
+        DELETE FROM user_metrics um
+        USING user_metrics newer
+        WHERE um.user_id = newer.user_id AND um.id < newer.id
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_metrics_user_id
+            ON user_metrics (user_id)
+        """,
+        # Dashboard nearest-market subquery: ORDER BY distance_km LIMIT 1
+        """
+        CREATE INDEX IF NOT EXISTS idx_market_data_distance
+            ON market_data (distance_km)
+        """,
+        # Legacy /weather-forecast: WHERE date >= CURRENT_DATE ORDER BY date LIMIT 7
+        """
+        CREATE INDEX IF NOT EXISTS idx_weather_forecast_date
+            ON weather_forecast (date)
+        """,
+        # Legacy /soil-conditions: WHERE user_id ORDER BY updated_at DESC LIMIT 1
+        """
+        CREATE INDEX IF NOT EXISTS idx_soil_conditions_user_updated
+            ON soil_conditions (user_id, updated_at DESC)
+        """,
+    ]),
+    (2, "nasa_backfill_checkpoints", [
+        # Per-user progress of `flask backfill-nasa` runs, so an interrupted
+        # backfill resumes after the last chunk it committed
+        """
+        CREATE TABLE IF NOT EXISTS nasa_backfill_checkpoints (
+            user_id UUID REFERENCES users(id),
+            range_start DATE NOT NULL,
+            range_end DATE NOT NULL,
+            completed_through DATE NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, range_start, range_end)
+        )
+        """,
+    ]),
+    (3, "nasa_change_tracking", [
+        # updated_at on the NASA input tables lets batch jobs such as the
+        # farm-health scorer pick up only rows changed since their last run.
+        # bulk_write bumps it whenever an upsert actually changes a row.
+        """
+        ALTER TABLE nasa_weather_data
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """,
+        """
+        ALTER TABLE nasa_soil_data
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """,
+        """
+        ALTER TABLE nasa_vegetation_data
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_weather_data_updated ON nasa_weather_data (updated_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_soil_data_updated ON nasa_soil_data (updated_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_vegetation_data_updated ON nasa_vegetation_data (updated_at)
+        """,
+        # High-water marks of incremental batch jobs
+        """
+        CREATE TABLE IF NOT EXISTS job_watermarks (
+            job_name VARCHAR(100) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (4, "recent_window_indexes", [
+        # The recommendation engine reads the last/next few days for every
+        # user at once; without these it scans all stored history
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_weather_data_date ON nasa_weather_data (date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_soil_data_date ON nasa_soil_data (date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_weather_forecast_date ON nasa_weather_forecast (forecast_date)
+        """,
+    ]),
+    (5, "nasa_refresh_jobs", [
+        # Set on signin; the refresh scheduler serves active farms first
+        """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMP
+        """,
+        # One recurring refresh job per POWER grid cell (see refresh_scheduler.py)
+        """
+        CREATE TABLE IF NOT EXISTS nasa_refresh_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            cell_latitude DECIMAL(9, 4) NOT NULL,
+            cell_longitude DECIMAL(9, 4) NOT NULL,
+            user_ids UUID[] NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            priority DOUBLE PRECISION NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(255),
+            locked_at TIMESTAMP,
+            last_error TEXT,
+            last_succeeded_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (cell_latitude, cell_longitude)
+        )
+        """,
+        # Workers claim the highest-priority due job
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_refresh_jobs_due
+            ON nasa_refresh_jobs (priority DESC, run_after)
+            WHERE status = 'pending'
+        """,
+        # Lease expiry scan and per-status counts
+        """
+        CREATE INDEX IF NOT EXISTS idx_nasa_refresh_jobs_status_locked
+            ON nasa_refresh_jobs (status, locked_at)
+        """,
+    ]),
+    (6, "partitioned_nasa_tables", [
+        # Daily NASA and farm-health rows become range-partitioned by month
+        # (see partitions.py), so old months can be rolled up and dropped
+        # whole. Rows drop the SERIAL id and created_at, which nothing reads;
+        # updated_at stays for the incremental jobs. Partitions are named
+        # <table>_pYYYYMM and cover [first of month, first of next month).
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_date DATE, to_date DATE)
+        RETURNS INTEGER AS $$
+        DECLARE
+            month DATE := date_trunc('month', from_date)::date;
+            created INTEGER := 0;
+            part_name TEXT;
+        BEGIN
+            -- Concurrent callers wait here instead of racing to create the same partition
+            PERFORM pg_advisory_xact_lock(hashtext('create_monthly_partitions:' || parent));
+            WHILE month <= to_date LOOP
+                part_name := parent || '_p' || to_char(month, 'YYYYMM');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        part_name, parent, month, (month + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                END IF;
+                month := (month + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        ALTER TABLE nasa_weather_data RENAME TO nasa_weather_data_unpartitioned
+        """,
+        """
+        CREATE TABLE nasa_weather_data (
+            user_id UUID REFERENCES users(id),
+            date DATE NOT NULL,
+            temperature_2m_avg DECIMAL(5, 2),
+            precipitation DECIMAL(5, 2),
+            eto DECIMAL(5, 2),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (date)
+        """,
+        """
+        ALTER TABLE nasa_soil_data RENAME TO nasa_soil_data_unpartitioned
+        """,
+        """
+        CREATE TABLE nasa_soil_data (
+            user_id UUID REFERENCES users(id),
+            zone_id INTEGER REFERENCES farm_zones(id),
+            date DATE NOT NULL,
+            soil_moisture_0_5cm DECIMAL(10, 6),
+            soil_temperature_0_5cm DECIMAL(5, 2),
+            surface_wetness DECIMAL(5, 2),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (date)
+        """,
+        """
+        ALTER TABLE nasa_vegetation_data RENAME TO nasa_vegetation_data_unpartitioned
+        """,
+        """
+        CREATE TABLE nasa_vegetation_data (
+            user_id UUID REFERENCES users(id),
+            date DATE NOT NULL,
+            crop_health_score DECIMAL(5, 2),
+            vegetation_density DECIMAL(5, 2),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (date)
+        """,
+        # farm_health_metrics gains updated_at so the rollups can follow it
+        """
+        ALTER TABLE farm_health_metrics RENAME TO farm_health_metrics_unpartitioned
+        """,
+        """
+        CREATE TABLE farm_health_metrics (
+            user_id UUID REFERENCES users(id),
+            date DATE NOT NULL,
+            overall_health_score DECIMAL(5, 2),
+            soil_health_score DECIMAL(5, 2),
+            crop_health_score DECIMAL(5, 2),
+            water_efficiency_score DECIMAL(5, 2),
+            nasa_data_sources JSONB,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (date)
+        """,
+        # Every table gets the same months: all stored history plus three ahead
+        """
+        SELECT create_monthly_partitions(parent, months.from_date, months.to_date)
+        FROM unnest(ARRAY['nasa_weather_data', 'nasa_soil_data', 'nasa_vegetation_data',
+                          'farm_health_metrics']) AS parent
+        CROSS JOIN (
+            SELECT LEAST((SELECT MIN(date) FROM nasa_weather_data_unpartitioned),
+                         (SELECT MIN(date) FROM nasa_soil_data_unpartitioned),
+                         (SELECT MIN(date) FROM nasa_vegetation_data_unpartitioned),
+                         (SELECT MIN(date) FROM farm_health_metrics_unpartitioned),
+                         CURRENT_DATE) AS from_date,
+                   GREATEST((SELECT MAX(date) FROM nasa_weather_data_unpartitioned),
+                            (SELECT MAX(date) FROM nasa_soil_data_unpartitioned),
+                            (SELECT MAX(date) FROM nasa_vegetation_data_unpartitioned),
+                            (SELECT MAX(date) FROM farm_health_metrics_unpartitioned),
+                            (CURRENT_DATE + INTERVAL '3 months')::date) AS to_date
+        ) months
+        """,
+        """
+        INSERT INTO nasa_weather_data (user_id, date, temperature_2m_avg, precipitation, eto, updated_at)
+        SELECT user_id, date, temperature_2m_avg, precipitation, eto, updated_at
+        FROM nasa_weather_data_unpartitioned
+        """,
+        """
+        DROP TABLE nasa_weather_data_unpartitioned
+        """,
+        """
+        ALTER TABLE nasa_weather_data ADD CONSTRAINT nasa_weather_data_user_id_date_key UNIQUE (user_id, date)
+        """,
+        """
+        CREATE INDEX idx_nasa_weather_data_updated ON nasa_weather_data (updated_at)
+        """,
+        """
+        CREATE INDEX idx_nasa_weather_data_date ON nasa_weather_data (date)
+        """,
+        """
+        INSERT INTO nasa_soil_data (user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm,
+                                    surface_wetness, updated_at)
+        SELECT user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm, surface_wetness, updated_at
+        FROM nasa_soil_data_unpartitioned
+        """,
+        """
+        DROP TABLE nasa_soil_data_unpartitioned
+        """,
+        """
+        ALTER TABLE nasa_soil_data ADD CONSTRAINT nasa_soil_data_user_id_zone_id_date_key UNIQUE (user_id, zone_id, date)
+        """,
+        # /soil-conditions: WHERE user_id AND date ORDER BY updated_at DESC LIMIT 1
+        """
+        CREATE INDEX idx_nasa_soil_data_user_date_updated ON nasa_soil_data (user_id, date, updated_at DESC)
+        """,
+        """
+        CREATE INDEX idx_nasa_soil_data_updated ON nasa_soil_data (updated_at)
+        """,
+        """
+        CREATE INDEX idx_nasa_soil_data_date ON nasa_soil_data (date)
+        """,
+        """
+        INSERT INTO nasa_vegetation_data (user_id, date, crop_health_score, vegetation_density, updated_at)
+        SELECT user_id, date, crop_health_score, vegetation_density, updated_at
+        FROM nasa_vegetation_data_unpartitioned
+        """,
+        """
+        DROP TABLE nasa_vegetation_data_unpartitioned
+        """,
+        """
+        ALTER TABLE nasa_vegetation_data ADD CONSTRAINT nasa_vegetation_data_user_id_date_key UNIQUE (user_id, date)
+        """,
+        """
+        CREATE INDEX idx_nasa_vegetation_data_updated ON nasa_vegetation_data (updated_at)
+        """,
+        """
+        INSERT INTO farm_health_metrics (user_id, date, overall_health_score, soil_health_score, crop_health_score,
+                                         water_efficiency_score, nasa_data_sources, updated_at)
+        SELECT user_id, date, overall_health_score, soil_health_score, crop_health_score,
+               water_efficiency_score, nasa_data_sources, created_at
+        FROM farm_health_metrics_unpartitioned
+        """,
+        """
+        DROP TABLE farm_health_metrics_unpartitioned
+        """,
+        """
+        ALTER TABLE farm_health_metrics ADD CONSTRAINT farm_health_metrics_user_id_date_key UNIQUE (user_id, date)
+        """,
+        """
+        CREATE INDEX idx_farm_health_metrics_updated ON farm_health_metrics (updated_at)
+        """,
+        # Weekly (ISO weeks from Monday) and monthly aggregates per user,
+        # maintained incrementally by rollups.py; they outlive the raw partitions
+        _rollup_table("nasa_weekly_rollups"),
+        _rollup_table("nasa_monthly_rollups"),
+    ]),
+    (7, "attach_monthly_partitions", [
+        # CREATE TABLE ... PARTITION OF takes ACCESS EXCLUSIVE on the parent,
+        # so it waited on any open transaction that had merely read the
+        # table. Creating the table on its own and attaching it only takes
+        # SHARE UPDATE EXCLUSIVE on the parent, which readers and writers do
+        # not conflict with.
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_date DATE, to_date DATE)
+        RETURNS INTEGER AS $$
+        DECLARE
+            month DATE := date_trunc('month', from_date)::date;
+            created INTEGER := 0;
+            part_name TEXT;
+        BEGIN
+            -- Concurrent callers wait here instead of racing to create the same partition
+            PERFORM pg_advisory_xact_lock(hashtext('create_monthly_partitions:' || parent));
+            WHILE month <= to_date LOOP
+                part_name := parent || '_p' || to_char(month, 'YYYYMM');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                        part_name, parent
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                        parent, part_name, month, (month + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                END IF;
+                month := (month + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    (8, "backfill_checkpoints_by_start", [
+        # Checkpoints were keyed on the exact range, and --end defaults to
+        # today, so an interrupted backfill re-run on a later day started
+        # over. Key them on the start date instead; range_end is only
+        # recorded for runs given an explicit end (NULL: through the day of
+        # the run). Of several ranges sharing a start, the furthest wins.
+        """
+        DELETE FROM nasa_backfill_checkpoints c
+        USING nasa_backfill_checkpoints newer
+        WHERE newer.user_id = c.user_id AND newer.range_start = c.range_start
+          AND (newer.completed_through, newer.range_end) > (c.completed_through, c.range_end)
+        """,
+        """
+        ALTER TABLE nasa_backfill_checkpoints DROP CONSTRAINT nasa_backfill_checkpoints_pkey
+        """,
+        """
+        ALTER TABLE nasa_backfill_checkpoints ALTER COLUMN range_end DROP NOT NULL
+        """,
+        """
+        ALTER TABLE nasa_backfill_checkpoints ADD PRIMARY KEY (user_id, range_start)
+        """,
+    ]),
+    (9, "weather_min_max_temperature", [
+        # Daily T2M_MIN / T2M_MAX from POWER, for the frost and heat-stress
+        # recommendations. Nullable without a default, so adding them to
+        # the partitioned table only touches the catalog.
+        """
+        ALTER TABLE nasa_weather_data
+            ADD COLUMN IF NOT EXISTS temperature_2m_min DECIMAL(5, 2),
+            ADD COLUMN IF NOT EXISTS temperature_2m_max DECIMAL(5, 2)
+        """,
+    ]),
+    (10, "user_data_changes", [
+        # One row per user, stamped by every job that writes data the API
+        # caches. API processes poll it by changed_at to drop cached
+        # responses that jobs in other processes made stale (see
+        # response_cache.py). TIMESTAMPTZ so stamps and polls compare
+        # correctly whatever the sessions' time zones.
+        """
+        CREATE TABLE IF NOT EXISTS user_data_changes (
+            user_id UUID PRIMARY KEY REFERENCES users(id),
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_data_changes_changed_at ON user_data_changes (changed_at)
+        """,
+    ]),
+    (11, "rollup_daily_temperature_extremes", [
+        # The rollups' temperature_min / temperature_max now aggregate the
+        # daily minima and maxima instead of the daily means. Dropping the
+        # watermark makes the next `flask rollup-nasa` recompute every
+        # period still stored raw.
+        """
+        DELETE FROM job_watermarks WHERE job_name = 'nasa_rollups'
+        """,
+    ]),
+]
+
+
+def apply_migrations(conn, verbose=True):
+    """Applies every pending migration. Returns the list of versions applied."""
+    applied = []
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+
+        cur.execute("SELECT version FROM schema_migrations")
+        done = {row[0] for row in cur.fetchall()}
+
+        for version, name, statements in MIGRATIONS:
+            if version in done:
+                continue
+            try:
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error applying migration {version} ({name}): {str(e)}")
+                raise
+            applied.append(version)
+            if verbose:
+                print(f"Applied migration {version}: {name}")
+    return applied
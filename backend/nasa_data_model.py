@@ -1,7 +1,10 @@
-import requests
 import os
 from dotenv import load_dotenv
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from power_client import PowerAPIError, get_client
+from power_cache import get_cache, snap_to_cell, cell_key, date_range, split_by_day, merge_days
+from power_decode import decode_power_parameters
+from power_regional import plan_regions, split_features
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,35 +13,34 @@ NASA_API_KEY = os.environ.get("NASA_API_KEY")
 if not NASA_API_KEY or NASA_API_KEY == "YOUR_NASA_API_KEY":
     raise ValueError("NASA_API_KEY not found or not set in .env file. Please get a key from https://power.larc.nasa.gov/docs/services/api/request-api-key/")
 
-def get_agro_climate_data(latitude, longitude, start_date, end_date):
+POWER_PARAMETERS = [
+    # Parameter                       # Description
+    # ---------------------------------------------------------------------------------
+    "T2M",                          # Temperature at 2 Meters (C)
+    "T2M_MAX",                      # Max Temperature at 2 Meters (C)
+    "T2M_MIN",                      # Min Temperature at 2 Meters (C)
+    "PRECTOTCORR",                  # Precipitation Corrected (mm/day)
+    "WS10M",                        # Wind Speed at 10 Meters (m/s)
+    "RH2M",                         # Relative Humidity at 2 Meters (%)
+    "ALLSKY_SFC_SW_DWN",            # All Sky Insolation Incident on a Horizontal Surface (kW-hr/m^2/day)
+
+    # Soil & Evapotranspiration Parameters
+    "TS",                           # Earth Skin Temperature (C) - good proxy for soil_temperature_0_5cm
+    "GWETTOP",                      # Surface Soil Wetness (0-1, where 1 is saturated) - for surface_wetness
+    "SM_0_10cm",                    # Volumetric Soil Moisture at 0-10cm depth (m^3/m^3) - for soil_moisture_0_5cm
+    "EVAP",                         # Evapotranspiration (mm/day) - for eto
+
+    # Other Agro-related Parameters
+    "QV2M",                         # Specific Humidity at 2 Meters (g/kg)
+    "PS"                            # Surface Pressure (kPa)
+]
+
+def fetch_power_point(latitude, longitude, start_date, end_date, parameters=POWER_PARAMETERS):
     """
-    Fetches agro-climatological data (climate, soil, vegetation health, weather patterns)
-    from NASA POWER API for a specific location and time period.
+    Calls the POWER daily point endpoint directly, bypassing the cache.
+    Returns the properties.parameter mapping, or None once retries are
+    exhausted or the request is rejected.
     """
-    base_url = "https://power.larc.nasa.gov/api/temporal/daily/point"
-    
-    parameters = [
-        # Parameter                       # Description
-        # ---------------------------------------------------------------------------------
-        "T2M",                          # Temperature at 2 Meters (C)
-        "T2M_MAX",                      # Max Temperature at 2 Meters (C)
-        "T2M_MIN",                      # Min Temperature at 2 Meters (C)
-        "PRECTOTCORR",                  # Precipitation Corrected (mm/day)
-        "WS10M",                        # Wind Speed at 10 Meters (m/s)
-        "RH2M",                         # Relative Humidity at 2 Meters (%)
-        "ALLSKY_SFC_SW_DWN",            # All Sky Insolation Incident on a Horizontal Surface (kW-hr/m^2/day)
-
-        # Soil & Evapotranspiration Parameters
-        "TS",                           # Earth Skin Temperature (C) - good proxy for soil_temperature_0_5cm
-        "GWETTOP",                      # Surface Soil Wetness (0-1, where 1 is saturated) - for surface_wetness
-        "SM_0_10cm",                    # Volumetric Soil Moisture at 0-10cm depth (m^3/m^3) - for soil_moisture_0_5cm
-        "EVAP",                         # Evapotranspiration (mm/day) - for eto
-
-        # Other Agro-related Parameters
-        "QV2M",                         # Specific Humidity at 2 Meters (g/kg)
-        "PS"                            # Surface Pressure (kPa)
-    ]
-
     payload = {
         "parameters": ",".join(parameters),
         "community": "AG",
@@ -51,18 +53,102 @@ def get_agro_climate_data(latitude, longitude, start_date, end_date):
     }
 
     try:
-        response = requests.get(base_url, params=payload)
-        response.raise_for_status()
-        data = response.json()
-
-        # Extract key parts neatly
-        results = data.get("properties", {}).get("parameter", {})
-        return results
+        # Pooled, rate-limited and retried; see power_client
+        return get_client().daily_point(payload)
 
-    except requests.exceptions.RequestException as e:
+    except (PowerAPIError, ValueError) as e:
         print(f"Error fetching NASA data: {e}")
         return None
 
+def get_agro_climate_data(latitude, longitude, start_date, end_date, parameters=POWER_PARAMETERS):
+    """
+    Fetches agro-climatological data (climate, soil, vegetation health, weather patterns)
+    from NASA POWER API for a specific location and time period.
+
+    Requests are made for the centre of the POWER grid cell containing the
+    point and answered from the on-disk cache where possible, so farms that
+    share a cell and overlapping date ranges only download missing days.
+    """
+    cache = get_cache()
+    if cache is None:
+        return fetch_power_point(latitude, longitude, start_date, end_date, parameters)
+
+    cell_lat, cell_lon = snap_to_cell(latitude, longitude)
+    key = cell_key(cell_lat, cell_lon)
+    dates = list(date_range(start_date, end_date))
+
+    days = cache.get_days(key, parameters, dates)
+    missing = [d for d in dates if d not in days]
+    if missing:
+        # One request spanning every gap keeps API calls to at most one per lookup
+        fetched = fetch_power_point(cell_lat, cell_lon, missing[0], missing[-1], parameters)
+        if fetched is None:
+            return None
+        fetched_days = split_by_day(fetched)
+        cache.put_days(key, parameters, fetched_days)
+        days.update((d, values) for d, values in fetched_days.items() if start_date <= d <= end_date)
+
+    return merge_days(days)
+
+def fetch_power_regional(bbox, cells, start_date, end_date, parameters=POWER_PARAMETERS):
+    """
+    Fetches a bounding box (lat_min, lat_max, lon_min, lon_max) from the
+    POWER daily regional endpoint, one request per parameter as the API
+    requires, and splits the gridded result back out per cell. Returns
+    {cell: parameter mapping} for the cells found, or None on failure.
+    """
+    lat_min, lat_max, lon_min, lon_max = bbox
+    by_cell = {}
+    for param in parameters:
+        payload = {
+            "parameters": param,
+            "community": "AG",
+            "latitude-min": lat_min,
+            "latitude-max": lat_max,
+            "longitude-min": lon_min,
+            "longitude-max": lon_max,
+            "start": start_date,
+            "end": end_date,
+            "format": "JSON",
+            "api_key": NASA_API_KEY
+        }
+        try:
+            features = get_client().daily_regional(payload)
+        except (PowerAPIError, ValueError) as e:
+            print(f"Error fetching regional NASA data for {bbox}: {e}")
+            return None
+        for cell, parameter_data in split_features(features, cells).items():
+            by_cell.setdefault(cell, {}).update(parameter_data)
+    return by_cell
+
+def get_regional_climate_data(cell_starts, end_date, parameters=POWER_PARAMETERS):
+    """
+    Fetches many grid cells through the regional endpoint. cell_starts maps
+    (cell_lat, cell_lon) -> first YYYYMMDD needed; each box is fetched from
+    the earliest start of its cells. Only boxes dense enough to beat one
+    point call per cell are fetched, so the result covers a subset of the
+    cells; callers fetch the rest point by point. Results are written to
+    the on-disk cache like point fetches.
+    """
+    regions, _ = plan_regions(cell_starts, len(parameters))
+    if not regions:
+        return {}
+
+    def fetch(region):
+        bbox, cells = region
+        start_date = min(cell_starts[cell] for cell in cells)
+        return fetch_power_regional(bbox, cells, start_date, end_date, parameters) or {}
+
+    cache = get_cache()
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(len(regions), get_client().max_concurrency)) as executor:
+        for by_cell in executor.map(fetch, regions):
+            for cell, parameter_data in by_cell.items():
+                if cache is not None:
+                    cache.put_days(cell_key(*cell), parameters, split_by_day(parameter_data))
+                results[cell] = parameter_data
+    return results
+
 
 if __name__ == '__main__':
     lat = -1.2921   # Nairobi, Kenya
@@ -76,11 +162,11 @@ if __name__ == '__main__':
     if agro_data:
         print("✅ Data fetched successfully!\n")
 
-        # Let's process and display the data in a more readable table format
-        # Get the list of dates from the first parameter
-        dates = sorted(agro_data.get("T2M", {}).keys())
-        
-        if not dates:
+        # Decoded like the refresh does: one date index, -999 fills as NaN
+        table_parameters = ["T2M", "T2M_MAX", "PRECTOTCORR", "RH2M"]
+        dates, columns = decode_power_parameters(agro_data, table_parameters)
+
+        if not len(dates):
             print("No data returned for the given parameters.")
         else:
             # Print table header
@@ -89,13 +175,7 @@ if __name__ == '__main__':
             print("-" * len(header))
 
             # Print data for each date
-            for date_str in dates:
-                dt = datetime.strptime(date_str, "%Y%m%d")
-                formatted_date = dt.strftime("%Y-%m-%d")
-                avg_temp = agro_data.get("T2M", {}).get(date_str, 'N/A')
-                max_temp = agro_data.get("T2M_MAX", {}).get(date_str, 'N/A')
-                precip = agro_data.get("PRECTOTCORR", {}).get(date_str, 'N/A')
-                humidity = agro_data.get("RH2M", {}).get(date_str, 'N/A')
-                print(f"{formatted_date:<12} | {avg_temp:<15.2f} | {max_temp:<15.2f} | {precip:<15.2f} | {humidity:<15.2f}")
+            for day, avg_temp, max_temp, precip, humidity in zip(dates, *(columns[p] for p in table_parameters)):
+                print(f"{str(day):<12} | {avg_temp:<15.2f} | {max_temp:<15.2f} | {precip:<15.2f} | {humidity:<15.2f}")
     else:
         print("❌ Failed to fetch data.")
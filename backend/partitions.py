@@ -0,0 +1,120 @@
+"""
+Monthly range partitions of the daily NASA and farm-health tables.
+
+Migration 6 partitions PARTITIONED_TABLES by month on `date`: one
+partition per table and month, named <table>_pYYYYMM, with the same months
+in all four tables. Writers call ensure_partitions() for the dates they are
+about to write. Missing months are created by the create_monthly_partitions()
+SQL function in a short transaction of its own, which creates each
+partition as a plain table and then attaches it (migration 7). Attaching
+only takes SHARE UPDATE EXCLUSIVE on the parent, so it does not wait for
+transactions reading or writing the parent. Months known to exist are
+cached per process, so the common case is free.
+
+Attaching still locks the tables the partition's foreign keys reference
+(users, farm_zones) against writes, and the parent against DDL. So call
+ensure_partitions() before the write transaction's first statement, not
+from inside a transaction that has already touched these tables. A
+transaction that already wrote to them would wait on ours and we on it.
+lock_timeout turns such a mistake into an error rather than a hang.
+
+Dropping old months is the rollups' retention policy; see rollups.py.
+"""
+import os
+import threading
+from datetime import date
+
+from psycopg2 import sql
+
+from db import get_db_connection
+
+PARTITIONED_TABLES = ("nasa_weather_data", "nasa_soil_data", "nasa_vegetation_data", "farm_health_metrics")
+# Months created ahead of today by `flask nasa-partitions`
+PREMAKE_MONTHS = int(os.getenv("NASA_PARTITION_PREMAKE_MONTHS", "3"))
+LOCK_TIMEOUT_MS = int(os.getenv("NASA_PARTITION_LOCK_TIMEOUT_MS", "10000"))
+
+_known_months = set()
+_known_lock = threading.Lock()
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(from_date, to_date):
+    """First days of every month from from_date's through to_date's, inclusive."""
+    months, month, last = [], month_start(from_date), month_start(to_date)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def list_partition_months(cur, table=PARTITIONED_TABLES[0]):
+    """Sorted months that have a partition of `table`."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    prefix = f"{table}_p"
+    return sorted(
+        date(int(name[-6:-2]), int(name[-2:]), 1)
+        for (name,) in cur.fetchall()
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+
+
+def ensure_partitions(from_date, to_date):
+    """
+    Makes sure every partitioned table has partitions for all months from
+    from_date through to_date. Returns the number of partitions created.
+    """
+    months = months_between(from_date, to_date)
+    with _known_lock:
+        missing = [month for month in months if month not in _known_months]
+    if not missing:
+        return 0
+
+    # Unpooled: this may run while the caller holds a pooled connection
+    # mid-transaction, and must commit independently of it
+    conn = get_db_connection()
+    try:
+        created = 0
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+            for table in PARTITIONED_TABLES:
+                cur.execute("SELECT create_monthly_partitions(%s, %s, %s)", (table, missing[0], missing[-1]))
+                created += cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _known_lock:
+        _known_months.update(months_between(missing[0], missing[-1]))
+    return created
+
+
+def ensure_partitions_for_rows(rows, date_index):
+    """ensure_partitions() for the date range of rows about to be written."""
+    if rows:
+        dates = [row[date_index] for row in rows]
+        ensure_partitions(min(dates), max(dates))
+
+
+def drop_month(cur, month):
+    """Drops the given month's partition of every partitioned table; the caller commits."""
+    for table in PARTITIONED_TABLES:
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(partition_name(table, month))))
+    with _known_lock:
+        _known_months.discard(month)
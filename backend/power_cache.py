@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# POWER's MERRA-2 based parameters live on a 0.5° x 0.625° grid, so every
+# farm inside the same cell gets identical data back from the API.
+GRID_LAT_DEGREES = float(os.getenv("POWER_GRID_LAT_DEGREES", "0.5"))
+GRID_LON_DEGREES = float(os.getenv("POWER_GRID_LON_DEGREES", "0.625"))
+
+CACHE_ENABLED = os.getenv("POWER_CACHE_ENABLED", "1") != "0"
+CACHE_PATH = os.getenv(
+    "POWER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "power_cache.sqlite3"),
+)
+# Upper bound on cached (cell, parameter set, day) rows before LRU eviction
+CACHE_MAX_DAYS = int(os.getenv("POWER_CACHE_MAX_DAYS", "2000000"))
+# POWER keeps revising the most recent days, so those are only trusted for a while
+CACHE_REVISION_WINDOW_DAYS = int(os.getenv("POWER_CACHE_REVISION_WINDOW_DAYS", "7"))
+CACHE_RECENT_TTL_SECONDS = int(os.getenv("POWER_CACHE_RECENT_TTL_SECONDS", str(12 * 3600)))
+# How often the row count is re-read to catch rows stored by other processes
+CACHE_RECOUNT_SECONDS = int(os.getenv("POWER_CACHE_RECOUNT_SECONDS", "300"))
+
+DATE_FORMAT = "%Y%m%d"
+
+
+def snap_to_cell(latitude, longitude):
+    """Returns the centre (lat, lon) of the POWER grid cell containing a point."""
+    cell_lat = round(float(latitude) / GRID_LAT_DEGREES) * GRID_LAT_DEGREES
+    cell_lon = round(float(longitude) / GRID_LON_DEGREES) * GRID_LON_DEGREES
+    # Normalise -0.0 and float noise so equal cells produce equal keys
+    return round(cell_lat, 4) + 0.0, round(cell_lon, 4) + 0.0
+
+
+def cell_key(cell_lat, cell_lon):
+    return f"{cell_lat:.4f},{cell_lon:.4f}"
+
+
+def date_range(start_date, end_date):
+    """Yields YYYYMMDD strings from start_date to end_date inclusive."""
+    day = datetime.strptime(start_date, DATE_FORMAT)
+    end = datetime.strptime(end_date, DATE_FORMAT)
+    while day <= end:
+        yield day.strftime(DATE_FORMAT)
+        day += timedelta(days=1)
+
+
+class PowerCache:
+    """
+    Persistent per-day cache of POWER values keyed by (grid cell, parameter set, date).
+
+    Storing individual days means overlapping date ranges reuse whatever was
+    fetched before and only the gaps go back to the API. Rows are evicted
+    least-recently-used first once the cache holds more than max_days rows.
+
+    SQLite keeps no row count and COUNT(*) scans the table, so the cache
+    counts rows itself: at open, then on every store. Rows stored by other
+    processes sharing the file are picked up by a recount every
+    CACHE_RECOUNT_SECONDS and whenever this count goes over budget.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_days=CACHE_MAX_DAYS):
+        self.path = path
+        self.max_days = max_days
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS power_days (
+                cell TEXT NOT NULL,
+                param_set TEXT NOT NULL,
+                date TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (cell, param_set, date)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_power_days_last_access ON power_days (last_access)")
+        self._conn.commit()
+        self._recount()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def param_set_key(parameters):
+        return ",".join(sorted(parameters))
+
+    def _is_fresh(self, date_str, fetched_at, now):
+        revision_cutoff = (datetime.now() - timedelta(days=CACHE_REVISION_WINDOW_DAYS)).strftime(DATE_FORMAT)
+        return date_str < revision_cutoff or now - fetched_at < CACHE_RECENT_TTL_SECONDS
+
+    def get_days(self, cell, parameters, dates):
+        """Returns {date: {param: value}} for every requested date that is cached and fresh."""
+        dates = list(dates)
+        if not dates:
+            return {}
+
+        param_set = self.param_set_key(parameters)
+        now = time.time()
+        found = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, payload, fetched_at FROM power_days"
+                " WHERE cell = ? AND param_set = ? AND date BETWEEN ? AND ?",
+                (cell, param_set, min(dates), max(dates)),
+            ).fetchall()
+            wanted = set(dates)
+            for date_str, payload, fetched_at in rows:
+                if date_str in wanted and self._is_fresh(date_str, fetched_at, now):
+                    found[date_str] = json.loads(payload)
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE power_days SET last_access = ? WHERE cell = ? AND param_set = ? AND date = ?",
+                    [(now, cell, param_set, d) for d in found],
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+        return found
+
+    def put_days(self, cell, parameters, days):
+        """Stores {date: {param: value}} for a cell and evicts old rows if over budget."""
+        if not days:
+            return
+
+        param_set = self.param_set_key(parameters)
+        now = time.time()
+        with self._lock:
+            # Only dates not stored yet add rows; the rest are replaced
+            stored = self._conn.execute(
+                "SELECT date FROM power_days WHERE cell = ? AND param_set = ? AND date BETWEEN ? AND ?",
+                (cell, param_set, min(days), max(days)),
+            ).fetchall()
+            self._rows += len(days.keys() - {date_str for (date_str,) in stored})
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO power_days (cell, param_set, date, payload, fetched_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(cell, param_set, d, json.dumps(values), now, now) for d, values in days.items()],
+            )
+            self.stores += len(days)
+            self._evict()
+            self._conn.commit()
+
+    def _recount(self):
+        (self._rows,) = self._conn.execute("SELECT COUNT(*) FROM power_days").fetchone()
+        self._recounted_at = time.monotonic()
+
+    def _evict(self):
+        if self._rows <= self.max_days and time.monotonic() - self._recounted_at < CACHE_RECOUNT_SECONDS:
+            return
+        self._recount()
+        excess = self._rows - self.max_days
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM power_days WHERE rowid IN"
+                " (SELECT rowid FROM power_days ORDER BY last_access ASC LIMIT ?)",
+                (excess,),
+            )
+            self._rows -= excess
+            self.evictions += excess
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM power_days")
+            self._conn.commit()
+            self._rows = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "cached_days": self._rows,
+                "max_days": self.max_days,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide cache, or None when POWER_CACHE_ENABLED=0."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PowerCache()
+    return _cache
+
+
+def split_by_day(parameter_data):
+    """Pivots POWER's {param: {date: value}} layout into {date: {param: value}}."""
+    days = {}
+    for param, series in parameter_data.items():
+        for date_str, value in series.items():
+            days.setdefault(date_str, {})[param] = value
+    return days
+
+
+def merge_days(days):
+    """Inverse of split_by_day."""
+    parameter_data = {}
+    for date_str in sorted(days):
+        for param, value in days[date_str].items():
+            parameter_data.setdefault(param, {})[date_str] = value
+    return parameter_data
@@ -0,0 +1,233 @@
+"""
+HTTP client for the NASA POWER API.
+
+One pooled requests.Session is shared by every caller, so connections are
+kept alive and reused across fetches. Each request has connect/read
+timeouts, waits on a token bucket (POWER_RATE_PER_SECOND, POWER_RATE_BURST)
+and on a semaphore capping in-flight requests (POWER_MAX_CONCURRENCY).
+429s, 5xx responses, timeouts, connection errors and bodies cut off
+mid-transfer are retried with exponential backoff and full jitter,
+honouring Retry-After. Every other failure, including any other requests
+error or a body that isn't JSON, and running out of retries, raises
+PowerAPIError, so callers only need to handle that.
+
+POWER_BASE_URL points the client elsewhere, e.g. at a local stub server.
+"""
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+POWER_BASE_URL = os.getenv("POWER_BASE_URL", "https://power.larc.nasa.gov")
+DAILY_POINT_PATH = "/api/temporal/daily/point"
+DAILY_REGIONAL_PATH = "/api/temporal/daily/regional"
+
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("POWER_CONNECT_TIMEOUT_SECONDS", "5"))
+READ_TIMEOUT_SECONDS = float(os.getenv("POWER_READ_TIMEOUT_SECONDS", "60"))
+MAX_RETRIES = int(os.getenv("POWER_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("POWER_BACKOFF_BASE_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("POWER_BACKOFF_MAX_SECONDS", "60"))
+# POWER throttles heavy clients with 429s; stay well under its limits by default
+RATE_PER_SECOND = float(os.getenv("POWER_RATE_PER_SECOND", "1"))
+RATE_BURST = int(os.getenv("POWER_RATE_BURST", "5"))
+MAX_CONCURRENCY = int(os.getenv("POWER_MAX_CONCURRENCY", "5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+)
+LATENCY_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class PowerAPIError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available. Returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class PowerClient:
+    def __init__(self, base_url=POWER_BASE_URL, connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=READ_TIMEOUT_SECONDS, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE_SECONDS, backoff_max=BACKOFF_MAX_SECONDS,
+                 rate_per_second=RATE_PER_SECOND, burst=RATE_BURST, max_concurrency=MAX_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._requests = 0
+        self._failures = 0
+        self._statuses = {}
+        self._retries = {}
+        self._rate_wait_seconds = 0.0
+        self._latency_counts = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)
+        self._latency_sum = 0.0
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, status, latency):
+        with self._stats_lock:
+            self._requests += 1
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            self._latency_counts[bisect_left(LATENCY_BUCKETS_SECONDS, latency)] += 1
+            self._latency_sum += latency
+
+    def _record_retry(self, reason):
+        with self._stats_lock:
+            self._retries[reason] = self._retries.get(reason, 0) + 1
+
+    def _send(self, path, params):
+        waited = self._bucket.acquire()
+        with self._slots:
+            with self._stats_lock:
+                self._rate_wait_seconds += waited
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+                self._record(str(response.status_code), time.perf_counter() - started)
+                return response
+            except requests.exceptions.RequestException as e:
+                self._record(type(e).__name__, time.perf_counter() - started)
+                raise
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+
+    def get_json(self, path, params):
+        """GETs path with retries and returns the decoded JSON body."""
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self._send(path, params)
+            except TRANSIENT_ERRORS as e:
+                reason, error = type(e).__name__, e
+            except requests.exceptions.RequestException as e:
+                with self._stats_lock:
+                    self._failures += 1
+                raise PowerAPIError(f"POWER request failed: {type(e).__name__}: {e}") from e
+            else:
+                if response.status_code < 400:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        with self._stats_lock:
+                            self._failures += 1
+                        raise PowerAPIError(f"POWER returned invalid JSON: {e}", response.status_code) from e
+                reason = str(response.status_code)
+                error = f"POWER returned HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    with self._stats_lock:
+                        self._failures += 1
+                    raise PowerAPIError(error, response.status_code)
+                header = response.headers.get("Retry-After")
+                if header and header.isdigit():
+                    retry_after = float(header)
+
+            if attempt >= self.max_retries:
+                with self._stats_lock:
+                    self._failures += 1
+                raise PowerAPIError(f"Giving up after {attempt + 1} attempts: {error}")
+            self._record_retry(reason)
+            time.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def daily_point(self, params):
+        """Calls the daily point endpoint; returns the properties.parameter mapping."""
+        data = self.get_json(DAILY_POINT_PATH, params)
+        return data.get("properties", {}).get("parameter", {})
+
+    def daily_regional(self, params):
+        """Calls the daily regional endpoint; returns the list of GeoJSON point features."""
+        data = self.get_json(DAILY_REGIONAL_PATH, params)
+        return data.get("features", [])
+
+    def stats(self):
+        with self._stats_lock:
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip(LATENCY_BUCKETS_SECONDS + ("+Inf",), self._latency_counts):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            return {
+                "base_url": self.base_url,
+                "requests": self._requests,
+                "failures": self._failures,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "responses": dict(self._statuses),
+                "retries": dict(self._retries),
+                "retries_total": sum(self._retries.values()),
+                "rate_limit_wait_seconds_total": round(self._rate_wait_seconds, 3),
+                "latency_seconds": {
+                    "buckets": histogram,
+                    "sum": round(self._latency_sum, 3),
+                    "count": self._requests,
+                },
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PowerClient()
+    return _client
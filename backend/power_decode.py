@@ -0,0 +1,96 @@
+"""
+Vectorized decoding of NASA POWER `properties.parameter` payloads.
+
+POWER returns {param: {"YYYYMMDD": value}}. decode_power_parameters turns
+that into one sorted datetime64[D] date index plus one float64 array per
+parameter, with the -999 fill values masked to NaN, without any per-day
+Python work beyond reading the JSON dicts. The *_rows helpers then produce
+DB-ready tuples (NaN -> None) for bulk_write.
+"""
+import numpy as np
+
+FILL_VALUE = -999.0
+
+
+def _parse_dates(keys):
+    """Vectorized YYYYMMDD -> datetime64[D]."""
+    ymd = np.array(keys, dtype=np.int64)
+    years = (ymd // 10000 - 1970).astype("datetime64[Y]")
+    months = (ymd // 100 % 100 - 1).astype("timedelta64[M]")
+    days = (ymd % 100 - 1).astype("timedelta64[D]")
+    return (years + months).astype("datetime64[D]") + days
+
+
+def decode_power_parameters(parameter_data, parameters=None):
+    """
+    Returns (dates, {param: values}) for the union of dates in the payload.
+    `parameters` limits which columns are decoded; parameters missing from
+    the payload come back as all-NaN columns.
+    """
+    parameters = list(parameters or parameter_data)
+    key_sets = [parameter_data[p].keys() for p in parameters if p in parameter_data]
+    if not key_sets:
+        return np.array([], dtype="datetime64[D]"), {p: np.array([], dtype=np.float64) for p in parameters}
+
+    keys = sorted(key_sets[0])
+    if any(other != key_sets[0] for other in key_sets[1:]):
+        keys = sorted(set().union(*key_sets))
+    n = len(keys)
+    dates = _parse_dates(keys)
+
+    columns = {}
+    for param in parameters:
+        series = parameter_data.get(param)
+        if not series:
+            columns[param] = np.full(n, np.nan)
+            continue
+        if len(series) == n and list(series) == keys:
+            # POWER emits dates in order, so the common case is a straight copy
+            values = np.fromiter(series.values(), dtype=np.float64, count=n)
+        else:
+            values = np.fromiter((series.get(k, np.nan) for k in keys), dtype=np.float64, count=n)
+        values[values <= FILL_VALUE] = np.nan
+        columns[param] = values
+    return dates, columns
+
+
+def _as_objects(values):
+    """float array -> object array of Python floats with NaN replaced by None."""
+    objects = values.astype(object)
+    objects[np.isnan(values)] = None
+    return objects
+
+
+def select_from(dates, columns, start_date):
+    """Restricts a decoded payload to dates >= start_date (YYYYMMDD), without copying."""
+    if start_date is None:
+        return dates, columns
+    first = int(np.searchsorted(dates, _parse_dates([start_date])[0]))
+    return dates[first:], {param: values[first:] for param, values in columns.items()}
+
+
+def weather_rows(user_id, dates, columns):
+    """nasa_weather_data rows shaped like bulk_write.WEATHER_COLUMNS."""
+    n = len(dates)
+    return list(zip(
+        [user_id] * n,
+        dates.astype(object),
+        _as_objects(columns["T2M"]),
+        _as_objects(columns["PRECTOTCORR"]),
+        _as_objects(columns["EVAP"]),
+        _as_objects(columns["T2M_MIN"]),
+        _as_objects(columns["T2M_MAX"]),
+    ))
+
+
+def soil_rows(user_id, zone_id, dates, columns):
+    """nasa_soil_data rows shaped like bulk_write.SOIL_COLUMNS."""
+    n = len(dates)
+    return list(zip(
+        [user_id] * n,
+        [zone_id] * n,
+        dates.astype(object),
+        _as_objects(columns["SM_0_10cm"]),
+        _as_objects(columns["TS"]),
+        _as_objects(columns["GWETTOP"]),
+    ))
@@ -0,0 +1,88 @@
+"""
+Regional (bounding-box) fetch planning for NASA POWER.
+
+The daily regional endpoint returns every grid point inside a box in one
+response, but only for one parameter per request and only for boxes
+between REGIONAL_MIN_DEGREES and REGIONAL_MAX_DEGREES on each side. The
+planner sweeps grid cells into boxes under REGIONAL_MAX_DEGREES and only
+uses a box when it holds enough cells to beat one point call per cell;
+the remaining cells stay on the point endpoint.
+
+The box limits, the one-parameter rule and the response layout come from
+the POWER docs and have only been tested against a synthetic response so
+far (see tests/test_power_regional.py), which is why NASA_FETCH_MODE
+defaults to "point".
+"""
+import os
+
+from power_cache import snap_to_cell
+
+REGIONAL_MIN_DEGREES = float(os.getenv("POWER_REGIONAL_MIN_DEGREES", "2"))
+REGIONAL_MAX_DEGREES = float(os.getenv("POWER_REGIONAL_MAX_DEGREES", "10"))
+
+
+def _expand(low, high, minimum, floor, ceiling):
+    """Widens [low, high] around its centre to at least `minimum`, inside [floor, ceiling]."""
+    if high - low >= minimum:
+        return low, high
+    centre = (low + high) / 2
+    low, high = centre - minimum / 2, centre + minimum / 2
+    if low < floor:
+        low, high = floor, floor + minimum
+    if high > ceiling:
+        low, high = ceiling - minimum, ceiling
+    return round(low, 4), round(high, 4)
+
+
+def plan_regions(cells, calls_per_region, max_degrees=REGIONAL_MAX_DEGREES, min_degrees=REGIONAL_MIN_DEGREES):
+    """
+    Splits grid cells into regional boxes and leftover point cells.
+
+    Cells are swept south to north into latitude bands narrower than
+    max_degrees, and each band west to east into boxes narrower than
+    max_degrees, so boxes are anchored on the data rather than on a fixed
+    tiling. A box is used only if it holds more cells than
+    `calls_per_region` (one regional request per parameter); otherwise its
+    cells are returned for point fetching.
+
+    Returns ([(bbox, [cells])], [point cells]) where bbox is
+    (lat_min, lat_max, lon_min, lon_max).
+    """
+    regions = []
+    point_cells = []
+    remaining = sorted(set(cells))
+    while remaining:
+        band_top = remaining[0][0] + max_degrees
+        band = sorted((cell for cell in remaining if cell[0] < band_top), key=lambda cell: cell[1])
+        remaining = [cell for cell in remaining if cell[0] >= band_top]
+        while band:
+            box_east = band[0][1] + max_degrees
+            box_cells = [cell for cell in band if cell[1] < box_east]
+            band = [cell for cell in band if cell[1] >= box_east]
+            if len(box_cells) <= calls_per_region:
+                point_cells.extend(box_cells)
+                continue
+            lats = [lat for lat, _ in box_cells]
+            lons = [lon for _, lon in box_cells]
+            lat_min, lat_max = _expand(min(lats), max(lats), min_degrees, -90, 90)
+            lon_min, lon_max = _expand(min(lons), max(lons), min_degrees, -180, 180)
+            regions.append(((lat_min, lat_max, lon_min, lon_max), box_cells))
+    return regions, point_cells
+
+
+def split_features(features, wanted_cells):
+    """
+    Maps a regional GeoJSON response back onto grid cells.
+
+    Returns {cell: {param: {date: value}}} for the features whose point
+    snaps to one of wanted_cells.
+    """
+    wanted = set(wanted_cells)
+    by_cell = {}
+    for feature in features:
+        longitude, latitude = feature["geometry"]["coordinates"][:2]
+        cell = snap_to_cell(latitude, longitude)
+        if cell in wanted:
+            parameters = feature.get("properties", {}).get("parameter", {})
+            by_cell.setdefault(cell, {}).update(parameters)
+    return by_cell
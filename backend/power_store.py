@@ -0,0 +1,203 @@
+"""
+Columnar on-disk store for raw NASA POWER daily series.
+
+Every grid cell gets a directory holding one float32 .npy file per POWER
+parameter plus a small meta.json with the first date and day count. Arrays
+are indexed by day offset from that first date, missing and -999 fill
+values are stored as NaN, and reads open the files with mmap so callers get
+zero-copy views over just the requested date range. This keeps all POWER
+parameters (not only the six Postgres stores) for multi-year histories,
+so analysis jobs can scan thousands of cells without going through Postgres.
+
+Several processes (API refreshes, the scheduler, backfills) may write the
+same cell. Writers hold an exclusive flock on the cell's lock file and
+replace every file through a uniquely named temp file. Readers hold a
+shared flock while they load meta.json and map the arrays, so they never
+combine one write's meta with another write's arrays; their views stay
+valid after the lock is released, as replaced files keep their inodes.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+from power_cache import cell_key
+from power_decode import decode_power_parameters
+
+load_dotenv()
+
+STORE_ENABLED = os.getenv("POWER_STORE_ENABLED", "1") != "0"
+STORE_PATH = os.getenv(
+    "POWER_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "power_store"),
+)
+
+DATE_FORMAT = "%Y%m%d"
+LOCK_FILE = ".lock"
+
+
+def _to_day(date_value):
+    """Converts YYYYMMDD strings, dates or datetime64 values to datetime64[D]."""
+    if isinstance(date_value, str):
+        return np.datetime64(datetime.strptime(date_value, DATE_FORMAT).date(), "D")
+    return np.datetime64(date_value, "D")
+
+
+class PowerStore:
+    def __init__(self, root=STORE_PATH):
+        self.root = root
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _cell_dir(self, cell_lat, cell_lon):
+        return os.path.join(self.root, cell_key(cell_lat, cell_lon).replace(",", "_"))
+
+    def _cell_lock(self, cell_dir):
+        with self._locks_lock:
+            return self._locks.setdefault(cell_dir, threading.Lock())
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(cell_dir, operation):
+        """flock(operation) on the cell's lock file, across processes."""
+        fd = os.open(os.path.join(cell_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _replace(cell_dir, path, write):
+        """Writes path through a temp file of its own, so concurrent writers never share one."""
+        fd, tmp = tempfile.mkstemp(dir=cell_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def _read_meta(cell_dir):
+        try:
+            with open(os.path.join(cell_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        meta["start"] = np.datetime64(meta["start"], "D")
+        return meta
+
+    def _write_meta(self, cell_dir, start, days, parameters):
+        meta = json.dumps({"start": str(start), "days": int(days), "parameters": sorted(parameters)})
+        self._replace(cell_dir, os.path.join(cell_dir, "meta.json"), lambda f: f.write(meta.encode()))
+
+    def write(self, cell_lat, cell_lon, parameter_data):
+        """
+        Merges a POWER {param: {YYYYMMDD: value}} mapping into the cell's
+        arrays, growing them when the dates fall outside the stored range.
+        Newer values overwrite older ones. Returns the number of days written.
+        """
+        dates, decoded = decode_power_parameters(parameter_data)
+        if not len(dates):
+            return 0
+
+        cell_dir = self._cell_dir(cell_lat, cell_lon)
+        os.makedirs(cell_dir, exist_ok=True)
+        with self._cell_lock(cell_dir), self._file_lock(cell_dir, fcntl.LOCK_EX):
+            meta = self._read_meta(cell_dir)
+            new_start, new_end = dates[0], dates[-1]
+            if meta:
+                start = min(meta["start"], new_start)
+                end = max(meta["start"] + (meta["days"] - 1), new_end)
+                parameters = set(meta["parameters"]) | set(parameter_data)
+            else:
+                start, end = new_start, new_end
+                parameters = set(parameter_data)
+            days = int((end - start).astype(int)) + 1
+            offsets = (dates - start).astype(np.int64)
+
+            for param in parameters:
+                column = np.full(days, np.nan, dtype=np.float32)
+                path = os.path.join(cell_dir, f"{param}.npy")
+                if meta and os.path.exists(path):
+                    existing = np.load(path)
+                    offset = int((meta["start"] - start).astype(int))
+                    column[offset:offset + len(existing)] = existing
+
+                if param in decoded:
+                    column[offsets] = decoded[param]
+
+                # Replace atomically so concurrent readers keep their old mapping
+                self._replace(cell_dir, path, lambda f: np.save(f, column))
+
+            self._write_meta(cell_dir, start, days, parameters)
+        return len(dates)
+
+    def read(self, cell_lat, cell_lon, start_date, end_date, parameters=None):
+        """
+        Returns (dates, {param: array}) for start_date..end_date inclusive,
+        clipped to what the cell holds. Arrays are read-only memory-mapped
+        views, so nothing is copied until the caller touches the data.
+        Returns (empty dates, {}) if the cell or range has no data.
+        """
+        cell_dir = self._cell_dir(cell_lat, cell_lon)
+        empty = (np.array([], dtype="datetime64[D]"), {})
+        if not os.path.isdir(cell_dir):
+            return empty
+
+        with self._file_lock(cell_dir, fcntl.LOCK_SH):
+            meta = self._read_meta(cell_dir)
+            if not meta:
+                return empty
+
+            first = max(int((_to_day(start_date) - meta["start"]).astype(int)), 0)
+            last = min(int((_to_day(end_date) - meta["start"]).astype(int)), meta["days"] - 1)
+            if last < first:
+                return empty
+
+            dates = meta["start"] + np.arange(first, last + 1)
+            columns = {}
+            for param in parameters or meta["parameters"]:
+                path = os.path.join(cell_dir, f"{param}.npy")
+                if not os.path.exists(path):
+                    continue
+                column = np.load(path, mmap_mode="r")
+                # Offsets are only meaningful against the meta written with the array
+                if len(column) != meta["days"]:
+                    raise ValueError(f"{path} holds {len(column)} days, meta.json says {meta['days']}")
+                columns[param] = column[first:last + 1]
+        return dates, columns
+
+    def cells(self):
+        """Yields (cell_lat, cell_lon) for every cell with stored data."""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if os.path.exists(os.path.join(self.root, name, "meta.json")):
+                lat, lon = name.split("_")
+                yield float(lat), float(lon)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Returns the process-wide store, or None when POWER_STORE_ENABLED=0."""
+    global _store
+    if not STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PowerStore()
+    return _store
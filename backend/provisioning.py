@@ -0,0 +1,113 @@
+"""
+Provisioning for new users, so GET endpoints never have to write.
+
+Signup calls provision_user() in its own transaction to create the rows
+the read paths and the NASA refresh expect. `flask provision-users`
+creates the same rows for existing users in one set-based pass. Until a
+user has real NASA data, the read endpoints answer with the SAMPLE_*
+placeholders below without storing them.
+"""
+from datetime import timedelta
+
+DEFAULT_ZONE_NAME = "Default"  # the zone data_orchestrator links soil data to
+
+SAMPLE_USER_METRICS = {
+    "credit_points": 1247,
+    "farm_health": 94,
+    "active_neighbors": 23,
+    "nearest_market_distance": 12,
+    "nearest_market_name": "Green Valley Market",
+}
+
+SAMPLE_SOIL_CONDITIONS = {"moisture": 78.0, "nitrogen": 65.0, "ph": 6.5, "temperature": 22.0}
+
+SAMPLE_FORECAST_CONDITIONS = ["Clear skies", "Partly cloudy", "Light rain", "Windy", "Sunny"]
+
+# (days from today, high, low, condition, humidity, rain chance)
+SAMPLE_LEGACY_FORECAST = [
+    (0, 28, 18, "Clear skies", 65, 10),
+    (1, 27, 17, "Partly cloudy", 70, 20),
+    (2, 26, 16, "Light rain", 75, 80),
+    (3, 29, 19, "Sunny", 60, 5),
+]
+
+PROVISION_USER_QUERY = f"""
+    WITH zone AS (
+        INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+        VALUES (%(user_id)s, '{DEFAULT_ZONE_NAME}', 'Unassigned', 0)
+        ON CONFLICT (user_id, zone_name) DO NOTHING
+    )
+    INSERT INTO user_metrics (user_id, credit_points, farm_health, active_neighbors,
+                              nearest_market_distance, nearest_market_name)
+    SELECT %(legacy_user_id)s, %(credit_points)s, %(farm_health)s, %(active_neighbors)s,
+           %(nearest_market_distance)s, %(nearest_market_name)s
+    WHERE %(legacy_user_id)s IS NOT NULL
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+
+def provision_user(cur, user_id, legacy_user_id=None):
+    """
+    Creates a new user's default farm zone and, for the legacy id returned
+    by signup, its user_metrics row, in one statement. The caller commits.
+    """
+    cur.execute(PROVISION_USER_QUERY, {
+        "user_id": user_id,
+        "legacy_user_id": legacy_user_id,
+        **SAMPLE_USER_METRICS,
+    })
+
+
+def provision_missing_users(conn):
+    """
+    Creates the rows provision_user() would have for every existing user
+    that lacks them. Returns {"zones", "legacy_metrics"} insert counts.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+            SELECT id, '{DEFAULT_ZONE_NAME}', 'Unassigned', 0 FROM users
+            ON CONFLICT (user_id, zone_name) DO NOTHING
+        """)
+        zones = cur.rowcount
+        cur.execute("""
+            INSERT INTO user_metrics (user_id, credit_points, farm_health, active_neighbors,
+                                      nearest_market_distance, nearest_market_name)
+            SELECT userId, %(credit_points)s, %(farm_health)s, %(active_neighbors)s,
+                   %(nearest_market_distance)s, %(nearest_market_name)s
+            FROM legacy_users
+            ON CONFLICT (user_id) DO NOTHING
+        """, SAMPLE_USER_METRICS)
+        legacy_metrics = cur.rowcount
+    conn.commit()
+    return {"zones": zones, "legacy_metrics": legacy_metrics}
+
+
+def sample_weather_forecast(today):
+    """Placeholder 7-day /weather-forecast/<user_id> payload for users without NASA forecasts."""
+    return [
+        {
+            "date": (today + timedelta(days=i)).isoformat(),
+            "high": 28 - i * 0.5,
+            "low": 18 - i * 0.5,
+            "condition": SAMPLE_FORECAST_CONDITIONS[min(i, 4)],
+            "humidity": float(65 - i * 2),
+            "rainChance": 10.0 + i * 5.0,
+        }
+        for i in range(7)
+    ]
+
+
+def sample_legacy_weather_forecast(today):
+    """Placeholder legacy /weather-forecast payload for when weather_forecast has no upcoming rows."""
+    return [
+        {
+            "date": (today + timedelta(days=offset)).isoformat(),
+            "high": float(high),
+            "low": float(low),
+            "condition": condition,
+            "humidity": float(humidity),
+            "rainChance": float(rain_chance),
+        }
+        for offset, high, low, condition, humidity, rain_chance in SAMPLE_LEGACY_FORECAST
+    ]
@@ -0,0 +1,166 @@
+# Hot read queries shared by the route handlers in app.py and the
+# query-plan regression check in query_plans.py, so the SQL that is
+# EXPLAINed is exactly the SQL that is served.
+
+DASHBOARD_USER_QUERY = """
+    SELECT
+        u.first_name,
+        u.last_name,
+        uc.total_points as credit_points,
+        uc.current_rank,
+        fh.overall_health_score as farm_health,
+        (SELECT COUNT(*) FROM farm_neighbors WHERE user_id = u.id) as active_neighbors,
+        u.farm_latitude,
+        u.farm_longitude
+    FROM users u
+    LEFT JOIN user_credits uc ON u.id = uc.user_id
+    -- Latest score; NASA inputs lag a few days, so there may be none for today
+    LEFT JOIN LATERAL (
+        SELECT overall_health_score FROM farm_health_metrics
+        WHERE user_id = u.id
+        ORDER BY date DESC
+        LIMIT 1
+    ) fh ON TRUE
+    WHERE u.id = %s
+"""
+
+LEGACY_USER_METRICS_QUERY = """
+    SELECT credit_points, farm_health, active_neighbors, nearest_market_distance, nearest_market_name
+    FROM user_metrics
+    WHERE user_id = %s
+"""
+
+WEATHER_FORECAST_QUERY = """
+    SELECT
+        forecast_date as date,
+        temperature_max as high,
+        temperature_min as low,
+        weather_condition as condition,
+        humidity,
+        precipitation_probability as rain_chance
+    FROM nasa_weather_forecast
+    WHERE user_id = %s
+        AND forecast_date >= CURRENT_DATE
+        AND forecast_date <= CURRENT_DATE + INTERVAL '7 days'
+    ORDER BY forecast_date ASC
+"""
+
+LEGACY_WEATHER_FORECAST_QUERY = """
+    SELECT date, temperature_high, temperature_low, condition, humidity, chance_of_rain
+    FROM weather_forecast
+    WHERE date >= CURRENT_DATE
+    ORDER BY date ASC
+    LIMIT 7
+"""
+
+SOIL_CONDITIONS_QUERY = """
+    SELECT
+        ROUND((nsd.surface_wetness)::numeric, 0) as moisture,
+        65.0 as nitrogen,
+        6.5 as ph,
+        ROUND(nsd.soil_temperature_0_5cm::numeric, 0) as temperature
+    FROM nasa_soil_data nsd
+    WHERE nsd.user_id = %s
+        AND nsd.date = CURRENT_DATE
+    ORDER BY nsd.updated_at DESC
+    LIMIT 1
+"""
+
+LEGACY_SOIL_CONDITIONS_QUERY = """
+    SELECT moisture_level, nitrogen_level, ph_level, temperature
+    FROM soil_conditions
+    WHERE user_id = %s
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+
+# The CASE expression must stay in sync with idx_ai_recommendations_active_priority
+# (migrations.py) for the index to satisfy the ORDER BY without a sort.
+AI_RECOMMENDATIONS_QUERY = """
+    SELECT
+        id,
+        priority,
+        title,
+        description,
+        recommendation_type as type
+    FROM nasa_ai_recommendations
+    WHERE user_id = %s
+        AND status = 'active'
+        AND (time_window_start IS NULL OR time_window_start <= CURRENT_DATE)
+        AND (time_window_end IS NULL OR time_window_end >= CURRENT_DATE)
+    ORDER BY
+        CASE priority
+            WHEN 'High' THEN 1
+            WHEN 'Medium' THEN 2
+            WHEN 'Watch' THEN 3
+            ELSE 4
+        END,
+        created_at DESC
+"""
+
+# /climate-history: one daily query per raw table and one per rollup table.
+# Every query returns its rows ordered by date; climate_history.py maps the
+# value columns to the requested params. The date bounds are bound as
+# constants, so only the requested months' partitions are planned and read.
+CLIMATE_WEATHER_DAILY_QUERY = """
+    SELECT date, temperature_2m_avg, precipitation, eto
+    FROM nasa_weather_data
+    WHERE user_id = %(user_id)s
+        AND date >= %(from_date)s
+        AND date <= %(to_date)s
+    ORDER BY date
+"""
+
+# Averaged over the user's zones, as in the rollups
+CLIMATE_SOIL_DAILY_QUERY = """
+    SELECT date, AVG(soil_moisture_0_5cm), AVG(soil_temperature_0_5cm), AVG(surface_wetness)
+    FROM nasa_soil_data
+    WHERE user_id = %(user_id)s
+        AND date >= %(from_date)s
+        AND date <= %(to_date)s
+    GROUP BY date
+    ORDER BY date
+"""
+
+CLIMATE_VEGETATION_DAILY_QUERY = """
+    SELECT date, crop_health_score, vegetation_density
+    FROM nasa_vegetation_data
+    WHERE user_id = %(user_id)s
+        AND date >= %(from_date)s
+        AND date <= %(to_date)s
+    ORDER BY date
+"""
+
+CLIMATE_HEALTH_DAILY_QUERY = """
+    SELECT date, overall_health_score
+    FROM farm_health_metrics
+    WHERE user_id = %(user_id)s
+        AND date >= %(from_date)s
+        AND date <= %(to_date)s
+    ORDER BY date
+"""
+
+CLIMATE_ROLLUP_COLUMNS = """
+        temperature_mean, precipitation_sum, eto_sum,
+        soil_moisture_mean, soil_temperature_mean, surface_wetness_mean,
+        crop_health_mean, vegetation_density_mean,
+        overall_health_mean
+"""
+
+CLIMATE_WEEKLY_QUERY = f"""
+    SELECT period_start, {CLIMATE_ROLLUP_COLUMNS}
+    FROM nasa_weekly_rollups
+    WHERE user_id = %(user_id)s
+        AND period_start >= %(from_date)s
+        AND period_start <= %(to_date)s
+    ORDER BY period_start
+"""
+
+CLIMATE_MONTHLY_QUERY = f"""
+    SELECT period_start, {CLIMATE_ROLLUP_COLUMNS}
+    FROM nasa_monthly_rollups
+    WHERE user_id = %(user_id)s
+        AND period_start >= %(from_date)s
+        AND period_start <= %(to_date)s
+    ORDER BY period_start
+"""
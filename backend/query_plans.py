@@ -0,0 +1,197 @@
+"""
+Query-plan regression check for the hot endpoint queries and the refresh
+job claim.
+
+Seeds a user's worth of rows into every table the read endpoints touch,
+EXPLAINs each query from queries.py and fails if the plan contains a
+sequential scan or a sort node. Sequential scans and sorts are disabled for
+the check, so the planner only falls back to them when no index can serve
+the query; the result therefore does not depend on table sizes. Everything
+runs in one transaction that is rolled back.
+
+Run with `flask check-query-plans`.
+"""
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from identity import RESOLVE_BY_EMAIL_QUERY, RESOLVE_BY_ID_QUERY
+from partitions import ensure_partitions
+from refresh_scheduler import CLAIM_JOB_QUERY
+from response_cache import CHANGES_QUERY
+from queries import (
+    DASHBOARD_USER_QUERY,
+    LEGACY_USER_METRICS_QUERY,
+    WEATHER_FORECAST_QUERY,
+    LEGACY_WEATHER_FORECAST_QUERY,
+    SOIL_CONDITIONS_QUERY,
+    LEGACY_SOIL_CONDITIONS_QUERY,
+    AI_RECOMMENDATIONS_QUERY,
+    CLIMATE_WEATHER_DAILY_QUERY,
+    CLIMATE_SOIL_DAILY_QUERY,
+    CLIMATE_VEGETATION_DAILY_QUERY,
+    CLIMATE_HEALTH_DAILY_QUERY,
+    CLIMATE_WEEKLY_QUERY,
+    CLIMATE_MONTHLY_QUERY,
+)
+
+FORBIDDEN_NODES = {"Seq Scan", "Sort", "Incremental Sort"}
+
+
+def _user_id(user_id):
+    return (user_id,)
+
+
+def _no_params(user_id):
+    return None
+
+
+def _history(user_id):
+    return {"user_id": user_id, "from_date": date.today() - timedelta(days=30), "to_date": date.today()}
+
+
+# (name, query, builds the query parameters from the seeded user id)
+HOT_QUERIES = [
+    ("resolve_user", RESOLVE_BY_ID_QUERY, lambda user_id: {"uuid": user_id, "raw": user_id}),
+    ("resolve_legacy_user", RESOLVE_BY_ID_QUERY, lambda user_id: {"uuid": None, "raw": f"plan-legacy-{user_id}"}),
+    ("resolve_email", RESOLVE_BY_EMAIL_QUERY, lambda user_id: {"email": f"plan-{user_id}@example.com"}),
+    ("dashboard", DASHBOARD_USER_QUERY, _user_id),
+    ("dashboard_legacy_metrics", LEGACY_USER_METRICS_QUERY, _user_id),
+    ("weather_forecast", WEATHER_FORECAST_QUERY, _user_id),
+    ("weather_forecast_legacy", LEGACY_WEATHER_FORECAST_QUERY, _no_params),
+    ("soil_conditions", SOIL_CONDITIONS_QUERY, _user_id),
+    ("soil_conditions_legacy", LEGACY_SOIL_CONDITIONS_QUERY, _user_id),
+    ("ai_recommendations", AI_RECOMMENDATIONS_QUERY, _user_id),
+    ("climate_weather_daily", CLIMATE_WEATHER_DAILY_QUERY, _history),
+    ("climate_soil_daily", CLIMATE_SOIL_DAILY_QUERY, _history),
+    ("climate_vegetation_daily", CLIMATE_VEGETATION_DAILY_QUERY, _history),
+    ("climate_health_daily", CLIMATE_HEALTH_DAILY_QUERY, _history),
+    ("climate_weekly", CLIMATE_WEEKLY_QUERY, _history),
+    ("climate_monthly", CLIMATE_MONTHLY_QUERY, _history),
+    ("refresh_job_claim", CLAIM_JOB_QUERY, lambda user_id: {"worker": f"plan-{user_id}"}),
+    ("response_cache_changes", CHANGES_QUERY, lambda user_id: (datetime.now(timezone.utc) - timedelta(minutes=1),)),
+]
+
+
+def _seed(cur, user_id):
+    cur.execute("""
+        INSERT INTO users (id, username, email, first_name, last_name, farm_name, farm_latitude, farm_longitude)
+        VALUES (%s, %s, %s, 'Plan', 'Check', 'Plan Farm', -1.29, 36.82)
+    """, (user_id, f"plan-{user_id}", f"plan-{user_id}@example.com"))
+    cur.execute("""
+        INSERT INTO legacy_users (userId, firstName, lastName, email, password)
+        VALUES (%s, 'Plan', 'Check', %s, 'x')
+    """, (f"plan-legacy-{user_id}", f"plan-{user_id}@example.com"))
+    cur.execute("INSERT INTO user_credits (user_id, total_points) VALUES (%s, 100)", (user_id,))
+    cur.execute("""
+        INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+        VALUES (%s, 'A', 'Wheat', 1.0)
+        RETURNING id
+    """, (user_id,))
+    zone_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO farm_neighbors (user_id, neighbor_name, distance_km)
+        SELECT %s, 'Neighbor ' || n, n FROM generate_series(1, 5) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO farm_health_metrics (user_id, date, overall_health_score)
+        SELECT %s, CURRENT_DATE - n, 80 FROM generate_series(0, 30) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_soil_data (user_id, zone_id, date, soil_moisture_0_5cm, soil_temperature_0_5cm, surface_wetness)
+        SELECT %s, %s, CURRENT_DATE - n, 0.2, 22, 70 FROM generate_series(0, 30) n
+    """, (user_id, zone_id))
+    cur.execute("""
+        INSERT INTO nasa_weather_data (user_id, date, temperature_2m_avg, precipitation, eto)
+        SELECT %s, CURRENT_DATE - n, 24, 2, 4 FROM generate_series(0, 30) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_vegetation_data (user_id, date, crop_health_score, vegetation_density)
+        SELECT %s, CURRENT_DATE - n, 75, 60 FROM generate_series(0, 30) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_weekly_rollups (user_id, period_start, temperature_mean)
+        SELECT %s, date_trunc('week', CURRENT_DATE)::date - 7 * n, 24 FROM generate_series(0, 30) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_monthly_rollups (user_id, period_start, temperature_mean)
+        SELECT %s, (date_trunc('month', CURRENT_DATE) - n * INTERVAL '1 month')::date, 24
+        FROM generate_series(0, 30) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_weather_forecast (user_id, forecast_date, temperature_max, temperature_min,
+                                           weather_condition, precipitation_probability, humidity, wind_speed)
+        SELECT %s, CURRENT_DATE + n, 28, 18, 'Sunny', 10, 60, 5 FROM generate_series(-7, 7) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO nasa_ai_recommendations (user_id, title, priority, status)
+        SELECT %s, 'Recommendation ' || n, (ARRAY['High', 'Medium', 'Watch', 'Low'])[1 + n %% 4],
+               CASE WHEN n %% 5 = 0 THEN 'dismissed' ELSE 'active' END
+        FROM generate_series(1, 20) n
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO market_data (market_name, latitude, longitude, distance_km)
+        SELECT 'Market ' || n, -1.0 - n * 0.01, 36.0 + n * 0.01, n FROM generate_series(1, 20) n
+    """)
+    cur.execute("""
+        INSERT INTO user_metrics (user_id, credit_points, farm_health)
+        VALUES (%s, 100, 80)
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO soil_conditions (user_id, moisture_level, nitrogen_level, ph_level, temperature)
+        SELECT %s, 70, 60, 6.5, 22 FROM generate_series(1, 5)
+    """, (user_id,))
+    cur.execute("""
+        INSERT INTO weather_forecast (date, temperature_high, temperature_low, condition, humidity)
+        SELECT CURRENT_DATE + n, 28, 18, 'Sunny', 60 FROM generate_series(-7, 14) n
+    """)
+    cur.execute("""
+        INSERT INTO nasa_refresh_jobs (cell_latitude, cell_longitude, user_ids, priority)
+        VALUES (-1.25, 36.875, ARRAY[%s::uuid], 1000)
+        ON CONFLICT (cell_latitude, cell_longitude) DO NOTHING
+    """, (user_id,))
+    cur.execute("""
+        ANALYZE users, legacy_users, user_credits, farm_zones, farm_neighbors, farm_health_metrics, nasa_soil_data,
+                nasa_weather_data, nasa_vegetation_data, nasa_weekly_rollups, nasa_monthly_rollups,
+                nasa_weather_forecast, nasa_ai_recommendations, market_data, user_metrics,
+                soil_conditions, weather_forecast, nasa_refresh_jobs
+    """)
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check_query_plans(conn):
+    """
+    Returns {query name: {"ok": bool, "violations": [...], "plan": ...}}.
+    Leaves the database unchanged.
+    """
+    user_id = str(uuid.uuid4())
+    results = {}
+    # Created (and committed) separately; the seed rows below are rolled back
+    ensure_partitions(date.today() - timedelta(days=30), date.today())
+    try:
+        with conn.cursor() as cur:
+            _seed(cur, user_id)
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute("SET LOCAL enable_sort = off")
+            cur.execute("SET LOCAL enable_incremental_sort = off")
+
+            for name, query, params in HOT_QUERIES:
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params(user_id))
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plan = plan[0]["Plan"]
+                violations = [
+                    f"{node['Node Type']} on {node.get('Relation Name', node.get('Sort Key', '?'))}"
+                    for node in _plan_nodes(plan)
+                    if node["Node Type"] in FORBIDDEN_NODES
+                ]
+                results[name] = {"ok": not violations, "violations": violations, "plan": plan}
+    finally:
+        conn.rollback()
+    return results
@@ -0,0 +1,227 @@
+"""
+Offline rule-based recommendation engine.
+
+RULES is a declarative list: each rule is a SQL condition over per-user
+features (the last week of observed POWER weather and soil, which the NASA
+refresh keeps current, plus the 7-day forecast where one is stored), and
+carries a title, type, priority, description, validity window and
+expected-impact expression. generate_recommendations compiles every rule
+into one INSERT ... SELECT, so all users are evaluated in a single
+set-based pass. Upserts are keyed on (user_id, title). Engine
+recommendations that stop firing are marked 'expired', and ones a user
+dismissed stay dismissed.
+
+Run with `flask generate-recommendations`, e.g. nightly after the NASA refresh.
+"""
+import json
+
+from psycopg2 import sql
+
+from response_cache import mark_users_changed
+
+FROST_THRESHOLD_C = 2
+
+# Per-user inputs the rule conditions can reference
+FEATURES_CTE = f"""
+    features AS (
+        SELECT
+            u.id AS user_id,
+            w.precipitation_7d,
+            w.eto_7d,
+            w.temperature_7d,
+            w.temperature_min_7d,
+            w.temperature_max_7d,
+            w.first_frost_date,
+            w.last_frost_date,
+            s.soil_moisture_7d,
+            s.soil_temperature_7d,
+            f.avg_precipitation_probability
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, SUM(precipitation) AS precipitation_7d, SUM(eto) AS eto_7d,
+                   AVG(temperature_2m_avg) AS temperature_7d,
+                   MIN(temperature_2m_min) AS temperature_min_7d,
+                   MAX(temperature_2m_max) AS temperature_max_7d,
+                   MIN(date) FILTER (WHERE temperature_2m_min <= {FROST_THRESHOLD_C}) AS first_frost_date,
+                   MAX(date) FILTER (WHERE temperature_2m_min <= {FROST_THRESHOLD_C}) AS last_frost_date
+            FROM nasa_weather_data
+            WHERE date > CURRENT_DATE - 7
+            GROUP BY user_id
+        ) w ON w.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, AVG(soil_moisture_0_5cm) AS soil_moisture_7d,
+                   AVG(soil_temperature_0_5cm) AS soil_temperature_7d
+            FROM nasa_soil_data
+            WHERE date > CURRENT_DATE - 7
+            GROUP BY user_id
+        ) s ON s.user_id = u.id
+        -- Not written by the NASA refresh; only used where it is filled
+        LEFT JOIN (
+            SELECT user_id, AVG(precipitation_probability) AS avg_precipitation_probability
+            FROM nasa_weather_forecast
+            WHERE forecast_date BETWEEN CURRENT_DATE AND CURRENT_DATE + 7
+            GROUP BY user_id
+        ) f ON f.user_id = u.id
+    )
+"""
+
+# when / description / window / impact are SQL expressions over FEATURES_CTE
+RULES = [
+    {
+        "title": "Frost risk: protect sensitive crops",
+        "type": "frost_protection",
+        "priority": "High",
+        "when": f"temperature_min_7d <= {FROST_THRESHOLD_C}",
+        "description": "'Night-time lows fell to ' || ROUND(temperature_min_7d, 1) || '°C between ' || "
+                       "first_frost_date || ' and ' || last_frost_date || "
+                       "'. Cover seedlings and delay transplanting until the cold spell passes.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 3"),
+        "impact": f"LEAST(100, 60 + ({FROST_THRESHOLD_C} - temperature_min_7d) * 10)",
+        "datasets": ["POWER"],
+    },
+    {
+        "title": "Irrigate now: soil moisture critically low",
+        "type": "irrigation",
+        "priority": "High",
+        "when": "soil_moisture_7d < 0.12 AND COALESCE(eto_7d, 0) > COALESCE(precipitation_7d, 0)",
+        "description": "'Topsoil moisture averaged ' || ROUND(soil_moisture_7d, 3) || ' m³/m³ this week while "
+                       "evapotranspiration exceeded rainfall by ' || ROUND(COALESCE(eto_7d, 0) - COALESCE(precipitation_7d, 0), 1) || "
+                       "' mm. Irrigate within the next 2 days.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 2"),
+        "impact": "LEAST(100, 70 + (0.12 - soil_moisture_7d) * 250)",
+        "datasets": ["POWER", "SMAP"],
+    },
+    {
+        "title": "Plan irrigation: water deficit building",
+        "type": "irrigation",
+        "priority": "Medium",
+        "when": "soil_moisture_7d >= 0.12 AND soil_moisture_7d < 0.18 "
+                "AND COALESCE(eto_7d, 0) - COALESCE(precipitation_7d, 0) > 10",
+        "description": "'Evapotranspiration exceeded rainfall by ' || "
+                       "ROUND(COALESCE(eto_7d, 0) - COALESCE(precipitation_7d, 0), 1) || "
+                       "' mm over the last week and soil moisture is falling. Schedule irrigation in the next few days.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 4"),
+        "impact": "LEAST(100, 40 + (COALESCE(eto_7d, 0) - COALESCE(precipitation_7d, 0)) * 2)",
+        "datasets": ["POWER", "SMAP"],
+    },
+    {
+        "title": "Optimal planting window this week",
+        "type": "planting",
+        "priority": "Medium",
+        "when": "soil_temperature_7d BETWEEN 18 AND 30 AND soil_moisture_7d BETWEEN 0.20 AND 0.35 "
+                f"AND COALESCE(temperature_min_7d, 99) > {FROST_THRESHOLD_C} "
+                "AND COALESCE(avg_precipitation_probability, 0) < 60",
+        "description": "'Soil at ' || ROUND(soil_temperature_7d, 1) || '°C with ' || ROUND(soil_moisture_7d, 2) || "
+                       "' m³/m³ moisture and no frost or heavy rain forecast: good conditions for sowing and transplanting.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 7"),
+        "impact": "60 + 20 * (1 - ABS(soil_moisture_7d - 0.275) / 0.075)",
+        "datasets": ["POWER", "SMAP"],
+    },
+    {
+        "title": "Heat stress expected",
+        "type": "heat_stress",
+        "priority": "Watch",
+        "when": "temperature_max_7d >= 35",
+        "description": "'Daytime highs reached ' || ROUND(temperature_max_7d, 1) || "
+                       "'°C this week. Irrigate early in the day and provide shade for livestock and seedlings.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 7"),
+        "impact": "LEAST(100, 40 + (temperature_max_7d - 35) * 8)",
+        "datasets": ["POWER"],
+    },
+    {
+        "title": "Waterlogging risk: improve drainage",
+        "type": "drainage",
+        "priority": "Watch",
+        "when": "soil_moisture_7d > 0.40 AND COALESCE(precipitation_7d, 0) > 50",
+        "description": "'Soil is near saturation after ' || ROUND(precipitation_7d, 0) || "
+                       "' mm of rain this week. Clear drainage channels and avoid heavy machinery on wet fields.'",
+        "window": ("CURRENT_DATE", "CURRENT_DATE + 5"),
+        "impact": "LEAST(100, 40 + (precipitation_7d - 50) / 2)",
+        "datasets": ["POWER", "SMAP"],
+    },
+]
+
+
+def _rule_select(rule):
+    window_start, window_end = rule["window"]
+    return sql.SQL("""
+        SELECT user_id, {title}, ({description})::text, {type}, {priority}, {datasets}::jsonb,
+               ({window_start})::date, ({window_end})::date,
+               ROUND(GREATEST(0, LEAST(100, {impact}))::numeric, 2)
+        FROM features
+        WHERE {when}
+    """).format(
+        title=sql.Literal(rule["title"]),
+        description=sql.SQL(rule["description"]),
+        type=sql.Literal(rule["type"]),
+        priority=sql.Literal(rule["priority"]),
+        datasets=sql.Literal(json.dumps(rule["datasets"])),
+        window_start=sql.SQL(window_start),
+        window_end=sql.SQL(window_end),
+        impact=sql.SQL(rule["impact"]),
+        when=sql.SQL(rule["when"]),
+    )
+
+
+def build_generate_query(rules=RULES):
+    """
+    One statement that evaluates every rule for every user, upserts the
+    hits, expires engine rows that no longer fire and returns
+    (upserted, expired) counts and the ids of the users it touched.
+    """
+    return sql.SQL("""
+        WITH {features},
+        fired (user_id, title, description, recommendation_type, priority, nasa_datasets_used,
+               time_window_start, time_window_end, expected_impact_score) AS (
+            {selects}
+        ),
+        upserted AS (
+            INSERT INTO nasa_ai_recommendations (user_id, title, description, recommendation_type, priority,
+                                                 nasa_datasets_used, time_window_start, time_window_end,
+                                                 expected_impact_score, status)
+            SELECT user_id, title, description, recommendation_type, priority, nasa_datasets_used,
+                   time_window_start, time_window_end, expected_impact_score, 'active'
+            FROM fired
+            ON CONFLICT (user_id, title) DO UPDATE SET
+                description = EXCLUDED.description,
+                recommendation_type = EXCLUDED.recommendation_type,
+                priority = EXCLUDED.priority,
+                nasa_datasets_used = EXCLUDED.nasa_datasets_used,
+                time_window_start = EXCLUDED.time_window_start,
+                time_window_end = EXCLUDED.time_window_end,
+                expected_impact_score = EXCLUDED.expected_impact_score,
+                status = CASE WHEN nasa_ai_recommendations.status = 'dismissed'
+                              THEN 'dismissed' ELSE 'active' END
+            RETURNING user_id
+        ),
+        expired AS (
+            UPDATE nasa_ai_recommendations r
+            SET status = 'expired'
+            WHERE r.title IN ({titles})
+                AND r.status = 'active'
+                AND NOT EXISTS (
+                    SELECT 1 FROM fired f
+                    WHERE f.user_id = r.user_id AND f.title = r.title
+                )
+            RETURNING r.user_id
+        )
+        SELECT (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM expired),
+               ARRAY(SELECT user_id::text FROM upserted UNION SELECT user_id::text FROM expired)
+    """).format(
+        features=sql.SQL(FEATURES_CTE.strip()),
+        selects=sql.SQL(" UNION ALL ").join(_rule_select(rule) for rule in rules),
+        titles=sql.SQL(", ").join(sql.Literal(rule["title"]) for rule in rules),
+    )
+
+
+def generate_recommendations(conn, rules=RULES):
+    """
+    Evaluates `rules` for all users in one pass and expires engine
+    recommendations that no longer fire. Returns {"upserted", "expired"}.
+    """
+    with conn.cursor() as cur:
+        cur.execute(build_generate_query(rules))
+        upserted, expired, user_ids = cur.fetchone()
+        mark_users_changed(cur, user_ids)
+    conn.commit()
+    return {"upserted": upserted, "expired": expired}
@@ -0,0 +1,395 @@
+"""
+Background NASA refresh scheduler backed by a job table in Postgres.
+
+Each POWER grid cell with farms in it has one recurring row in
+nasa_refresh_jobs. schedule_jobs() keeps those rows in step with the
+users table and sets each job's priority: cells with a recently signed-in
+farmer (users.last_active_at within ACTIVE_DAYS) come first, then cells
+whose data is most days behind. Workers claim the highest-priority due
+job with FOR UPDATE SKIP LOCKED, so any number of worker threads and
+processes can share the queue without handing out a job twice. The claim
+is committed straight away and the POWER fetch runs without holding a
+connection; a lease (locked_at) lets schedule_jobs() requeue jobs whose
+worker died.
+
+A job that succeeds becomes due again REFRESH_INTERVAL_SECONDS later.
+Failures retry with exponential backoff plus jitter, and after
+max_attempts the job is dead-lettered (status 'dead', last_error kept)
+until `flask refresh-jobs --requeue-dead`.
+
+Run with `flask refresh-scheduler [--workers 8] [--until-idle]`.
+"""
+import os
+import random
+import socket
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from db import db_connection
+from power_cache import snap_to_cell
+
+SCHEDULER_WORKERS = int(os.getenv("NASA_SCHEDULER_WORKERS", "8"))
+# How often the job table is resynced with users and reprioritised
+SCHEDULE_INTERVAL_SECONDS = float(os.getenv("NASA_SCHEDULE_INTERVAL_SECONDS", "300"))
+# How long a worker sleeps when no job is due
+POLL_SECONDS = float(os.getenv("NASA_SCHEDULER_POLL_SECONDS", "5"))
+# A successfully refreshed cell is due again after this long
+REFRESH_INTERVAL_SECONDS = int(os.getenv("NASA_REFRESH_INTERVAL_SECONDS", str(6 * 3600)))
+# A running job whose worker has not finished within this is handed out again
+LEASE_SECONDS = int(os.getenv("NASA_JOB_LEASE_SECONDS", "600"))
+MAX_ATTEMPTS = int(os.getenv("NASA_JOB_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("NASA_JOB_RETRY_BASE_SECONDS", "60"))
+RETRY_MAX_SECONDS = float(os.getenv("NASA_JOB_RETRY_MAX_SECONDS", "3600"))
+# Farmers who signed in within this many days make their cell "active"
+ACTIVE_DAYS = int(os.getenv("NASA_ACTIVE_DAYS", "7"))
+# Added to an active cell's priority; larger than any staleness in days
+ACTIVE_PRIORITY = 1000
+
+# Serialises schedule_jobs() across processes
+SCHEDULE_LOCK_KEY = 7301
+
+Job = namedtuple("Job", ["id", "cell_latitude", "cell_longitude", "user_ids", "attempts", "max_attempts"])
+
+SCHEDULE_USERS_QUERY = """
+    SELECT u.id, u.farm_latitude, u.farm_longitude, lc.last_complete, u.last_active_at >= %(active_since)s
+    FROM users u
+    JOIN ({last_complete}) AS lc (user_id, last_complete) ON lc.user_id = u.id
+    WHERE u.farm_latitude IS NOT NULL AND u.farm_longitude IS NOT NULL
+"""
+
+# Only rows whose users or priority changed are rewritten
+UPSERT_JOBS_QUERY = """
+    INSERT INTO nasa_refresh_jobs (cell_latitude, cell_longitude, user_ids, priority, max_attempts)
+    VALUES %s
+    ON CONFLICT (cell_latitude, cell_longitude) DO UPDATE SET
+        user_ids = EXCLUDED.user_ids,
+        priority = EXCLUDED.priority,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (nasa_refresh_jobs.user_ids, nasa_refresh_jobs.priority)
+        IS DISTINCT FROM (EXCLUDED.user_ids, EXCLUDED.priority)
+"""
+
+# Jobs of cells that no longer have any farms
+DELETE_VANISHED_JOBS_QUERY = """
+    DELETE FROM nasa_refresh_jobs j
+    WHERE j.status <> 'running'
+        AND NOT EXISTS (
+            SELECT 1 FROM unnest(%s::numeric[], %s::numeric[]) AS c (lat, lon)
+            WHERE c.lat = j.cell_latitude AND c.lon = j.cell_longitude
+        )
+"""
+
+REQUEUE_EXPIRED_QUERY = """
+    UPDATE nasa_refresh_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+        last_error = COALESCE(last_error, 'lease expired'),
+        run_after = CURRENT_TIMESTAMP,
+        locked_by = NULL,
+        locked_at = NULL,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE status = 'running' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+"""
+
+# Served by idx_nasa_refresh_jobs_due; SKIP LOCKED passes over rows other
+# workers are claiming right now instead of queueing behind them
+CLAIM_JOB_QUERY = """
+    UPDATE nasa_refresh_jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = %(worker)s,
+        locked_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT id FROM nasa_refresh_jobs
+        WHERE status = 'pending' AND run_after <= CURRENT_TIMESTAMP
+        ORDER BY priority DESC
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ) next
+    WHERE j.id = next.id
+    RETURNING j.id, j.cell_latitude, j.cell_longitude, j.user_ids::text[], j.attempts, j.max_attempts
+"""
+
+# Last complete day of each of a job's users, as in LAST_COMPLETE_DATES_QUERY
+# but with backward index scans per user instead of aggregating every user
+JOB_USERS_QUERY = """
+    SELECT u.id,
+           CASE WHEN w.last_date IS NULL OR s.last_date IS NULL THEN NULL
+                ELSE LEAST(w.last_date, s.last_date) END
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT MAX(date) AS last_date FROM nasa_weather_data
+        WHERE user_id = u.id AND temperature_2m_avg IS NOT NULL
+    ) w ON TRUE
+    LEFT JOIN farm_zones fz ON fz.user_id = u.id AND fz.zone_name = 'Default'
+    LEFT JOIN LATERAL (
+        SELECT MAX(date) AS last_date FROM nasa_soil_data
+        WHERE user_id = u.id AND zone_id = fz.id AND soil_temperature_0_5cm IS NOT NULL
+    ) s ON TRUE
+    WHERE u.id = ANY(%s::uuid[]) AND u.farm_latitude IS NOT NULL AND u.farm_longitude IS NOT NULL
+"""
+
+# The locked_by check drops results of a worker whose lease already expired
+COMPLETE_JOB_QUERY = """
+    UPDATE nasa_refresh_jobs
+    SET status = 'pending',
+        attempts = 0,
+        run_after = CURRENT_TIMESTAMP + %(interval)s * INTERVAL '1 second',
+        last_succeeded_at = CURRENT_TIMESTAMP,
+        last_error = NULL,
+        locked_by = NULL,
+        locked_at = NULL,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s AND locked_by = %(worker)s
+"""
+
+FAIL_JOB_QUERY = """
+    UPDATE nasa_refresh_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+        run_after = CURRENT_TIMESTAMP + %(delay)s * INTERVAL '1 second',
+        last_error = %(error)s,
+        locked_by = NULL,
+        locked_at = NULL,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s AND locked_by = %(worker)s
+    RETURNING status
+"""
+
+
+def _priority(staleness_days, active_users):
+    return (ACTIVE_PRIORITY if active_users else 0) + staleness_days
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for a job that has failed `attempts` times."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def schedule_jobs(conn):
+    """
+    Creates, updates and removes job rows so there is one per grid cell
+    with farms, prioritised by activity and staleness, and requeues jobs
+    whose lease expired. Returns counts, or None if another process is
+    scheduling at the same moment.
+    """
+    # Imported lazily: nasa_data_model requires NASA_API_KEY at import time
+    from data_orchestrator import HISTORY_DAYS, LAST_COMPLETE_DATES_QUERY
+
+    today = date.today()
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (SCHEDULE_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return None
+
+        cur.execute(SCHEDULE_USERS_QUERY.format(last_complete=LAST_COMPLETE_DATES_QUERY),
+                    {"active_since": datetime.now() - timedelta(days=ACTIVE_DAYS)})
+        cells = defaultdict(lambda: {"user_ids": [], "staleness": 0, "active": 0})
+        for user_id, latitude, longitude, last_complete, active in cur.fetchall():
+            cell = cells[snap_to_cell(latitude, longitude)]
+            cell["user_ids"].append(str(user_id))
+            staleness = (today - last_complete).days if last_complete else HISTORY_DAYS
+            cell["staleness"] = max(cell["staleness"], min(staleness, HISTORY_DAYS))
+            cell["active"] += bool(active)
+
+        # Sorted so concurrent upserts of the same rows cannot deadlock
+        rows = [
+            (lat, lon, sorted(cell["user_ids"]), _priority(cell["staleness"], cell["active"]), MAX_ATTEMPTS)
+            for (lat, lon), cell in sorted(cells.items())
+        ]
+        upserted = 0
+        if rows:
+            execute_values(cur, UPSERT_JOBS_QUERY, rows, template="(%s, %s, %s::uuid[], %s, %s)", page_size=1000)
+            upserted = cur.rowcount
+        cur.execute(DELETE_VANISHED_JOBS_QUERY, ([row[0] for row in rows], [row[1] for row in rows]))
+        removed = cur.rowcount
+        cur.execute(REQUEUE_EXPIRED_QUERY, (LEASE_SECONDS,))
+        requeued = cur.rowcount
+    conn.commit()
+    return {
+        "cells": len(rows),
+        "active_cells": sum(1 for cell in cells.values() if cell["active"]),
+        "jobs_written": upserted,
+        "jobs_removed": removed,
+        "leases_expired": requeued,
+    }
+
+
+def claim_job(worker_id):
+    """Claims the highest-priority due job for `worker_id`, or returns None if none is due."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute(CLAIM_JOB_QUERY, {"worker": worker_id})
+        row = cur.fetchone()
+        conn.commit()
+    if row is None:
+        return None
+    job_id, lat, lon, user_ids, attempts, max_attempts = row
+    return Job(job_id, float(lat), float(lon), user_ids, attempts, max_attempts)
+
+
+def run_job(job, worker_id):
+    """
+    Refreshes one cell for every user in it, then records success or
+    schedules a retry. Returns "done", "retry" or "dead".
+    """
+    # Imported lazily: nasa_data_model requires NASA_API_KEY at import time
+    from data_orchestrator import _refresh_cell, _refresh_start_date
+
+    error = None
+    try:
+        with db_connection(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute(JOB_USERS_QUERY, (job.user_ids,))
+            user_rows = cur.fetchall()
+        end_date = date.today()
+        users = [
+            (str(user_id), _refresh_start_date(end_date, last_complete, True).strftime("%Y%m%d"))
+            for user_id, last_complete in user_rows
+        ]
+        if users:
+            written, _, _ = _refresh_cell((job.cell_latitude, job.cell_longitude), users, end_date.strftime("%Y%m%d"))
+            if not written:
+                error = "POWER fetch failed"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    with db_connection() as conn, conn.cursor() as cur:
+        if error is None:
+            cur.execute(COMPLETE_JOB_QUERY, {"id": job.id, "worker": worker_id, "interval": REFRESH_INTERVAL_SECONDS})
+            outcome = "done"
+        else:
+            cur.execute(FAIL_JOB_QUERY, {
+                "id": job.id,
+                "worker": worker_id,
+                "delay": retry_delay(job.attempts),
+                "error": error[:1000],
+            })
+            row = cur.fetchone()
+            outcome = "dead" if row and row[0] == "dead" else "retry"
+            print(f"Refresh job {job.id} for cell ({job.cell_latitude}, {job.cell_longitude}) "
+                  f"failed (attempt {job.attempts}/{job.max_attempts}, {outcome}): {error}")
+        conn.commit()
+    return outcome
+
+
+def _worker_loop(worker_id, stop, until_idle, counts, lock):
+    while not stop.is_set():
+        try:
+            job = claim_job(worker_id)
+        except Exception as e:
+            print(f"Refresh worker {worker_id} could not claim a job: {str(e)}")
+            job = None
+        if job is None:
+            if until_idle:
+                return
+            stop.wait(POLL_SECONDS)
+            continue
+        try:
+            outcome = run_job(job, worker_id)
+        except Exception as e:
+            # Could not record the outcome; the lease expiry requeues the job
+            print(f"Refresh worker {worker_id} lost job {job.id}: {str(e)}")
+            outcome = "lost"
+        with lock:
+            counts[outcome] += 1
+
+
+def run_scheduler(workers=SCHEDULER_WORKERS, until_idle=False, stop=None):
+    """
+    Schedules jobs and runs `workers` worker threads until `stop` is set,
+    rescheduling every SCHEDULE_INTERVAL_SECONDS. With until_idle the
+    workers exit once no job is due and the run ends. Returns a report.
+    """
+    stop = stop or threading.Event()
+    started = time.perf_counter()
+    with db_connection() as conn:
+        scheduled = schedule_jobs(conn)
+
+    counts = defaultdict(int)
+    lock = threading.Lock()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=_worker_loop, args=(f"{prefix}:{n}", stop, until_idle, counts, lock),
+                         name=f"refresh-worker-{n}", daemon=True)
+        for n in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"Refresh scheduler started with {workers} workers: {scheduled}")
+
+    next_schedule = time.monotonic() + SCHEDULE_INTERVAL_SECONDS
+    while any(thread.is_alive() for thread in threads) and not stop.is_set():
+        stop.wait(min(1.0, max(0.0, next_schedule - time.monotonic())))
+        if time.monotonic() >= next_schedule and not until_idle:
+            try:
+                with db_connection() as conn:
+                    scheduled = schedule_jobs(conn) or scheduled
+            except Exception as e:
+                print(f"Error scheduling refresh jobs: {str(e)}")
+            next_schedule = time.monotonic() + SCHEDULE_INTERVAL_SECONDS
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    seconds = time.perf_counter() - started
+    jobs = sum(counts.values())
+    return {
+        "workers": workers,
+        "scheduled": scheduled,
+        "jobs": jobs,
+        "done": counts["done"],
+        "retried": counts["retry"],
+        "dead_lettered": counts["dead"],
+        "lost": counts["lost"],
+        "seconds": round(seconds, 3),
+        "jobs_per_second": round(jobs / seconds, 2) if seconds else 0.0,
+    }
+
+
+def queue_stats(cur):
+    """Job counts by status, the due backlog and the most recent dead letters."""
+    cur.execute("""
+        SELECT status, COUNT(*),
+               COUNT(*) FILTER (WHERE status = 'pending' AND run_after <= CURRENT_TIMESTAMP),
+               EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(run_after) FILTER (
+                   WHERE status = 'pending' AND run_after <= CURRENT_TIMESTAMP))
+        FROM nasa_refresh_jobs
+        GROUP BY status
+    """)
+    by_status = {}
+    due = 0
+    oldest_due_seconds = None
+    for status, count, status_due, oldest in cur.fetchall():
+        by_status[status] = count
+        due += status_due
+        if oldest is not None:
+            oldest_due_seconds = round(float(oldest), 1)
+    cur.execute("""
+        SELECT cell_latitude, cell_longitude, attempts, last_error, updated_at
+        FROM nasa_refresh_jobs
+        WHERE status = 'dead'
+        ORDER BY updated_at DESC
+        LIMIT 10
+    """)
+    dead = [
+        {"cell": [float(lat), float(lon)], "attempts": attempts, "error": error, "at": at.isoformat()}
+        for lat, lon, attempts, error, at in cur.fetchall()
+    ]
+    return {"by_status": by_status, "due": due, "oldest_due_seconds": oldest_due_seconds, "recent_dead": dead}
+
+
+def requeue_dead_jobs(conn):
+    """Gives every dead-lettered job a fresh set of attempts. Returns how many."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE nasa_refresh_jobs
+            SET status = 'pending', attempts = 0, run_after = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'dead'
+        """)
+        requeued = cur.rowcount
+    conn.commit()
+    return requeued
@@ -0,0 +1,243 @@
+"""
+Per-user response cache for the read endpoints.
+
+NASA data changes at most once a day, so per-user read responses can be
+reused for a while and revalidated cheaply with ETag / Last-Modified.
+
+Each API process has its own cache, while most writes happen in other
+processes (`flask refresh-nasa`, the refresh scheduler, backfills and the
+nightly batch jobs). Writers therefore stamp the users they touched in
+user_data_changes, in the same transaction as their data, with
+mark_users_changed(). Every API process polls that table at most once per
+RESPONSE_CACHE_SYNC_SECONDS while serving cached routes and drops the
+affected entries, so a response is stale for at most about that long after
+a commit. Writers in the API process itself also call invalidate_user(),
+which takes effect at once. If the poll fails the TTL still bounds
+staleness.
+
+Entries are keyed by the id the client asked with, which may be the users
+UUID or the legacy id, but remember both ids of the resolved identity, so
+invalidating either drops them.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import psycopg2
+from flask import current_app, g, request
+
+from db import PoolTimeoutError, db_connection
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_SYNC_SECONDS = float(os.getenv("RESPONSE_CACHE_SYNC_SECONDS", "5"))
+# Stamps are taken just before their transaction commits; polls re-read this
+# far back so a stamp committed after a poll already passed its time is
+# still seen
+SYNC_OVERLAP_SECONDS = 60
+
+MARK_CHANGED_QUERY = """
+    INSERT INTO user_data_changes (user_id, changed_at)
+    SELECT uid, clock_timestamp() FROM unnest(%s::uuid[]) AS uid
+    ORDER BY uid
+    ON CONFLICT (user_id) DO UPDATE SET changed_at = EXCLUDED.changed_at
+"""
+CHANGES_QUERY = """
+    SELECT user_id::text, changed_at FROM user_data_changes WHERE changed_at > %s
+"""
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of serialized 200 responses keyed by (endpoint,
+    requested user id, query args), with a TTL.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL_SECONDS, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["expires_at"] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype, user_ids=()):
+        """`user_ids`: every id of the user besides the requested one (key[1])."""
+        entry = {
+            "user_ids": frozenset(str(user_id) for user_id in user_ids if user_id) | {key[1]},
+            "body": body,
+            "mimetype": mimetype,
+            "etag": hashlib.sha1(body).hexdigest(),
+            "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+            "expires_at": time.monotonic() + self.ttl,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate_user(self, *ids):
+        """Drops every cached response for the users with any of `ids`; returns how many were removed."""
+        ids = {str(value) for value in ids if value}
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if not ids.isdisjoint(entry["user_ids"])]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class ChangePoller:
+    """Applies the user_data_changes stamped by any process to a ResponseCache."""
+
+    def __init__(self, cache, interval=RESPONSE_CACHE_SYNC_SECONDS, overlap=SYNC_OVERLAP_SECONDS):
+        self.cache = cache
+        self.interval = interval
+        self.overlap = timedelta(seconds=overlap)
+        self._lock = threading.Lock()
+        self._next_poll = 0.0
+        self._since = None
+        # user_id -> changed_at already applied, for the stamps in the overlap
+        self._seen = {}
+        self.polls = 0
+        self.errors = 0
+        self.users_changed = 0
+
+    def poll_if_due(self):
+        """Polls unless another thread is, or the last poll was under `interval` ago."""
+        if time.monotonic() < self._next_poll or not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            if time.monotonic() < self._next_poll:
+                return 0
+            self._next_poll = time.monotonic() + self.interval
+            return self.poll()
+        except (psycopg2.Error, PoolTimeoutError) as e:
+            self.errors += 1
+            print(f"Response cache change poll failed: {str(e)}")
+            return 0
+        finally:
+            self._lock.release()
+
+    def poll(self):
+        """Invalidates the users stamped since the previous poll; returns how many."""
+        with db_connection(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT clock_timestamp()")
+            polled_at = cur.fetchone()[0]
+            cur.execute(CHANGES_QUERY, (self._since or polled_at - self.overlap,))
+            rows = dict(cur.fetchall())
+        changed = [user_id for user_id, changed_at in rows.items() if self._seen.get(user_id) != changed_at]
+        if changed:
+            self.cache.invalidate_user(*changed)
+        # The next window starts inside this one, so these rows cover it
+        self._seen = rows
+        self._since = polled_at - self.overlap
+        self.polls += 1
+        self.users_changed += len(changed)
+        return len(changed)
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval,
+            "polls": self.polls,
+            "errors": self.errors,
+            "users_changed": self.users_changed,
+        }
+
+
+response_cache = ResponseCache()
+change_poller = ChangePoller(response_cache)
+
+
+def invalidate_user(*ids):
+    """
+    Hook for writers to call after committing new data for a user, with
+    any of their ids. Only affects the cache of the calling process; see
+    mark_users_changed() for the others.
+    """
+    return response_cache.invalidate_user(*ids)
+
+
+def mark_users_changed(cur, user_ids):
+    """
+    Stamps users (users.id UUIDs) whose cached responses are now stale, for
+    every API process to pick up. Call it last before the commit of the
+    writes; rows are locked in id order so concurrent writers can't deadlock.
+    """
+    user_ids = sorted({str(user_id) for user_id in user_ids})
+    if user_ids:
+        cur.execute(MARK_CHANGED_QUERY, (user_ids,))
+
+
+def _conditional_response(entry):
+    response = current_app.response_class(entry["body"], status=200, mimetype=entry["mimetype"])
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["last_modified"]
+    response.cache_control.private = True
+    response.cache_control.max_age = response_cache.ttl
+    # Turns the response into a 304 when If-None-Match / If-Modified-Since match
+    return response.make_conditional(request)
+
+
+def cached_per_user(view):
+    """
+    Caches a GET view taking user_id. Only 200 responses are stored; every
+    served response carries ETag and Last-Modified and honours conditional
+    requests with 304 Not Modified. Views set g.identity to the resolved
+    Identity so the entry can be invalidated by either of the user's ids.
+    """
+    @wraps(view)
+    def wrapper(user_id, *args, **kwargs):
+        change_poller.poll_if_due()
+        # Views with query parameters cache one entry per distinct query
+        key = (view.__name__, str(user_id), tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.get(key)
+        if entry is None:
+            response = current_app.make_response(view(user_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+            identity = g.get("identity")
+            user_ids = (identity.user_id, identity.legacy_id) if identity else ()
+            entry = response_cache.put(key, response.get_data(), response.mimetype, user_ids)
+        return _conditional_response(entry)
+    return wrapper
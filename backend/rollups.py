@@ -0,0 +1,229 @@
+"""
+Weekly and monthly rollups of the daily NASA and farm-health tables.
+
+nasa_weekly_rollups (ISO weeks, from Monday) and nasa_monthly_rollups hold
+per user and period the min/max/mean of each daily measure. Precipitation
+and ETo also get sums. Each source also records how many days it
+contributed. Runs are incremental, like the farm-health scorer: only
+periods containing a row whose updated_at moved since the last run's
+watermark are recomputed, from that period's raw rows, so work scales with
+new data.
+
+Raw months live in monthly partitions (partitions.py). A period is only
+recomputed while every month it overlaps still has its partition, so the
+rollups of dropped months are final. drop_rolled_up_partitions() is the
+retention policy: raw months older than NASA_RAW_RETENTION_MONTHS are
+dropped once no row in them is newer than the rollup watermark.
+
+Run nightly after `flask score-farm-health` with `flask nasa-partitions`,
+which creates upcoming partitions, rolls up and applies retention.
+"""
+import os
+from datetime import date, timedelta
+
+from partitions import PARTITIONED_TABLES, add_months, drop_month, list_partition_months, month_start
+from response_cache import mark_users_changed
+from watermarks import get_watermark, set_watermark
+
+JOB_NAME = "nasa_rollups"
+RETENTION_MONTHS = int(os.getenv("NASA_RAW_RETENTION_MONTHS", "24"))
+# Same overlap as the farm-health scorer: rows committed by concurrent
+# writers can carry timestamps slightly older than our watermark
+WATERMARK_LAG_SECONDS = int(os.getenv("NASA_ROLLUP_WATERMARK_LAG_SECONDS", "300"))
+
+# rollup table: date_trunc() unit
+ROLLUP_TABLES = {"nasa_weekly_rollups": "week", "nasa_monthly_rollups": "month"}
+
+# (rollup column, aggregate over the source rows of one user and period)
+# Temperature extremes come from the daily T2M_MIN / T2M_MAX. Days stored
+# before those columns existed only have their mean, which is then the
+# closest bound left.
+WEATHER_AGGREGATES = [
+    ("weather_days", "COUNT(*)"),
+    ("temperature_min", "MIN(COALESCE(temperature_2m_min, temperature_2m_avg))"),
+    ("temperature_max", "MAX(COALESCE(temperature_2m_max, temperature_2m_avg))"),
+    ("temperature_mean", "AVG(temperature_2m_avg)"),
+    ("precipitation_sum", "SUM(precipitation)"),
+    ("precipitation_max", "MAX(precipitation)"),
+    ("eto_sum", "SUM(eto)"),
+]
+# Soil has a row per zone and day; means and extremes span all zones
+SOIL_AGGREGATES = [
+    ("soil_days", "COUNT(DISTINCT date)"),
+    ("soil_moisture_min", "MIN(soil_moisture_0_5cm)"),
+    ("soil_moisture_max", "MAX(soil_moisture_0_5cm)"),
+    ("soil_moisture_mean", "AVG(soil_moisture_0_5cm)"),
+    ("soil_temperature_min", "MIN(soil_temperature_0_5cm)"),
+    ("soil_temperature_max", "MAX(soil_temperature_0_5cm)"),
+    ("soil_temperature_mean", "AVG(soil_temperature_0_5cm)"),
+    ("surface_wetness_mean", "AVG(surface_wetness)"),
+]
+VEGETATION_AGGREGATES = [
+    ("vegetation_days", "COUNT(*)"),
+    ("crop_health_mean", "AVG(crop_health_score)"),
+    ("vegetation_density_mean", "AVG(vegetation_density)"),
+]
+HEALTH_AGGREGATES = [
+    ("health_days", "COUNT(*)"),
+    ("overall_health_min", "MIN(overall_health_score)"),
+    ("overall_health_max", "MAX(overall_health_score)"),
+    ("overall_health_mean", "AVG(overall_health_score)"),
+]
+# (CTE alias, source table, aggregates)
+SOURCES = [
+    ("weather", "nasa_weather_data", WEATHER_AGGREGATES),
+    ("soil", "nasa_soil_data", SOIL_AGGREGATES),
+    ("vegetation", "nasa_vegetation_data", VEGETATION_AGGREGATES),
+    ("health", "farm_health_metrics", HEALTH_AGGREGATES),
+]
+DAY_COUNT_COLUMNS = {"weather_days", "soil_days", "vegetation_days", "health_days"}
+
+
+def _source_cte(alias, table, aggregates, unit):
+    columns = ",\n               ".join(f"{expr} AS {column}" for column, expr in aggregates)
+    return f"""
+    {alias} AS (
+        SELECT src.user_id, date_trunc('{unit}', src.date)::date AS period_start,
+               {columns}
+        FROM {table} src
+        JOIN bounds b ON b.user_id = src.user_id AND src.date >= b.from_date AND src.date < b.to_date
+        -- Constant bounds, so only the touched months' partitions are planned and scanned
+        WHERE src.date >= %(from_date)s AND src.date < %(to_date)s
+        GROUP BY 1, 2
+    )"""
+
+
+# Changed (user, date) pairs, collected once for both rollup queries
+CHANGED_QUERY = "CREATE TEMP TABLE rollup_changed ON COMMIT DROP AS\n" + "\nUNION\n".join(
+    f"SELECT user_id, date FROM {source} WHERE updated_at > %(since)s" for _, source, _ in SOURCES
+)
+
+
+def _rollup_query(table, unit):
+    ctes = ",".join(_source_cte(alias, source, aggregates, unit) for alias, source, aggregates in SOURCES)
+    columns = [column for _, _, aggregates in SOURCES for column, _ in aggregates]
+    values = [
+        f"COALESCE({alias}.{column}, 0)" if column in DAY_COUNT_COLUMNS else f"{alias}.{column}"
+        for alias, _, aggregates in SOURCES for column, _ in aggregates
+    ]
+    joins = "\n    ".join(
+        f"LEFT JOIN {alias} ON {alias}.user_id = p.user_id AND {alias}.period_start = p.period_start"
+        for alias, _, _ in SOURCES
+    )
+    assignments = ",\n        ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+    return f"""
+    -- Periods with a changed day, as long as all their months are still stored raw
+    WITH periods AS (
+        SELECT DISTINCT user_id, date_trunc('{unit}', date)::date AS period_start
+        FROM rollup_changed
+    ),
+    complete AS (
+        SELECT user_id, period_start FROM periods
+        WHERE date_trunc('month', period_start)::date = ANY(%(months)s::date[])
+          AND date_trunc('month', period_start + INTERVAL '1 {unit}' - INTERVAL '1 day')::date
+              = ANY(%(months)s::date[])
+    ),
+    bounds AS (
+        SELECT user_id, MIN(period_start) AS from_date,
+               (MAX(period_start) + INTERVAL '1 {unit}')::date AS to_date
+        FROM complete GROUP BY user_id
+    ),{ctes}
+    INSERT INTO {table} (user_id, period_start, {", ".join(columns)})
+    SELECT p.user_id, p.period_start,
+           {", ".join(values)}
+    FROM complete p
+    {joins}
+    ON CONFLICT (user_id, period_start) DO UPDATE SET
+        {assignments},
+        updated_at = CURRENT_TIMESTAMP
+    """
+
+
+ROLLUP_QUERIES = {table: _rollup_query(table, unit) for table, unit in ROLLUP_TABLES.items()}
+
+
+def _period_range(unit, first_day, last_day):
+    """[start of first_day's period, start of the period after last_day's)."""
+    if unit == "week":
+        return first_day - timedelta(days=first_day.weekday()), last_day + timedelta(days=7 - last_day.weekday())
+    return month_start(first_day), add_months(month_start(last_day), 1)
+
+
+def refresh_rollups(conn, full=False):
+    """
+    Recomputes every weekly and monthly period with rows changed since the
+    last run, or all stored history with full=True, and advances the
+    watermark in the same transaction.
+    Returns {"periods": {table: rows}, "since", "watermark"}.
+    """
+    periods = {}
+    with conn.cursor() as cur:
+        since = None if full else get_watermark(cur, JOB_NAME)
+        cur.execute("SELECT statement_timestamp()::timestamp")
+        run_started = cur.fetchone()[0]
+
+        scan_from = since - timedelta(seconds=WATERMARK_LAG_SECONDS) if since else "-infinity"
+        cur.execute(CHANGED_QUERY, {"since": scan_from})
+        cur.execute("SELECT MIN(date), MAX(date) FROM rollup_changed")
+        first_changed, last_changed = cur.fetchone()
+        months = list_partition_months(cur)
+        for table, query in ROLLUP_QUERIES.items():
+            if first_changed is None:
+                periods[table] = 0
+                continue
+            from_date, to_date = _period_range(ROLLUP_TABLES[table], first_changed, last_changed)
+            cur.execute(query, {"months": months, "from_date": from_date, "to_date": to_date})
+            periods[table] = cur.rowcount
+        if first_changed is not None:
+            cur.execute("SELECT DISTINCT user_id FROM rollup_changed")
+            mark_users_changed(cur, [row[0] for row in cur.fetchall()])
+        set_watermark(cur, JOB_NAME, run_started)
+    conn.commit()
+    return {
+        "periods": periods,
+        "since": since.isoformat() if since else None,
+        "watermark": run_started.isoformat(),
+    }
+
+
+def _has_rows_after(cur, table, month, rolled_up_before):
+    cur.execute(f"""
+        SELECT EXISTS (
+            SELECT 1 FROM {table}
+            WHERE date >= %(month)s AND date < %(next_month)s AND updated_at > %(rolled_up_before)s
+        )
+    """, {"month": month, "next_month": add_months(month, 1), "rolled_up_before": rolled_up_before})
+    return cur.fetchone()[0]
+
+
+def drop_rolled_up_partitions(conn, retention_months=RETENTION_MONTHS, dry_run=False):
+    """
+    Drops the raw partitions of months that ended more than retention_months
+    ago, if the rollups already cover every row in them. Each month is
+    dropped in its own transaction. Returns {"cutoff", "dropped",
+    "not_rolled_up", "dry_run"}.
+    """
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    report = {"cutoff": cutoff.isoformat(), "dropped": [], "not_rolled_up": [], "dry_run": dry_run}
+    with conn.cursor() as cur:
+        watermark = get_watermark(cur, JOB_NAME)
+        expired = sorted({
+            month for table in PARTITIONED_TABLES for month in list_partition_months(cur, table) if month < cutoff
+        })
+    conn.rollback()
+    if watermark is None:
+        report["not_rolled_up"] = [month.isoformat() for month in expired]
+        return report
+
+    rolled_up_before = watermark - timedelta(seconds=WATERMARK_LAG_SECONDS)
+    for month in expired:
+        with conn.cursor() as cur:
+            if any(_has_rows_after(cur, table, month, rolled_up_before) for table in PARTITIONED_TABLES):
+                report["not_rolled_up"].append(month.isoformat())
+                conn.rollback()
+                continue
+            if not dry_run:
+                drop_month(cur, month)
+        conn.commit()
+        report["dropped"].append(month.isoformat())
+    return report
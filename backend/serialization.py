@@ -0,0 +1,104 @@
+"""
+JSON serialization for every jsonify() response.
+
+init_app() installs FastJSONProvider as the app's JSON provider. It
+serializes with orjson when that is installed, and with the stdlib json
+module otherwise (or when JSON_SERIALIZER=json). Both backends write
+Decimal as a number, date/datetime as ISO 8601 and UUID as a string, so
+loaders can hand cursor values through unconverted. records() maps
+result rows to objects with one dict(zip()) per row instead of building
+each field by hand.
+
+Read paths whose values only end up in JSON call numeric_as_float() on
+their cursor, so psycopg2 parses NUMERIC straight to float. orjson then
+encodes every value natively instead of calling back into Python for
+each Decimal.
+"""
+import json
+import os
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from psycopg2 import extensions
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "auto")  # auto, orjson or json
+
+
+def _default(value):
+    """Types neither encoder handles on its own (orjson already covers date and UUID)."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+NUMERIC_AS_FLOAT = extensions.new_type(
+    extensions.DECIMAL.values, "NUMERIC_AS_FLOAT",
+    lambda value, cur: float(value) if value is not None else None,
+)
+
+
+def numeric_as_float(cur):
+    """Makes `cur` return NUMERIC/DECIMAL columns as float instead of Decimal."""
+    extensions.register_type(NUMERIC_AS_FLOAT, cur)
+    return cur
+
+
+def records(rows, keys):
+    """Cursor rows as JSON objects with `keys`, values left for the encoder to convert."""
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def use_orjson():
+    if JSON_SERIALIZER == "orjson" and orjson is None:
+        raise RuntimeError("JSON_SERIALIZER=orjson but orjson is not installed")
+    return orjson is not None and JSON_SERIALIZER != "json"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when available."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = use_orjson()
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for other encoder settings get the stdlib encoder
+        if self.fast and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode()
+        kwargs.setdefault("default", _default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.fast:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Straight to bytes, skipping the str round trip
+        body = orjson.dumps(obj, default=_default, option=self._orjson_options(indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+    return app.json
@@ -0,0 +1,6 @@
+# Lets the tests import the backend's flat modules (db, query_plans, ...) the
+# way app.py does, whichever directory pytest is started from.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
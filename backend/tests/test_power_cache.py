@@ -0,0 +1,70 @@
+"""PowerCache row accounting and LRU eviction, on throwaway SQLite files."""
+import pytest
+
+import power_cache
+from power_cache import PowerCache, date_range
+
+DATES = list(date_range("20240101", "20240330"))
+
+
+def _days(dates, value=1.0):
+    return {date_str: {"T2M": value} for date_str in dates}
+
+
+def _table_rows(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM power_days").fetchone()[0]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "power_cache.sqlite3")
+
+
+def test_row_count_follows_new_and_replaced_days(path):
+    cache = PowerCache(path, max_days=1000)
+    cache.put_days("a", ["T2M"], _days(DATES[:30]))
+    cache.put_days("a", ["T2M"], _days(DATES[10:40], 2.0))
+    cache.put_days("a", ["T2M", "PS"], _days(DATES[:5]))
+
+    assert cache.stats()["cached_days"] == _table_rows(cache) == 45
+
+
+def test_count_is_read_at_open(path):
+    PowerCache(path).put_days("a", ["T2M"], _days(DATES[:20]))
+
+    assert PowerCache(path).stats()["cached_days"] == 20
+
+
+def test_stores_under_budget_do_not_count_the_table(path):
+    cache = PowerCache(path, max_days=1000)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for start in range(0, 60, 10):
+        cache.put_days("a", ["T2M"], _days(DATES[start:start + 10]))
+
+    assert not [statement for statement in statements if "COUNT(*)" in statement]
+
+
+def test_least_recently_used_days_are_evicted_over_budget(path):
+    cache = PowerCache(path, max_days=50)
+    cache.put_days("a", ["T2M"], _days(DATES[:40]))
+    cache.get_days("a", ["T2M"], DATES[:10])
+    cache.put_days("b", ["T2M"], _days(DATES[:20]))
+
+    assert cache.stats()["cached_days"] == _table_rows(cache) == 50
+    assert cache.evictions == 10
+    # The days just read survived; the oldest unread ones went
+    assert len(cache.get_days("a", ["T2M"], DATES[:10])) == 10
+    assert cache.get_days("a", ["T2M"], DATES[10:20]) == {}
+
+
+def test_rows_stored_by_other_processes_are_picked_up_by_the_recount(path, monkeypatch):
+    ours, theirs = PowerCache(path, max_days=50), PowerCache(path, max_days=50)
+    theirs.put_days("b", ["T2M"], _days(DATES[:40]))
+    ours.put_days("a", ["T2M"], _days(DATES[:20]))
+    assert _table_rows(ours) == 60
+
+    monkeypatch.setattr(power_cache, "CACHE_RECOUNT_SECONDS", 0)
+    ours.put_days("a", ["T2M"], _days(DATES[20:21]))
+
+    assert ours.stats()["cached_days"] == _table_rows(ours) == 50
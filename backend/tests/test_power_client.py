@@ -0,0 +1,85 @@
+"""
+PowerClient error handling against the local stub POWER server
+(benchmarks/stub_power_server.py): dropped bodies are retried, and every
+failure reaches callers as PowerAPIError.
+"""
+import os
+
+import pytest
+import requests
+
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+
+import nasa_data_model
+from benchmarks.stub_power_server import start_server
+from power_client import DAILY_POINT_PATH, PowerAPIError, PowerClient
+
+POINT_PARAMS = {"parameters": "T2M", "community": "AG", "latitude": -1.5, "longitude": 36.875,
+                "start": "20240501", "end": "20240503", "format": "JSON"}
+
+
+@pytest.fixture
+def stub():
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url, max_retries=2):
+    return PowerClient(base_url=base_url, max_retries=max_retries, backoff_base=0, rate_per_second=0)
+
+
+def test_body_dropped_mid_transfer_is_retried(stub):
+    stub.truncate_responses = 1
+    client = _client(stub.base_url)
+
+    parameter = client.daily_point(POINT_PARAMS)
+
+    assert sorted(parameter["T2M"]) == ["20240501", "20240502", "20240503"]
+    assert stub.calls[DAILY_POINT_PATH] == 2
+    assert client.stats()["retries"] == {"ChunkedEncodingError": 1}
+
+
+def test_bodies_dropped_on_every_attempt_raise_power_api_error(stub):
+    stub.truncate_responses = 10
+    client = _client(stub.base_url, max_retries=2)
+
+    with pytest.raises(PowerAPIError, match="Giving up after 3 attempts"):
+        client.daily_point(POINT_PARAMS)
+    assert stub.calls[DAILY_POINT_PATH] == 3
+    assert client.stats()["failures"] == 1
+
+
+def test_other_request_errors_raise_power_api_error_without_retrying(monkeypatch):
+    client = _client("http://127.0.0.1:9")
+    calls = []
+
+    def get(*args, **kwargs):
+        calls.append(args)
+        raise requests.exceptions.TooManyRedirects("Exceeded 30 redirects.")
+
+    monkeypatch.setattr(client.session, "get", get)
+
+    with pytest.raises(PowerAPIError, match="TooManyRedirects"):
+        client.daily_point(POINT_PARAMS)
+    assert len(calls) == 1
+
+
+def test_invalid_json_raises_power_api_error(monkeypatch):
+    client = _client("http://127.0.0.1:9")
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"properties": {"parameter": '
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: response)
+
+    with pytest.raises(PowerAPIError, match="invalid JSON"):
+        client.daily_point(POINT_PARAMS)
+
+
+def test_fetch_power_point_returns_none_when_bodies_keep_dropping(stub, monkeypatch):
+    stub.truncate_responses = 10
+    client = _client(stub.base_url, max_retries=1)
+    monkeypatch.setattr(nasa_data_model, "get_client", lambda: client)
+
+    assert nasa_data_model.fetch_power_point(-1.5, 36.875, "20240501", "20240503", ["T2M"]) is None
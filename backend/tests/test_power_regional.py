@@ -0,0 +1,227 @@
+"""
+Unit tests for regional POWER fetching: box planning, splitting a regional
+GeoJSON response back onto grid cells, and falling back to point calls.
+
+fixtures/power_regional_t2m_synthetic.json is SYNTHETIC, not a capture of
+the API. It was generated to follow POWER's documented regional JSON
+layout, as a T2M response for the box lat -2..0, lon 36.25..38.125 (around
+Nairobi) over 2024-05-01..03. Its values, elevations and grid points are
+made up. The 0.5 x 0.625 degree spacing, the [lon, lat, elevation]
+coordinate order, the single parameter per response and the -999 fill
+on the last day are assumed, not observed. The tests below therefore
+check the code against those assumptions, not against the API.
+
+test_captured_response_matches_the_assumptions checks the assumptions
+themselves once a real response is saved next to it. Until then it is
+skipped. plan_regions' threshold (a box must hold more cells than there
+are parameters) rests on them, so capture one before relying on regional
+mode:
+
+    curl -o tests/fixtures/power_regional_t2m_captured.json "https://power.larc.nasa.gov/api/temporal/daily/regional?parameters=T2M&community=AG&latitude-min=-2&latitude-max=0&longitude-min=36.25&longitude-max=38.125&start=20240501&end=20240503&format=JSON"
+"""
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+
+import data_orchestrator
+import nasa_data_model
+from power_client import PowerAPIError
+from power_cache import GRID_LAT_DEGREES, GRID_LON_DEGREES, snap_to_cell
+from power_decode import decode_power_parameters
+from power_regional import plan_regions, split_features
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE = os.path.join(FIXTURES, "power_regional_t2m_synthetic.json")
+CAPTURED = os.path.join(FIXTURES, "power_regional_t2m_captured.json")
+# The box and dates both fixtures were requested with
+BOX = (-2, 0, 36.25, 38.125)
+
+
+@pytest.fixture(scope="module")
+def regional_response():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def fixture_cells(regional_response):
+    return sorted((lat, lon) for lon, lat, _ in (f["geometry"]["coordinates"] for f in regional_response["features"]))
+
+
+class FakeClient:
+    """Answers daily_regional from the fixture, relabelled to the requested parameter."""
+
+    max_concurrency = 2
+
+    def __init__(self, response, fail=False):
+        self.response = response
+        self.fail = fail
+        self.requests = []
+
+    def daily_regional(self, params):
+        self.requests.append(params)
+        if self.fail:
+            raise PowerAPIError("POWER returned HTTP 500", 500)
+        (param,) = params["parameters"].split(",")
+        return [
+            {**feature, "properties": {"parameter": {param: feature["properties"]["parameter"]["T2M"]}}}
+            for feature in self.response["features"]
+        ]
+
+
+@pytest.fixture
+def fake_client(monkeypatch, regional_response):
+    client = FakeClient(regional_response)
+    monkeypatch.setattr(nasa_data_model, "get_client", lambda: client)
+    monkeypatch.setattr(nasa_data_model, "get_cache", lambda: None)
+    return client
+
+
+# the API itself
+
+@pytest.mark.skipif(not os.path.exists(CAPTURED), reason="no captured POWER regional response")
+def test_captured_response_matches_the_assumptions():
+    with open(CAPTURED) as f:
+        response = json.load(f)
+    lat_min, lat_max, lon_min, lon_max = BOX
+    features = response["features"]
+    points = [tuple(feature["geometry"]["coordinates"][:2]) for feature in features]
+
+    # [lon, lat, ...]: the box's latitude and longitude ranges don't overlap
+    assert all(lon_min <= lon <= lon_max and lat_min <= lat <= lat_max for lon, lat in points)
+    assert all(len(feature["geometry"]["coordinates"]) == 3 for feature in features)
+    # Points sit on the grid snap_to_cell() assumes, one per cell of the box
+    cells = [snap_to_cell(lat, lon) for lon, lat in points]
+    assert all(math.isclose(lat, cell_lat) and math.isclose(lon, cell_lon)
+               for (lon, lat), (cell_lat, cell_lon) in zip(points, cells))
+    expected = (round((lat_max - lat_min) / GRID_LAT_DEGREES) + 1) * (round((lon_max - lon_min) / GRID_LON_DEGREES) + 1)
+    assert len(set(cells)) == len(cells) == expected
+    # One parameter per response, filled with the advertised fill value
+    assert all(list(feature["properties"]["parameter"]) == ["T2M"] for feature in features)
+    assert response["header"]["fill_value"] == -999
+
+
+# plan_regions
+
+def test_boxes_stay_within_the_size_limits():
+    # A 0.5 x 0.625 degree grid spanning 25 degrees of latitude and longitude
+    cells = [(lat * 0.5, lon * 0.625) for lat in range(0, 50, 2) for lon in range(0, 40, 2)]
+    regions, point_cells = plan_regions(cells, calls_per_region=3, max_degrees=10, min_degrees=2)
+
+    assert len(regions) > 1
+    for (lat_min, lat_max, lon_min, lon_max), box_cells in regions:
+        assert 2 <= lat_max - lat_min < 10
+        assert 2 <= lon_max - lon_min < 10
+        assert all(lat_min <= lat <= lat_max and lon_min <= lon <= lon_max for lat, lon in box_cells)
+    planned = [cell for _, box_cells in regions for cell in box_cells] + point_cells
+    assert sorted(planned) == sorted(cells)
+
+
+def test_small_clusters_are_widened_to_the_minimum_box():
+    cells = [(-1.5, 36.875), (-1.0, 36.875), (-1.0, 37.5)]
+    ((lat_min, lat_max, lon_min, lon_max), box_cells), = plan_regions(cells, 1, max_degrees=10, min_degrees=2)[0]
+
+    assert (lat_max - lat_min, lon_max - lon_min) == (2, 2)
+    assert lat_min < -1.5 and lat_max > -1.0 and lon_min < 36.875 and lon_max > 37.5
+    assert sorted(box_cells) == cells
+
+
+def test_widened_boxes_are_clipped_to_the_globe():
+    ((lat_min, lat_max, lon_min, lon_max), _), = plan_regions(
+        [(89.5, 179.375), (90.0, 179.375)], 1, max_degrees=10, min_degrees=2)[0]
+
+    assert (lat_min, lat_max) == (88, 90)
+    assert (lon_min, lon_max) == (178, 180)
+
+
+def test_sparse_boxes_fall_back_to_point_cells():
+    dense = [(0.0, 0.0), (0.5, 0.0), (0.0, 0.625), (0.5, 0.625)]
+    sparse = [(40.0, 100.0), (40.5, 100.0)]
+    regions, point_cells = plan_regions(dense + sparse, calls_per_region=2, max_degrees=10, min_degrees=2)
+
+    assert [sorted(box_cells) for _, box_cells in regions] == [sorted(dense)]
+    assert sorted(point_cells) == sparse
+
+
+# split_features
+
+def test_split_features_reads_lon_lat_elevation_coordinates(regional_response, fixture_cells):
+    by_cell = split_features(regional_response["features"], fixture_cells)
+
+    assert sorted(by_cell) == fixture_cells
+    for feature in regional_response["features"]:
+        longitude, latitude, _ = feature["geometry"]["coordinates"]
+        assert by_cell[(latitude, longitude)] == feature["properties"]["parameter"]
+
+
+def test_split_features_keeps_only_wanted_cells(regional_response):
+    wanted = [(-1.0, 36.875), (-0.5, 37.5), (10.0, 10.0)]
+    by_cell = split_features(regional_response["features"], wanted)
+
+    assert sorted(by_cell) == [(-1.0, 36.875), (-0.5, 37.5)]
+
+
+def test_regional_values_decode_per_cell_with_fill_values_masked(regional_response, fixture_cells):
+    fill_value = regional_response["header"]["fill_value"]
+    for cell, parameter_data in split_features(regional_response["features"], fixture_cells).items():
+        dates, columns = decode_power_parameters(parameter_data, ["T2M"])
+        raw = list(parameter_data["T2M"].values())
+
+        assert [str(day) for day in dates] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+        assert raw[-1] == fill_value and math.isnan(columns["T2M"][-1])
+        assert np.array_equal(columns["T2M"][:-1], raw[:-1])
+
+
+# fetching and the point-mode fallback
+
+def test_regional_fetch_requests_one_parameter_per_call(fake_client, fixture_cells):
+    bbox = BOX
+    by_cell = nasa_data_model.fetch_power_regional(bbox, fixture_cells, "20240501", "20240503", ["T2M", "PRECTOTCORR"])
+
+    assert [request["parameters"] for request in fake_client.requests] == ["T2M", "PRECTOTCORR"]
+    assert all(
+        (request["latitude-min"], request["latitude-max"], request["longitude-min"], request["longitude-max"]) == bbox
+        for request in fake_client.requests
+    )
+    assert sorted(by_cell) == fixture_cells
+    assert all(set(parameter_data) == {"T2M", "PRECTOTCORR"} for parameter_data in by_cell.values())
+
+
+def test_cells_outside_dense_boxes_are_left_to_point_fetches(fake_client, fixture_cells):
+    lone_cell = (40.0, -100.0)
+    cell_starts = {cell: "20240501" for cell in fixture_cells + [lone_cell]}
+    results = nasa_data_model.get_regional_climate_data(cell_starts, "20240503", ["T2M"])
+
+    assert sorted(results) == fixture_cells
+    assert lone_cell not in results
+
+
+def test_failed_regional_fetch_leaves_every_cell_to_point_fetches(fake_client, fixture_cells):
+    fake_client.fail = True
+    cell_starts = {cell: "20240501" for cell in fixture_cells}
+
+    assert nasa_data_model.get_regional_climate_data(cell_starts, "20240503", ["T2M"]) == {}
+
+
+def test_refresh_cell_fetches_point_data_only_without_regional_data(monkeypatch, regional_response):
+    point_calls = []
+    stored = []
+    monkeypatch.setattr(data_orchestrator, "get_agro_climate_data",
+                        lambda lat, lon, start, end: point_calls.append((lat, lon, start, end)) or {"T2M": {}})
+    monkeypatch.setattr(data_orchestrator, "_archive_raw", lambda cell, nasa_data: None)
+    monkeypatch.setattr(data_orchestrator, "_store_nasa_data", lambda users, nasa_data, verbose: stored.append(nasa_data))
+    monkeypatch.setattr(data_orchestrator, "invalidate_user", lambda user_id: 0)
+    cell = (-1.0, 36.875)
+    users = [("user-a", "20240502"), ("user-b", "20240501")]
+
+    regional = split_features(regional_response["features"], [cell])[cell]
+    data_orchestrator._refresh_cell(cell, users, "20240503", regional)
+    assert point_calls == [] and stored == [regional]
+
+    data_orchestrator._refresh_cell(cell, users, "20240503", None)
+    assert point_calls == [(-1.0, 36.875, "20240501", "20240503")]
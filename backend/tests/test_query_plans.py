@@ -0,0 +1,38 @@
+"""
+Runs check_query_plans() (see query_plans.py) against the database named by
+the POSTGRES_* variables, creating and migrating the schema first, and
+fails on any hot query whose plan needs a sequential scan or a sort. The
+seed rows are rolled back. Skipped when no database is reachable.
+
+    cd backend && python -m pytest tests
+"""
+import psycopg2
+import pytest
+
+from db import db_connection, get_db_connection
+from query_plans import HOT_QUERIES, check_query_plans
+
+
+@pytest.fixture(scope="module")
+def plan_results():
+    try:
+        get_db_connection().close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"No database reachable: {str(e).strip()}")
+
+    from app import create_tables
+    from migrations import apply_migrations
+
+    create_tables()
+    with db_connection() as conn:
+        apply_migrations(conn, verbose=False)
+        return check_query_plans(conn)
+
+
+def test_every_hot_query_is_checked(plan_results):
+    assert set(plan_results) == {name for name, _, _ in HOT_QUERIES}
+
+
+@pytest.mark.parametrize("name", [name for name, _, _ in HOT_QUERIES])
+def test_query_plan_uses_indexes(plan_results, name):
+    assert plan_results[name]["ok"], plan_results[name]["violations"]
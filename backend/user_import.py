@@ -0,0 +1,266 @@
+"""
+Bulk onboarding of farmers from a CSV or NDJSON file.
+
+Records are validated in one streaming pass and written straight into a
+COPY buffer (spilled to disk past SPOOL_MAX_BYTES), then COPYed into a
+temp staging table. A single statement then drops repeated emails within
+the file and emails already in `users` or `legacy_users`. It inserts the
+rest into both user tables and provisions their default farm zone,
+user_credits and legacy user_metrics rows. The whole import is one
+transaction.
+
+Run with `flask import-users farmers.csv [--dry-run]`.
+"""
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from bulk_write import _copy_text
+from provisioning import DEFAULT_ZONE_NAME, SAMPLE_USER_METRICS
+
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+MAX_REPORTED_ERRORS = 20
+
+# Accepted column names per field; camelCase matches the /signup payload
+FIELD_ALIASES = {
+    "email": ("email",),
+    "first_name": ("first_name", "firstName"),
+    "last_name": ("last_name", "lastName"),
+    "farm_name": ("farm_name", "farmName"),
+    "farm_latitude": ("farm_latitude", "latitude", "lat"),
+    "farm_longitude": ("farm_longitude", "longitude", "lon", "lng"),
+    "farm_size_hectares": ("farm_size_hectares", "size_hectares", "farmSizeHectares"),
+    "password": ("password",),
+}
+
+STAGE_COLUMNS = [
+    "line", "id", "legacy_id", "email", "first_name", "last_name", "farm_name",
+    "farm_latitude", "farm_longitude", "farm_size_hectares", "password_hash",
+]
+
+CREATE_STAGE_QUERY = """
+    CREATE TEMP TABLE import_users_stage (
+        line INTEGER,
+        id UUID,
+        legacy_id VARCHAR(255),
+        email VARCHAR(255),
+        first_name VARCHAR(255),
+        last_name VARCHAR(255),
+        farm_name VARCHAR(255),
+        farm_latitude DECIMAL(10, 6),
+        farm_longitude DECIMAL(10, 6),
+        farm_size_hectares DECIMAL(8, 2),
+        password_hash VARCHAR(255)
+    ) ON COMMIT DROP
+"""
+
+# Username defaults to the email, as in /signup, so it is checked too.
+# Foreign keys are checked at the end of the statement, so the provisioning
+# inserts can reference users created by the same statement.
+IMPORT_QUERY = f"""
+    WITH candidates AS (
+        SELECT DISTINCT ON (email) * FROM import_users_stage ORDER BY email, line
+    ),
+    accepted AS (
+        SELECT c.* FROM candidates c
+        WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.email = c.email OR u.username = c.email)
+            AND NOT EXISTS (SELECT 1 FROM legacy_users l WHERE l.email = c.email)
+    ),
+    new_users AS (
+        INSERT INTO users (id, username, email, first_name, last_name, farm_name,
+                           farm_latitude, farm_longitude, farm_size_hectares)
+        SELECT id, email, email, first_name, last_name, COALESCE(farm_name, first_name || '''s Farm'),
+               farm_latitude, farm_longitude, farm_size_hectares
+        FROM accepted
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    ),
+    created AS (
+        SELECT a.* FROM accepted a JOIN new_users n ON n.id = a.id
+    ),
+    new_legacy AS (
+        INSERT INTO legacy_users (userId, firstName, lastName, email, password)
+        SELECT legacy_id, first_name, last_name, email, password_hash FROM created
+        ON CONFLICT DO NOTHING
+        RETURNING userId
+    ),
+    zones AS (
+        INSERT INTO farm_zones (user_id, zone_name, crop_type, area_hectares)
+        SELECT id, '{DEFAULT_ZONE_NAME}', 'Unassigned', COALESCE(farm_size_hectares, 0) FROM created
+        ON CONFLICT (user_id, zone_name) DO NOTHING
+    ),
+    credits AS (
+        INSERT INTO user_credits (user_id)
+        SELECT id FROM created
+        ON CONFLICT (user_id) DO NOTHING
+    ),
+    metrics AS (
+        INSERT INTO user_metrics (user_id, credit_points, farm_health, active_neighbors,
+                                  nearest_market_distance, nearest_market_name)
+        SELECT userId, %(credit_points)s, %(farm_health)s, %(active_neighbors)s,
+               %(nearest_market_distance)s, %(nearest_market_name)s
+        FROM new_legacy
+        ON CONFLICT (user_id) DO NOTHING
+    )
+    SELECT (SELECT COUNT(*) FROM import_users_stage),
+           (SELECT COUNT(*) FROM candidates),
+           (SELECT COUNT(*) FROM new_users)
+"""
+
+
+def _read_csv(f):
+    for line, record in enumerate(csv.DictReader(f), start=2):
+        yield line, record
+
+
+def _read_ndjson(f):
+    for line, text in enumerate(f, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, ValueError(f"invalid JSON: {e}")
+            continue
+        yield line, record if isinstance(record, dict) else ValueError("not a JSON object")
+
+
+READERS = {"csv": _read_csv, "ndjson": _read_ndjson}
+
+
+def detect_format(path):
+    return "ndjson" if os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl", ".json") else "csv"
+
+
+def _field(record, name):
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def _number(record, name, low, high):
+    value = _field(record, name)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} is not a number")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def validate_record(record):
+    """Returns a normalised record dict, or raises ValueError naming the problem."""
+    email = _field(record, "email")
+    if not email or "@" not in email or len(email) > 255:
+        raise ValueError("missing or invalid email")
+    first_name, last_name = _field(record, "first_name"), _field(record, "last_name")
+    if not first_name or not last_name:
+        raise ValueError("first_name and last_name are required")
+    farm_name = _field(record, "farm_name")
+    if any(value and len(value) > 255 for value in (first_name, last_name, farm_name)):
+        raise ValueError("names must be at most 255 characters")
+
+    latitude = _number(record, "farm_latitude", -90, 90)
+    longitude = _number(record, "farm_longitude", -180, 180)
+    if (latitude is None) != (longitude is None):
+        raise ValueError("farm_latitude and farm_longitude must be given together")
+
+    password = _field(record, "password")
+    return {
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "farm_name": farm_name,
+        "farm_latitude": latitude,
+        "farm_longitude": longitude,
+        "farm_size_hectares": _number(record, "farm_size_hectares", 0, 999999.99),
+        # Same scheme as /signup, which stores a random password's hash
+        "password_hash": hashlib.sha256(str(password or uuid.uuid4()).encode()).hexdigest(),
+    }
+
+
+def _stage_rows(records, errors):
+    """Validates (line, record) pairs, yielding COPY lines and counting rejects into `errors`."""
+    for line, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            clean = validate_record(record)
+        except ValueError as e:
+            errors["count"] += 1
+            if len(errors["samples"]) < MAX_REPORTED_ERRORS:
+                errors["samples"].append({"line": line, "error": str(e)})
+            continue
+        row = (line, uuid.uuid4(), str(uuid.uuid4()), clean["email"], clean["first_name"], clean["last_name"],
+               clean["farm_name"], clean["farm_latitude"], clean["farm_longitude"],
+               clean["farm_size_hectares"], clean["password_hash"])
+        yield "\t".join(_copy_text(value) for value in row) + "\n"
+
+
+def import_users(conn, path, file_format=None, dry_run=False):
+    """
+    Imports the farmers in `path` (csv or ndjson). Returns a report of
+    rows read, rejected (with sample errors), duplicates within the file,
+    emails that already existed and users imported. With dry_run the
+    transaction is rolled back after counting.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in READERS:
+        raise ValueError(f"Unknown import format {file_format!r}, expected one of {sorted(READERS)}")
+
+    started = time.perf_counter()
+    errors = {"count": 0, "samples": []}
+    with open(path, newline="", encoding="utf-8-sig") as f, \
+            tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+", newline="") as buffer:
+        for copy_line in _stage_rows(READERS[file_format](f), errors):
+            buffer.write(copy_line)
+        buffer.seek(0)
+        validate_seconds = time.perf_counter() - started
+
+        try:
+            with conn.cursor() as cur:
+                copy_started = time.perf_counter()
+                cur.execute(CREATE_STAGE_QUERY)
+                cur.copy_expert(f"COPY import_users_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN", buffer)
+                cur.execute("ANALYZE import_users_stage")
+                copy_seconds = time.perf_counter() - copy_started
+
+                insert_started = time.perf_counter()
+                cur.execute(IMPORT_QUERY, SAMPLE_USER_METRICS)
+                staged, candidates, imported = cur.fetchone()
+                insert_seconds = time.perf_counter() - insert_started
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return {
+        "path": path,
+        "format": file_format,
+        "dry_run": dry_run,
+        "rows_read": staged + errors["count"],
+        "rejected": errors["count"],
+        "errors": errors["samples"],
+        "duplicates_in_file": staged - candidates,
+        "already_registered": candidates - imported,
+        "imported": 0 if dry_run else imported,
+        "would_import": imported if dry_run else None,
+        "seconds": round(time.perf_counter() - started, 3),
+        "stages": {
+            "validate_seconds": round(validate_seconds, 3),
+            "copy_seconds": round(copy_seconds, 3),
+            "insert_seconds": round(insert_seconds, 3),
+        },
+    }
@@ -0,0 +1,19 @@
+"""High-water marks for incremental batch jobs, stored in job_watermarks."""
+
+
+def get_watermark(cur, job_name):
+    """Returns the job's last watermark, or None if it has never completed."""
+    cur.execute("SELECT watermark FROM job_watermarks WHERE job_name = %s", (job_name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(cur, job_name, watermark):
+    """Records a new watermark; the caller commits it with the job's own writes."""
+    cur.execute("""
+        INSERT INTO job_watermarks (job_name, watermark)
+        VALUES (%s, %s)
+        ON CONFLICT (job_name) DO UPDATE SET
+            watermark = EXCLUDED.watermark,
+            updated_at = CURRENT_TIMESTAMP
+    """, (job_name, watermark))
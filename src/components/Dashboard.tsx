@@ -83,10 +83,13 @@ export function Dashboard() {
         setLoading(true);
         setError(null);
 
-        // Fetch dashboard data (user info and metrics)
-        const dashboardResponse = await fetch(`http://127.0.0.1:5000/dashboard/${user.userId || user.id}`);
-        const dashboardData = await dashboardResponse.json();
+        // Fetch dashboard data (user info and metrics) bundled with soil conditions
+        // and AI recommendations, so the page needs a single backend round-trip
+        const dashboardResponse = await fetch(`http://127.0.0.1:5000/dashboard/${user.userId || user.id}?include=soil,recommendations`);
+        const { soilConditions, aiRecommendations, ...dashboardData } = await dashboardResponse.json();
         setDashboardData(dashboardData);
+        setSoilData(soilConditions ?? null);
+        setRecommendations(aiRecommendations?.recommendations ?? []);
 
         // Fetch weather data
         const weatherResponse = await fetch('http://127.0.0.1:5000/weather-forecast');
@@ -98,16 +101,6 @@ export function Dashboard() {
           setWeatherData([]);
         }
 
-        // Fetch soil conditions
-        const soilResponse = await fetch(`http://127.0.0.1:5000/soil-conditions/${user.userId || user.id}`);
-        const soilData = await soilResponse.json();
-        setSoilData(soilData);
-
-        // Fetch AI recommendations
-        const recResponse = await fetch(`http://127.0.0.1:5000/ai-recommendations/${user.userId || user.id}`);
-        const recData = await recResponse.json();
-        setRecommendations(recData.recommendations);
-
       } catch (err) {
         setError('Failed to load dashboard data');
         console.error('Error fetching dashboard data:', err);